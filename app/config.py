@@ -9,12 +9,29 @@ class Settings(BaseSettings):
     """
     Configuración de la aplicación cargada desde variables de entorno
     """
-    # Supabase
-    supabase_url: str
-    supabase_key: str
+    # Almacenamiento: "supabase" | "memory"
+    storage_backend: str = "supabase"
+    
+    # Supabase (obligatorio con storage_backend="supabase")
+    supabase_url: str = ""
+    supabase_key: str = ""
+    
+    # Supabase - Pool de conexiones HTTP (keep-alive)
+    supabase_timeout_seconds: float = 10.0
+    supabase_pool_max_connections: int = 50
+    supabase_pool_max_keepalive: int = 20
+    supabase_pool_keepalive_expiry: float = 30.0
     
     # Cifrado
     encryption_key: str
+    encryption_keys_previous: str = ""  # Claves anteriores (solo lectura), separadas por comas
+    
+    # Rotación de claves (re-cifrado en segundo plano)
+    key_rotation_enabled: bool = True
+    key_rotation_interval_minutes: int = 10
+    key_rotation_batch_size: int = 200
+    key_rotation_concurrency: int = 4
+    key_rotation_pause_ms: int = 200
     
     # Autenticación Admin
     api_key_admin: str
@@ -35,9 +52,83 @@ class Settings(BaseSettings):
     max_secret_size_kb: int = 10
     min_ttl_minutes: int = 5
     max_ttl_minutes: int = 10080  # 7 días
+    max_batch_items: int = 500
+    max_batch_size_kb: int = 1024
+    
+    # Rate limiting por IP (ventana deslizante de 1 minuto)
+    rate_limit_per_minute: int = 60
+    rate_limit_max_tracked_ips: int = 100000
+    rate_limit_backend: str = "process"  # process | shm | storage
+    rate_limit_shm_path: str = "/dev/shm/autopus-secret-api-ratelimit"
+    rate_limit_shm_slots: int = 65536
+    rate_limit_sync_interval_ms: int = 250
+    rate_limit_sync_batch: int = 100
+    
+    # Secretos grandes (archivos cifrados por bloques)
+    blob_store: str = "local"
+    blob_storage_path: str = "data/blobs"
+    blob_chunk_size_kb: int = 64
+    max_file_size_mb: int = 50
+    
+    # KDF de passphrases: "bcrypt" | "scrypt"
+    passphrase_kdf: str = "bcrypt"
+    passphrase_kdf_cost: int = 0  # 0 = coste por defecto o calibrado
+    passphrase_kdf_calibrate: bool = True
+    passphrase_kdf_target_ms: int = 250
+    
+    # Hash de passphrases (executor dedicado)
+    hashing_executor: str = "thread"  # thread | process
+    hashing_workers: int = 0  # 0 = núcleos disponibles
+    hashing_max_queue: int = 32
+    
+    # Métricas de Prometheus
+    metrics_enabled: bool = True
+    metrics_path: str = "/metrics"
+    
+    # Medición por etapas: cabecera Server-Timing y exportación de trazas
+    server_timing_enabled: bool = False
+    tracing_exporter: str = "none"  # none | file | otlp
+    tracing_file_path: str = "data/traces.jsonl"
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    
+    # Estadísticas (/api/stats): caché stale-while-revalidate
+    stats_cache_ttl_seconds: float = 5.0  # 0 = sin caché
+    stats_cache_max_stale_seconds: float = 60.0
+    
+    # Contadores de eventos (volcado periódico al almacenamiento)
+    counters_flush_seconds: int = 10
+    counters_rate_window_seconds: float = 300.0
+    counters_refresh_seconds: float = 60.0  # Volcado sin incrementos: solo para refrescar los totales
     
     # Scheduler
-    cleanup_interval_hours: int = 1
+    cleanup_interval_hours: int = 1  # Limpieza de seguridad (además de la programada por expiración)
+    cleanup_coalesce_seconds: int = 30
+    
+    # Purga de secretos expirados (lotes acotados con presupuesto de tiempo)
+    purge_batch_size: int = 1000
+    purge_time_budget_seconds: float = 30.0
+    purge_pause_ms: int = 50
+    
+    # Compactación de lápidas (secretos destruidos, ya sin contenido)
+    compaction_enabled: bool = True
+    compaction_interval_minutes: int = 60
+    compaction_grace_minutes: int = 1440  # Un enlace ya leído responde 410 durante este tiempo
+    
+    # Nivel efímero en memoria para TTL cortos (no persistente, ver README)
+    ephemeral_tier_enabled: bool = False
+    ephemeral_tier_max_ttl_minutes: int = 15
+    ephemeral_tier_max_mb: int = 64
+    
+    # Tokens firmados (aleatorio.expiración.MAC, clave derivada de ENCRYPTION_KEY)
+    token_accept_legacy: bool = True  # Tokens sin firma; desactivar cuando hayan expirado todos
+    
+    # Filtro de tokens vivos (rechaza tokens inexistentes sin consultar la base de datos)
+    token_filter_enabled: bool = False
+    token_filter_capacity: int = 1000000  # Tokens vivos previstos; fija la memoria del filtro
+    token_filter_fp_rate: float = 0.01  # Falsos positivos con el filtro a capacidad
+    token_filter_rebuild_minutes: int = 10
+    token_filter_page_size: int = 5000
+    token_filter_margin_seconds: int = 60  # Desfase de reloj entre procesos e inserciones en curso
     
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -53,6 +144,13 @@ class Settings(BaseSettings):
         """
         return [origin.strip() for origin in self.cors_origins.split(",")]
     
+    @property
+    def encryption_keys_previous_list(self) -> List[str]:
+        """
+        Convierte la cadena de claves anteriores en una lista
+        """
+        return [key.strip() for key in self.encryption_keys_previous.split(",") if key.strip()]
+    
     @property
     def is_production(self) -> bool:
         """
@@ -66,6 +164,20 @@ class Settings(BaseSettings):
         Convierte el límite de KB a bytes
         """
         return self.max_secret_size_kb * 1024
+    
+    @property
+    def max_file_size_bytes(self) -> int:
+        """
+        Convierte el límite de archivos de MB a bytes
+        """
+        return self.max_file_size_mb * 1024 * 1024
+    
+    @property
+    def max_batch_size_bytes(self) -> int:
+        """
+        Convierte el presupuesto de bytes por lote de KB a bytes
+        """
+        return self.max_batch_size_kb * 1024
 
 
 # Instancia global de configuración
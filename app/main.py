@@ -2,6 +2,7 @@
 Autopus Secret API - Aplicación principal FastAPI
 """
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
@@ -27,6 +28,16 @@ async def lifespan(app: FastAPI):
     logger.info(f"📍 Entorno: {settings.environment}")
     logger.info(f"🔒 Cifrado: Habilitado")
     
+    # Conectar cliente asíncrono de base de datos (pool keep-alive)
+    from app.services.database import database_service
+    await database_service.connect()
+    
+    # Calibrar coste del KDF de passphrases para el hardware actual
+    if settings.passphrase_kdf_calibrate and not settings.passphrase_kdf_cost:
+        import asyncio
+        from app.services.kdf import kdf_policy
+        await asyncio.to_thread(kdf_policy.calibrate, settings.passphrase_kdf_target_ms)
+    
     # Iniciar scheduler para limpieza automática
     from app.scheduler import start_scheduler
     start_scheduler()
@@ -39,6 +50,26 @@ async def lifespan(app: FastAPI):
     # Detener scheduler
     from app.scheduler import shutdown_scheduler
     shutdown_scheduler()
+    
+    # Volcar los contadores de eventos pendientes de este worker
+    from app.services.counters import lifecycle_counters
+    await lifecycle_counters.flush()
+    
+    # Sumar las peticiones pendientes del rate limiter al almacén compartido
+    from app.services.rate_limiter import rate_limiter
+    await rate_limiter.close()
+    
+    # Enviar las trazas pendientes
+    from app.services.tracing import span_exporter
+    if span_exporter is not None:
+        await span_exporter.close()
+    
+    # Cerrar conexiones con la base de datos
+    await database_service.close()
+    
+    # Detener executor de hashing de passphrases
+    from app.services.hashing import passphrase_hasher
+    passphrase_hasher.shutdown()
 
 
 # Crear aplicación FastAPI
@@ -49,6 +80,8 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    # Serialización JSON con orjson para todas las respuestas
+    default_response_class=ORJSONResponse,
     # Configurar esquema de seguridad para Swagger
     swagger_ui_parameters={
         "persistAuthorization": True
@@ -65,13 +98,37 @@ app.add_middleware(
 )
 
 # Configurar middlewares de seguridad
-from app.middleware import RateLimitMiddleware, SecurityHeadersMiddleware
+from app.middleware import (
+    MetricsMiddleware,
+    RateLimitMiddleware,
+    SecurityHeadersMiddleware,
+    ServerTimingMiddleware
+)
+
+from app.services.rate_limiter import rate_limiter
 
 app.add_middleware(SecurityHeadersMiddleware)
-app.add_middleware(RateLimitMiddleware, requests_per_minute=60)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
 
 logger.info("🛡️ Middlewares de seguridad configurados")
 
+# Medición por etapas (solo se instala si hay alguna salida activada)
+from app.services.tracing import span_exporter
+
+if settings.server_timing_enabled or span_exporter is not None:
+    app.add_middleware(
+        ServerTimingMiddleware,
+        server_timing=settings.server_timing_enabled,
+        exporter=span_exporter
+    )
+    logger.info(f"⏱️ Medición por etapas activada (exportador: {settings.tracing_exporter})")
+
+# Métricas de Prometheus (el más externo: mide también las respuestas 429)
+if settings.metrics_enabled:
+    from app.services.metrics import metrics
+    app.add_middleware(MetricsMiddleware, registry=metrics, path=settings.metrics_path)
+    logger.info(f"📈 Métricas de Prometheus expuestas en {settings.metrics_path}")
+
 # Incluir routers
 app.include_router(secrets.router, prefix="/api", tags=["Secrets"])
 app.include_router(admin.router, prefix="/api", tags=["Admin"])
@@ -1,6 +1,8 @@
 """
 Middleware package
 """
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.timing import ServerTimingMiddleware
 from app.middleware.security import (
     RateLimitMiddleware,
     SecurityHeadersMiddleware,
@@ -8,7 +10,9 @@ from app.middleware.security import (
 )
 
 __all__ = [
+    "MetricsMiddleware",
     "RateLimitMiddleware",
     "SecurityHeadersMiddleware",
+    "ServerTimingMiddleware",
     "validate_content_length"
 ]
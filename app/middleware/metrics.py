@@ -0,0 +1,64 @@
+"""
+Middleware ASGI puro de métricas HTTP
+
+Mide todas las peticiones (incluidas las rechazadas por el rate limiter) y
+sirve el texto de Prometheus en la ruta configurada sin pasar por el resto
+de middlewares. La ruta se etiqueta con la plantilla (`/api/secret/{token}`),
+nunca con la URL real, para que los tokens no acaben en las métricas.
+"""
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import time
+
+from app.services.metrics import KNOWN_METHODS, UNMATCHED_ROUTE, MetricsRegistry
+
+METRICS_HEADERS = [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8")]
+
+
+class MetricsMiddleware:
+    """
+    Registra latencia, estado y peticiones en curso por ruta
+    """
+
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry, path: str = "/metrics"):
+        self.app = app
+        self.registry = registry
+        self.path = path
+
+    async def _serve_metrics(self, send: Send) -> None:
+        body = self.registry.render().encode()
+        await send({"type": "http.response.start", "status": 200, "headers": METRICS_HEADERS})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"] == self.path:
+            await self._serve_metrics(send)
+            return
+
+        registry = self.registry
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            registry.in_flight -= 1
+            # El router guarda la ruta encontrada en el propio scope
+            route = scope.get("route")
+            method = scope["method"]
+            registry.observe_request(
+                method if method in KNOWN_METHODS else "OTHER",
+                route.path if route is not None else UNMATCHED_ROUTE,
+                status,
+                time.perf_counter() - started
+            )
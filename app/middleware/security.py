@@ -3,124 +3,118 @@ Middleware de seguridad para la API
 - Rate limiting
 - Request validation
 - Security headers
+
+Los dos middlewares son ASGI puros: solo envuelven `send` para añadir
+cabeceras al `http.response.start`, sin las tareas ni los streams que
+`BaseHTTPMiddleware` crea en cada petición.
 """
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict
-from datetime import datetime, timedelta
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
 
-from app.utils.datetime_utils import now_spain
+from app.services.metrics import metrics
+from app.services.rate_limiter import RateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Endpoints que no requieren rate limiting estricto
+RATE_LIMIT_EXEMPT_PATHS = frozenset({"/docs", "/redoc", "/openapi.json", "/", "/health"})
+
+# Content Security Policy - Permitir recursos de Swagger UI y FastAPI docs
+CSP_DIRECTIVES = (
+    "default-src 'self'",
+    "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net",
+    "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net",
+    "img-src 'self' data: https://fastapi.tiangolo.com",
+    "font-src 'self' https://cdn.jsdelivr.net",
+    "connect-src 'self'"
+)
+
+# Headers de seguridad, codificados una sola vez
+SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"content-security-policy", "; ".join(CSP_DIRECTIVES).encode())
+)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+
+class RateLimitMiddleware:
     """
     Middleware para limitar la cantidad de requests por IP
     """
     
-    def __init__(self, app, requests_per_minute: int = 60):
-        super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.request_counts = defaultdict(list)
-        self.cleanup_interval = timedelta(minutes=5)
-        self.last_cleanup = now_spain()
-    
-    def _cleanup_old_requests(self):
-        """
-        Limpiar registros antiguos para evitar memory leak
-        """
-        now = now_spain()
-        if now - self.last_cleanup > self.cleanup_interval:
-            cutoff = now - timedelta(minutes=1)
-            for ip in list(self.request_counts.keys()):
-                self.request_counts[ip] = [
-                    timestamp for timestamp in self.request_counts[ip]
-                    if timestamp > cutoff
-                ]
-                if not self.request_counts[ip]:
-                    del self.request_counts[ip]
-            self.last_cleanup = now
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+        self.limit_header = (b"x-ratelimit-limit", str(limiter.limit).encode())
+        metrics.register_gauge(
+            "autopus_rate_limit_tracked_ips",
+            "IPs con peticiones registradas en el rate limiter",
+            lambda: len(self.limiter)
+        )
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Procesar request y aplicar rate limiting
         """
-        # Obtener IP del cliente
-        client_ip = request.client.host if request.client else "unknown"
+        if scope["type"] != "http" or scope["path"] in RATE_LIMIT_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
         
-        # Endpoints que no requieren rate limiting estricto
-        if request.url.path in ["/docs", "/redoc", "/openapi.json", "/", "/health"]:
-            return await call_next(request)
-        
-        # Verificar rate limit
-        now = now_spain()
-        cutoff = now - timedelta(minutes=1)
+        # Obtener IP del cliente
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         
-        # Limpiar requests antiguos de esta IP
-        self.request_counts[client_ip] = [
-            timestamp for timestamp in self.request_counts[client_ip]
-            if timestamp > cutoff
-        ]
+        # Verificar y registrar la petición en una sola operación O(1)
+        allowed, remaining, retry_after = self.limiter.hit(client_ip)
         
-        # Verificar si excede el límite
-        if len(self.request_counts[client_ip]) >= self.requests_per_minute:
+        if not allowed:
             logger.warning(f"⚠️ Rate limit excedido para IP: {client_ip}")
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
                     "detail": "Demasiadas solicitudes. Por favor, intente más tarde.",
-                    "retry_after": 60
-                }
+                    "retry_after": retry_after
+                },
+                headers={"Retry-After": str(retry_after)}
             )
-        
-        # Registrar request
-        self.request_counts[client_ip].append(now)
-        
-        # Cleanup periódico
-        self._cleanup_old_requests()
-        
-        # Procesar request
-        response = await call_next(request)
+            await response(scope, receive, send)
+            return
         
         # Agregar headers de rate limit
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(
-            self.requests_per_minute - len(self.request_counts[client_ip])
-        )
+        rate_headers = (self.limit_header, (b"x-ratelimit-remaining", str(remaining).encode()))
+        
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *rate_headers]
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_headers)
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
     """
     Middleware para agregar headers de seguridad
     """
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Headers de seguridad
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Content Security Policy - Permitir recursos de Swagger UI y FastAPI docs
-        csp_directives = [
-            "default-src 'self'",
-            "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net",
-            "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net",
-            "img-src 'self' data: https://fastapi.tiangolo.com",
-            "font-src 'self' https://cdn.jsdelivr.net",
-            "connect-src 'self'"
-        ]
-        response.headers["Content-Security-Policy"] = "; ".join(csp_directives)
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *SECURITY_HEADERS]
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_headers)
 
 
 def validate_content_length(max_size: int = 10 * 1024 * 1024):  # 10MB por defecto
@@ -0,0 +1,65 @@
+"""
+Middleware ASGI puro de medición por etapas
+
+Activa una traza por petición para que `app.services.tracing.stage()` mida
+las etapas, añade la cabecera `Server-Timing` a la respuesta (si está
+habilitada) y entrega los spans al exportador configurado. Solo se instala
+si alguna de las dos salidas está activada.
+"""
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional
+import time
+
+from app.services.tracing import SpanExporter, end_trace, start_trace
+
+
+class ServerTimingMiddleware:
+    """
+    Traza cada petición HTTP y publica sus tiempos por etapa
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: bool = True, exporter: Optional[SpanExporter] = None):
+        """
+        Args:
+            app: Aplicación ASGI
+            server_timing: Añadir la cabecera Server-Timing
+            exporter: Exportador de spans (opcional)
+        """
+        self.app = app
+        self.server_timing = server_timing
+        self.exporter = exporter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = start_trace(scope["method"])
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    total_ms = (time.perf_counter() - started) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing(total_ms).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_trace(token)
+            if self.exporter is not None:
+                route = scope.get("route")
+                if route is not None:
+                    # Nombre con la plantilla de la ruta: el token nunca sale en la traza
+                    trace.name = f"{scope['method']} {route.path}"
+                self.exporter.add(trace.to_otlp_spans(time.time_ns(), {
+                    "http.request.method": scope["method"],
+                    "http.route": route.path if route is not None else "",
+                    "http.response.status_code": status
+                }))
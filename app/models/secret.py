@@ -14,7 +14,7 @@ class Secret:
         self,
         id: UUID,
         token: str,
-        encrypted_content: str,
+        encrypted_content: bytes,
         expires_at: datetime,
         created_at: datetime,
         passphrase_hash: Optional[str] = None,
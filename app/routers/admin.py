@@ -7,9 +7,17 @@ from datetime import datetime
 import logging
 
 from app.config import settings
+from app.services.counters import lifecycle_counters
 from app.services.database import database_service
+from app.services.encryption import encryption_service
+from app.services.hashing import passphrase_hasher
+from app.services.key_rotation import key_rotation
+from app.services.purge import expired_purge, tombstone_compaction
+from app.services.stats_cache import stats_cache
+from app.services.token_filter import token_filter
 from app.scheduler import get_scheduler_status
-from app.utils.datetime_utils import now_spain, spain_to_utc
+from app.utils.datetime_utils import now_spain
+from app.utils.token_generator import get_token_conflict_count, get_token_rejection_counts
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -49,60 +57,28 @@ async def get_stats():
     - Total de secretos accedidos
     - Total de secretos expirados
     - Secretos con passphrase
+    - Eventos del ciclo de vida (totales de todos los workers y tasas por
+      minuto), servidos desde memoria
+    
+    Los contadores se sirven desde una caché de pocos segundos
+    (`age_seconds` indica su antigüedad)
     """
     try:
-        # Obtener todos los secretos para calcular estadísticas
-        from supabase import PostgrestAPIError
-        
-        # Total de secretos activos (no destruidos y no expirados)
-        # Usar UTC para comparar con la base de datos
-        current_time_utc = spain_to_utc(now_spain()).isoformat()
-        active_response = await database_service.client.table("secrets")\
-            .select("*", count="exact")\
-            .eq("is_destroyed", False)\
-            .gte("expires_at", current_time_utc)\
-            .execute()
-        total_active = active_response.count if hasattr(active_response, 'count') else len(active_response.data)
-        
-        # Total de secretos accedidos (destruidos por lectura)
-        accessed_response = await database_service.client.table("secrets")\
-            .select("*", count="exact")\
-            .eq("is_destroyed", True)\
-            .not_.is_("accessed_at", "null")\
-            .execute()
-        total_accessed = accessed_response.count if hasattr(accessed_response, 'count') else len(accessed_response.data)
-        
-        # Total de secretos expirados
-        expired_response = await database_service.client.table("secrets")\
-            .select("*", count="exact")\
-            .lt("expires_at", current_time_utc)\
-            .execute()
-        total_expired = expired_response.count if hasattr(expired_response, 'count') else len(expired_response.data)
-        
-        # Secretos con passphrase
-        protected_response = await database_service.client.table("secrets")\
-            .select("*", count="exact")\
-            .not_.is_("passphrase_hash", "null")\
-            .execute()
-        total_protected = protected_response.count if hasattr(protected_response, 'count') else len(protected_response.data)
-        
-        # Total general
-        all_response = await database_service.client.table("secrets")\
-            .select("*", count="exact")\
-            .execute()
-        total_all = all_response.count if hasattr(all_response, 'count') else len(all_response.data)
+        stats, age_seconds = await stats_cache.get()
         
         logger.info("📊 Estadísticas solicitadas por administrador")
         
         return {
             "timestamp": now_spain().isoformat(),
+            "age_seconds": round(age_seconds, 3),
             "statistics": {
-                "total_secrets": total_all,
-                "active_secrets": total_active,
-                "accessed_secrets": total_accessed,
-                "expired_secrets": total_expired,
-                "protected_secrets": total_protected
-            }
+                "total_secrets": stats["total"],
+                "active_secrets": stats["active"],
+                "accessed_secrets": stats["accessed"],
+                "expired_secrets": stats["expired"],
+                "protected_secrets": stats["protected"]
+            },
+            "events": lifecycle_counters.snapshot()
         }
         
     except Exception as e:
@@ -120,24 +96,24 @@ async def purge_expired():
     
     Requiere: Authorization: Bearer <API_KEY>
     
-    Elimina todos los secretos que hayan expirado
+    Elimina los secretos expirados en lotes, hasta vaciar el atraso o
+    agotar el presupuesto de tiempo (`completed: false` si queda atraso)
     """
     try:
         logger.info("🧹 Limpieza manual de secretos expirados iniciada por administrador")
         
-        # Obtener secretos expirados antes de eliminar
-        expired_secrets = await database_service.get_expired_secrets()
-        count_before = len(expired_secrets)
-        
-        # Purgar secretos expirados
-        deleted_count = await database_service.purge_expired()
+        # Purgar por lotes (si el scheduler ya está purgando, devuelve su progreso)
+        result = await expired_purge.run()
         
-        logger.info(f"✅ Limpieza completada: {deleted_count} secretos eliminados")
+        if not result["running"]:
+            logger.info(f"✅ Limpieza completada: {result['deleted']} secretos eliminados")
         
         return {
             "success": True,
-            "message": "Limpieza completada",
-            "deleted_count": deleted_count,
+            "message": "Limpieza en curso" if result["running"] else "Limpieza completada",
+            "deleted_count": result["deleted"],
+            "completed": result["completed"],
+            "batches": result["batches"],
             "timestamp": now_spain().isoformat()
         }
         
@@ -169,10 +145,7 @@ async def system_health():
     
     # Verificar base de datos
     try:
-        test_response = await database_service.client.table("secrets")\
-            .select("id")\
-            .limit(1)\
-            .execute()
+        await database_service.ping()
         health_status["components"]["database"] = {
             "status": "healthy",
             "message": "Conexión exitosa"
@@ -202,7 +175,6 @@ async def system_health():
     
     # Verificar servicio de cifrado
     try:
-        from app.services.encryption import encryption_service
         test_text = "health_check"
         encrypted = encryption_service.encrypt(test_text)
         decrypted = encryption_service.decrypt(encrypted)
@@ -247,13 +219,27 @@ async def system_info():
             "architecture": platform.machine()
         },
         "configuration": {
-            "max_secret_size_mb": settings.max_secret_size / (1024 * 1024),
+            "storage_backend": settings.storage_backend,
+            "ephemeral_tier": (
+                database_service.get_status() if settings.ephemeral_tier_enabled else {"enabled": False}
+            ),
+            "max_secret_size_kb": settings.max_secret_size_kb,
             "min_ttl_minutes": settings.min_ttl_minutes,
             "max_ttl_minutes": settings.max_ttl_minutes,
-            "default_ttl_minutes": settings.default_ttl_minutes,
-            "min_passphrase_length": settings.min_passphrase_length,
             "cors_enabled": len(settings.cors_origins_list) > 0
         },
+        "tokens": {
+            "conflicts": get_token_conflict_count(),
+            "rejected": get_token_rejection_counts(),
+            "filter": token_filter.get_status()
+        },
+        "passphrase_hashing": passphrase_hasher.get_status(),
+        "encryption": {
+            **encryption_service.get_key_status(),
+            "rotation": key_rotation.get_status()
+        },
+        "purge": expired_purge.get_status(),
+        "compaction": tombstone_compaction.get_status(),
         "scheduler": get_scheduler_status(),
         "timestamp": now_spain().isoformat()
     }
@@ -2,26 +2,94 @@
 Router de endpoints públicos para gestión de secretos
 """
 from fastapi import APIRouter, HTTPException, status, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
 from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+import asyncio
+import base64
+import json
 import logging
+import re
 
+from app.scheduler import expiry_wakeups
 from app.schemas.secret import (
     SecretCreateRequest,
     SecretCreateResponse,
+    SecretBatchCreateRequest,
+    SecretBatchCreateResponse,
+    SecretBatchItemResult,
     SecretReadResponse,
     SecretDeleteResponse,
+    SecretBulkDestroyRequest,
+    SecretBulkDestroyResponse,
     SecretVerifyRequest,
     SecretVerifyResponse
 )
+from app.services.blob_store import blob_store, new_blob_id
+from app.services.counters import lifecycle_counters
 from app.services.database import database_service
 from app.services.encryption import encryption_service
-from app.utils.token_generator import generate_unique_token
+from app.services.hashing import passphrase_hasher, HashingSaturatedError
+from app.services.stream_encryption import StreamDecryptor, StreamEncryptor, generate_key
+from app.services.token_filter import token_filter
+from app.services.tracing import stage
+from app.utils.datetime_utils import spain_to_utc
+from app.utils.token_generator import (
+    TOKEN_EXPIRED,
+    TOKEN_INVALID,
+    check_token,
+    create_with_unique_token,
+    create_many_with_unique_tokens
+)
 from app.utils.validators import calculate_expiration
 from app.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Textos por bloque al cifrar lotes en paralelo
+ENCRYPT_CHUNK_SIZE = 64
+
+# Longitud máxima del nombre de archivo devuelto al descargar
+FILENAME_MAX_LENGTH = 128
+
+
+def _may_exist(token: str) -> bool:
+    """
+    Descarta sin consultar el almacenamiento los tokens falsificados o
+    malformados y los que el filtro de tokens vivos sabe inexistentes
+    """
+    return check_token(token) != TOKEN_INVALID and token_filter.might_exist(token)
+
+
+def _respond(model: BaseModel, status_code: int = status.HTTP_200_OK) -> ORJSONResponse:
+    """
+    Respuesta JSON de un modelo ya validado al construirlo
+    
+    Al devolver un `Response` FastAPI no vuelve a validar el modelo contra
+    `response_model` (que se mantiene para la documentación OpenAPI) ni lo
+    pasa por `jsonable_encoder`. `model_dump(mode="json")` conserva el
+    formato de fechas de pydantic y orjson serializa el resultado.
+    
+    Args:
+        model: Modelo de respuesta
+        status_code: Código HTTP (el del decorador no se aplica a un Response)
+    """
+    return ORJSONResponse(model.model_dump(mode="json"), status_code=status_code)
+
+
+def _hashing_unavailable() -> HTTPException:
+    """
+    Respuesta rápida cuando el executor de hashing está saturado
+    """
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servicio ocupado verificando passphrases. Inténtalo de nuevo en unos segundos",
+        headers={"Retry-After": "1"}
+    )
+
 
 @router.post("/secret", status_code=status.HTTP_201_CREATED, response_model=SecretCreateResponse)
 async def create_secret(request: Request, secret_request: SecretCreateRequest):
@@ -35,26 +103,26 @@ async def create_secret(request: Request, secret_request: SecretCreateRequest):
     Retorna el token único y URL para acceder al secreto
     """
     try:
-        # 1. Generar token único
-        token = await generate_unique_token(database_service)
-        logger.info(f"Token generado para nuevo secreto: {token[:10]}...")
-        
-        # 2. Cifrar contenido
-        encrypted_content = encryption_service.encrypt(secret_request.content)
+        # 1. Cifrar contenido
+        with stage("encrypt"):
+            encrypted_content = encryption_service.encrypt(secret_request.content)
         logger.debug("Contenido cifrado correctamente")
         
-        # 3. Hash de passphrase (si existe)
+        # 2. Hash de passphrase (si existe)
         passphrase_hash = None
         if secret_request.passphrase:
-            passphrase_hash = encryption_service.hash_passphrase(secret_request.passphrase)
+            with stage("hash"):
+                passphrase_hash = await passphrase_hasher.hash(secret_request.passphrase)
             logger.debug("Passphrase hasheada correctamente")
         
-        # 4. Calcular fecha de expiración
-        expires_at = calculate_expiration(secret_request.ttl_minutes)
+        # 3. Calcular fecha de expiración
+        with stage("expiration"):
+            expires_at = calculate_expiration(secret_request.ttl_minutes)
         
-        # 5. Guardar en Supabase
-        result = await database_service.create_secret(
-            token=token,
+        # 4. Guardar con un token nuevo (una sola llamada; la restricción
+        #    UNIQUE decide si hay que reintentar)
+        token, result = await create_with_unique_token(
+            database_service,
             encrypted_content=encrypted_content,
             expires_at=expires_at,
             passphrase_hash=passphrase_hash,
@@ -64,21 +132,27 @@ async def create_secret(request: Request, secret_request: SecretCreateRequest):
                 "content_length": len(secret_request.content)
             }
         )
+        logger.info(f"Token generado para nuevo secreto: {token[:10]}...")
+        lifecycle_counters.incr("created")
+        token_filter.add(token)
+        expiry_wakeups.notify(expires_at)
         
-        # 6. Construir URL completa
+        # 5. Construir URL completa
         base_url = str(request.base_url).rstrip('/')
         secret_url = f"{base_url}/api/secret/{token}"
         
         logger.info(f"Secreto creado exitosamente: {token[:10]}... | Expira: {expires_at}")
         
-        # 7. Retornar respuesta
-        return SecretCreateResponse(
+        # 6. Retornar respuesta
+        return _respond(SecretCreateResponse(
             token=token,
             url=secret_url,
             expires_at=expires_at,
             has_passphrase=passphrase_hash is not None
-        )
+        ), status.HTTP_201_CREATED)
         
+    except HashingSaturatedError:
+        raise _hashing_unavailable()
     except ValueError as e:
         logger.warning(f"Error de validación: {e}")
         raise HTTPException(
@@ -93,6 +167,246 @@ async def create_secret(request: Request, secret_request: SecretCreateRequest):
         )
 
 
+async def _encrypt_parallel(texts: List[str]) -> List[str]:
+    """
+    Cifra los textos en bloques repartidos entre hilos (fuera del event loop)
+    """
+    chunks = [texts[i:i + ENCRYPT_CHUNK_SIZE] for i in range(0, len(texts), ENCRYPT_CHUNK_SIZE)]
+    results = await asyncio.gather(*(
+        asyncio.to_thread(encryption_service.encrypt_many, chunk) for chunk in chunks
+    ))
+    return [encrypted for chunk in results for encrypted in chunk]
+
+
+async def _hash_passphrases(passphrases: List[Optional[str]]) -> List[Union[str, None, Exception]]:
+    """
+    Hashea las passphrases del lote sin ocupar más workers de los que tiene
+    el executor, para no saturar su cola con un único lote
+    """
+    limit = asyncio.Semaphore(passphrase_hasher.workers)
+    
+    async def _hash(passphrase: Optional[str]) -> Optional[str]:
+        if not passphrase:
+            return None
+        async with limit:
+            return await passphrase_hasher.hash(passphrase)
+    
+    return await asyncio.gather(*(_hash(p) for p in passphrases), return_exceptions=True)
+
+
+@router.post("/secrets/batch", status_code=status.HTTP_201_CREATED, response_model=SecretBatchCreateResponse)
+async def create_secrets_batch(request: Request, batch_request: SecretBatchCreateRequest):
+    """
+    Crear varios secretos cifrados en una sola petición
+    
+    - **items**: Lista de secretos con el mismo formato que `POST /api/secret`
+    
+    El contenido se cifra en paralelo y todos los secretos se guardan con una
+    única inserción en bloque. Retorna el resultado de cada elemento en orden;
+    un fallo en un elemento no impide crear el resto.
+    """
+    items = batch_request.items
+    
+    # 1. Validar presupuesto de bytes del lote
+    total_bytes = sum(len(item.content.encode('utf-8')) for item in items)
+    if total_bytes > settings.max_batch_size_bytes:
+        logger.warning(f"Lote rechazado por tamaño: {total_bytes} bytes")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"El lote excede el tamaño máximo de {settings.max_batch_size_kb}KB"
+        )
+    
+    try:
+        # 2. Cifrar contenidos en paralelo
+        with stage("encrypt"):
+            encrypted_contents = await _encrypt_parallel([item.content for item in items])
+        
+        # 3. Hash de passphrases (si existen)
+        with stage("hash"):
+            passphrase_hashes = await _hash_passphrases([item.passphrase for item in items])
+        
+        # 4. Preparar filas; los elementos que fallaron se reportan aparte
+        results: List[Optional[SecretBatchItemResult]] = [None] * len(items)
+        pending: List[int] = []
+        rows: List[Dict[str, Any]] = []
+        
+        for index, (item, encrypted_content, passphrase_hash) in enumerate(
+            zip(items, encrypted_contents, passphrase_hashes)
+        ):
+            if isinstance(passphrase_hash, Exception):
+                error = (
+                    "Servicio ocupado verificando passphrases"
+                    if isinstance(passphrase_hash, HashingSaturatedError)
+                    else "Error al procesar la passphrase"
+                )
+                results[index] = SecretBatchItemResult(index=index, success=False, error=error)
+                continue
+            
+            try:
+                expires_at = calculate_expiration(item.ttl_minutes)
+            except ValueError as e:
+                results[index] = SecretBatchItemResult(index=index, success=False, error=str(e))
+                continue
+            
+            pending.append(index)
+            rows.append({
+                "encrypted_content": encrypted_content,
+                "expires_at": expires_at,
+                "passphrase_hash": passphrase_hash,
+                "metadata": {
+                    "ttl_minutes": item.ttl_minutes,
+                    "has_passphrase": passphrase_hash is not None,
+                    "content_length": len(item.content)
+                }
+            })
+        
+        # 5. Guardar todos los secretos con una única inserción en bloque
+        if rows:
+            tokens, _ = await create_many_with_unique_tokens(database_service, rows)
+            base_url = str(request.base_url).rstrip('/')
+            
+            for index, token, row in zip(pending, tokens, rows):
+                token_filter.add(token)
+                results[index] = SecretBatchItemResult(
+                    index=index,
+                    success=True,
+                    secret=SecretCreateResponse(
+                        token=token,
+                        url=f"{base_url}/api/secret/{token}",
+                        expires_at=row["expires_at"],
+                        has_passphrase=row["passphrase_hash"] is not None
+                    )
+                )
+        
+        created = len(rows)
+        lifecycle_counters.incr("created", created)
+        if rows:
+            expiry_wakeups.notify(min(row["expires_at"] for row in rows))
+        logger.info(f"Lote procesado: {created} secretos creados, {len(items) - created} fallidos")
+        
+        return _respond(SecretBatchCreateResponse(
+            created=created,
+            failed=len(items) - created,
+            results=results
+        ), status.HTTP_201_CREATED)
+        
+    except Exception as e:
+        logger.error(f"Error al crear lote de secretos: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al crear el lote de secretos"
+        )
+
+
+async def _claim_secret(token: str, passphrase: Optional[str], kind: str) -> Dict[str, Any]:
+    """
+    Reclama un secreto de acceso único validando su estado y passphrase
+    
+    Args:
+        token: Token único del secreto
+        passphrase: Contraseña (si fue protegido)
+        kind: Tipo de secreto esperado ("text" o "file")
+        
+    Returns:
+        Fila del secreto ya destruido en almacenamiento
+        
+    Raises:
+        HTTPException: Si el secreto no existe, no está disponible o la
+            passphrase no es válida
+    """
+    # 0. Los tokens firmados ya expirados se rechazan sin consultar el almacenamiento
+    token_status = check_token(token)
+    if token_status == TOKEN_EXPIRED:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Este secreto ha expirado"
+        )
+    
+    # 1. Camino rápido: reclamar el secreto en una sola operación atómica
+    #    (solo aplica a secretos vivos sin passphrase). Si no se puede, el
+    #    almacenamiento devuelve la fila actual para saber el motivo. Los
+    #    tokens falsificados o que el filtro descarta no llegan a la base de datos
+    secret_data = None
+    if token_status != TOKEN_INVALID and token_filter.might_exist(token):
+        claimed, secret_data = await database_service.consume_secret(token, kind=kind)
+        if claimed:
+            lifecycle_counters.incr("read")
+            token_filter.discard(token)
+            return secret_data
+    
+    # 2. No se pudo reclamar: responder según el motivo
+    if not secret_data:
+        logger.warning(f"Intento de acceso a secreto inexistente: {token[:10]}...")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Secreto no encontrado o ya fue destruido"
+        )
+    
+    # 3. Validar que no esté destruido
+    if secret_data['is_destroyed']:
+        logger.warning(f"Intento de acceso a secreto ya destruido: {token[:10]}...")
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Este secreto ya fue accedido y destruido"
+        )
+    
+    # 4. Validar que se use el endpoint correspondiente a su tipo
+    if secret_data.get('kind', 'text') != kind:
+        endpoint = f"/api/secret/{token}/file" if kind == "text" else f"/api/secret/{token}"
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Este secreto es de tipo '{secret_data.get('kind', 'text')}'. Usa GET {endpoint}"
+        )
+    
+    # 5. Validar que no haya expirado
+    expires_at = datetime.fromisoformat(secret_data['expires_at'].replace('Z', '+00:00'))
+    if datetime.now(expires_at.tzinfo) > expires_at:
+        logger.warning(f"Intento de acceso a secreto expirado: {token[:10]}...")
+        # Marcar como destruido
+        await database_service.mark_as_accessed(token)
+        lifecycle_counters.incr("expired")
+        token_filter.discard(token)
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Este secreto ha expirado"
+        )
+    
+    # 6. Validar passphrase (si es requerida)
+    if secret_data['passphrase_hash']:
+        if not passphrase:
+            logger.warning(f"Intento de acceso sin passphrase: {token[:10]}...")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Este secreto requiere una passphrase. Proporciona el parámetro ?passphrase=tu-clave"
+            )
+        
+        with stage("verify"):
+            is_valid = await passphrase_hasher.verify(passphrase, secret_data['passphrase_hash'])
+        
+        if not is_valid:
+            logger.warning(f"Passphrase incorrecta para: {token[:10]}...")
+            lifecycle_counters.incr("wrong_passphrase")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Passphrase incorrecta"
+            )
+    
+    # 7. Reclamar (accessed_at = NOW, is_destroyed = TRUE) solo si nadie
+    #    lo ha hecho entre la lectura y ahora
+    claimed, secret_data = await database_service.consume_secret(token, allow_protected=True, kind=kind)
+    
+    if not claimed:
+        logger.warning(f"Secreto reclamado concurrentemente: {token[:10]}...")
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Este secreto ya fue accedido y destruido"
+        )
+    
+    lifecycle_counters.incr("read")
+    token_filter.discard(token)
+    return secret_data
+
+
 @router.get("/secret/{token}", response_model=SecretReadResponse)
 async def get_secret(token: str, passphrase: str = None):
     """
@@ -107,54 +421,13 @@ async def get_secret(token: str, passphrase: str = None):
     se destruirá automáticamente y no podrá volver a accederse.
     """
     try:
-        # 1. Buscar secreto por token
-        secret_data = await database_service.get_secret_by_token(token)
-        
-        if not secret_data:
-            logger.warning(f"Intento de acceso a secreto inexistente: {token[:10]}...")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Secreto no encontrado o ya fue destruido"
-            )
-        
-        # 2. Validar que no esté destruido
-        if secret_data['is_destroyed']:
-            logger.warning(f"Intento de acceso a secreto ya destruido: {token[:10]}...")
-            raise HTTPException(
-                status_code=status.HTTP_410_GONE,
-                detail="Este secreto ya fue accedido y destruido"
-            )
-        
-        # 3. Validar que no haya expirado
-        expires_at = datetime.fromisoformat(secret_data['expires_at'].replace('Z', '+00:00'))
-        if datetime.now(expires_at.tzinfo) > expires_at:
-            logger.warning(f"Intento de acceso a secreto expirado: {token[:10]}...")
-            # Marcar como destruido
-            await database_service.mark_as_accessed(token)
-            raise HTTPException(
-                status_code=status.HTTP_410_GONE,
-                detail="Este secreto ha expirado"
-            )
-        
-        # 4. Validar passphrase (si es requerida)
-        if secret_data['passphrase_hash']:
-            if not passphrase:
-                logger.warning(f"Intento de acceso sin passphrase: {token[:10]}...")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Este secreto requiere una passphrase. Proporciona el parámetro ?passphrase=tu-clave"
-                )
-            
-            if not encryption_service.verify_passphrase(passphrase, secret_data['passphrase_hash']):
-                logger.warning(f"Passphrase incorrecta para: {token[:10]}...")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Passphrase incorrecta"
-                )
+        # 1. Reclamar el secreto (queda destruido en almacenamiento)
+        secret_data = await _claim_secret(token, passphrase, kind="text")
         
-        # 5. Descifrar contenido
+        # 2. Descifrar contenido
         try:
-            decrypted_content = encryption_service.decrypt(secret_data['encrypted_content'])
+            with stage("decrypt"):
+                decrypted_content = encryption_service.decrypt(secret_data['encrypted_content'])
         except Exception as e:
             logger.error(f"Error al descifrar secreto {token[:10]}...: {e}")
             raise HTTPException(
@@ -162,22 +435,21 @@ async def get_secret(token: str, passphrase: str = None):
                 detail="Error al descifrar el secreto"
             )
         
-        # 6. Marcar como destruido (accessed_at = NOW, is_destroyed = TRUE)
-        await database_service.mark_as_accessed(token)
-        
         created_at = datetime.fromisoformat(secret_data['created_at'].replace('Z', '+00:00'))
         
         logger.info(f"Secreto accedido y destruido: {token[:10]}... | Creado: {created_at}")
         
-        # 7. Retornar contenido descifrado
-        return SecretReadResponse(
+        # 3. Retornar contenido descifrado
+        return _respond(SecretReadResponse(
             content=decrypted_content,
             created_at=created_at,
             message="⚠️ Este secreto ha sido destruido y no puede volver a ser accedido"
-        )
+        ))
         
     except HTTPException:
         raise
+    except HashingSaturatedError:
+        raise _hashing_unavailable()
     except Exception as e:
         logger.error(f"Error al obtener secreto: {e}")
         raise HTTPException(
@@ -186,6 +458,253 @@ async def get_secret(token: str, passphrase: str = None):
         )
 
 
+def _safe_filename(filename: Optional[str]) -> str:
+    """
+    Nombre de archivo apto para la cabecera Content-Disposition
+    """
+    cleaned = re.sub(r"[^A-Za-z0-9._-]", "_", filename or "").strip("._")
+    return cleaned[:FILENAME_MAX_LENGTH] or "secret.bin"
+
+
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"El archivo excede el tamaño máximo de {settings.max_file_size_mb}MB"
+    )
+
+
+async def _encrypt_upload(request: Request, encryptor: StreamEncryptor, counter: Dict[str, int]) -> AsyncIterator[bytes]:
+    """
+    Cifra el cuerpo de la petición a medida que llega, sin acumularlo
+    
+    Raises:
+        HTTPException: 413 si el cuerpo supera el tamaño máximo
+    """
+    async for data in request.stream():
+        counter["size"] += len(data)
+        if counter["size"] > settings.max_file_size_bytes:
+            raise _file_too_large()
+        for sealed in encryptor.update(data):
+            yield sealed
+    for sealed in encryptor.finalize():
+        yield sealed
+
+
+@router.post("/secret/file", status_code=status.HTTP_201_CREATED, response_model=SecretCreateResponse)
+async def create_file_secret(
+    request: Request,
+    ttl_minutes: int = 60,
+    passphrase: Optional[str] = None,
+    filename: Optional[str] = None
+):
+    """
+    Crear un secreto a partir de un archivo (cuerpo binario de la petición)
+    
+    - **body**: Contenido del archivo (máx `MAX_FILE_SIZE_MB`), se envía tal cual
+    - **ttl_minutes**: Tiempo de vida en minutos (5-10080, default 60)
+    - **passphrase**: Contraseña opcional para proteger el secreto (mín 6 caracteres)
+    - **filename**: Nombre del archivo que se devolverá al descargarlo
+    
+    El archivo se cifra por bloques mientras se recibe y se guarda en el
+    almacenamiento de blobs; la memoria usada no depende de su tamaño.
+    Retorna el token único y la URL de descarga
+    """
+    blob_id = None
+    try:
+        # 1. Validar parámetros antes de leer el cuerpo
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.max_file_size_bytes:
+            raise _file_too_large()
+        
+        if passphrase is not None and len(passphrase) < 6:
+            raise ValueError("La passphrase debe tener al menos 6 caracteres")
+        
+        expires_at = calculate_expiration(ttl_minutes)
+        
+        # 2. Cifrar el cuerpo por bloques y guardarlo como blob
+        data_key = generate_key()
+        encryptor = StreamEncryptor(data_key, settings.blob_chunk_size_kb * 1024)
+        counter = {"size": 0}
+        blob_id = new_blob_id(spain_to_utc(expires_at).timestamp())
+        with stage("blob.write"):
+            await blob_store.write(blob_id, _encrypt_upload(request, encryptor, counter))
+        logger.debug(f"Blob cifrado guardado: {counter['size']} bytes")
+        
+        # 3. Hash de passphrase (si existe)
+        passphrase_hash = None
+        if passphrase:
+            with stage("hash"):
+                passphrase_hash = await passphrase_hasher.hash(passphrase)
+        
+        # 4. El secreto guarda el descriptor del blob (con su clave) cifrado
+        descriptor = json.dumps({
+            "blob_id": blob_id,
+            "key": base64.b64encode(data_key).decode(),
+            "filename": _safe_filename(filename),
+            "content_type": request.headers.get("content-type") or "application/octet-stream",
+            "size": counter["size"]
+        })
+        
+        token, _ = await create_with_unique_token(
+            database_service,
+            encrypted_content=encryption_service.encrypt(descriptor),
+            expires_at=expires_at,
+            passphrase_hash=passphrase_hash,
+            metadata={
+                "ttl_minutes": ttl_minutes,
+                "has_passphrase": passphrase_hash is not None,
+                "content_length": counter["size"]
+            },
+            kind="file"
+        )
+        
+        lifecycle_counters.incr("created")
+        token_filter.add(token)
+        expiry_wakeups.notify(expires_at)
+        base_url = str(request.base_url).rstrip('/')
+        logger.info(f"Secreto de archivo creado: {token[:10]}... | {counter['size']} bytes | Expira: {expires_at}")
+        
+        return _respond(SecretCreateResponse(
+            token=token,
+            url=f"{base_url}/api/secret/{token}/file",
+            expires_at=expires_at,
+            has_passphrase=passphrase_hash is not None
+        ), status.HTTP_201_CREATED)
+        
+    except HTTPException:
+        if blob_id:
+            await blob_store.delete(blob_id)
+        raise
+    except HashingSaturatedError:
+        if blob_id:
+            await blob_store.delete(blob_id)
+        raise _hashing_unavailable()
+    except ValueError as e:
+        if blob_id:
+            await blob_store.delete(blob_id)
+        logger.warning(f"Error de validación: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        if blob_id:
+            await blob_store.delete(blob_id)
+        logger.error(f"Error al crear secreto de archivo: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al crear el secreto"
+        )
+
+
+async def _decrypt_download(
+    blob_id: str,
+    reader: AsyncIterator[bytes],
+    first: bytes,
+    decryptor: StreamDecryptor
+) -> AsyncIterator[bytes]:
+    """
+    Descifra el blob bloque a bloque y lo elimina al terminar (acceso único)
+    """
+    try:
+        for plain in decryptor.update(first):
+            yield plain
+        async for data in reader:
+            for plain in decryptor.update(data):
+                yield plain
+        yield decryptor.finalize()
+    except Exception as e:
+        logger.error(f"❌ Blob {blob_id[:16]}... dañado o truncado: {e}")
+        raise
+    finally:
+        await _discard_blob(blob_id, reader)
+
+
+async def _discard_blob(blob_id: str, reader: Optional[AsyncIterator[bytes]] = None) -> None:
+    """
+    Cierra la lectura (si la hay) y elimina el blob de un secreto ya reclamado
+
+    Se puede llamar varias veces: también se ejecuta como tarea de fondo de
+    la descarga, para eliminar el blob aunque el cliente se desconecte antes
+    de que empiece el envío.
+    """
+    if reader is not None:
+        await reader.aclose()
+    await blob_store.delete(blob_id)
+
+
+async def _discard_file_blobs(file_contents: List[bytes]) -> None:
+    """
+    Elimina los blobs de los secretos de archivo destruidos sin leerse
+
+    Un blob que no se pueda eliminar aquí lo borra la limpieza al expirar.
+    """
+    for encrypted in file_contents:
+        try:
+            await _discard_blob(json.loads(encryption_service.decrypt(encrypted))["blob_id"])
+        except Exception as e:
+            logger.error(f"❌ No se pudo eliminar el blob de un secreto destruido: {e}")
+
+
+@router.get("/secret/{token}/file")
+async def get_file_secret(token: str, passphrase: str = None):
+    """
+    Descargar y destruir un secreto de archivo (acceso único)
+    
+    - **token**: Token único del secreto
+    - **passphrase**: Contraseña (si fue protegido) - Query parameter opcional
+    
+    El archivo se descifra por bloques mientras se envía y el blob se elimina
+    al terminar la descarga.
+    """
+    blob_id = None
+    try:
+        # 1. Reclamar el secreto (queda destruido en almacenamiento)
+        secret_data = await _claim_secret(token, passphrase, kind="file")
+        
+        # 2. Descifrar el descriptor del blob
+        descriptor = json.loads(encryption_service.decrypt(secret_data['encrypted_content']))
+        blob_id = descriptor["blob_id"]
+        
+        # 3. Abrir el blob antes de responder para poder devolver un error limpio
+        reader = blob_store.read(blob_id)
+        try:
+            first = await reader.__anext__()
+        except (FileNotFoundError, StopAsyncIteration):
+            logger.error(f"❌ Blob no disponible para el secreto {token[:10]}...")
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="El archivo de este secreto ya no está disponible"
+            )
+        
+        logger.info(f"Secreto de archivo accedido y destruido: {token[:10]}...")
+        
+        # 4. Enviar el contenido descifrado en streaming
+        return StreamingResponse(
+            _decrypt_download(blob_id, reader, first, StreamDecryptor(base64.b64decode(descriptor["key"]))),
+            media_type=descriptor["content_type"],
+            headers={
+                "Content-Disposition": f'attachment; filename="{_safe_filename(descriptor["filename"])}"',
+                "Content-Length": str(descriptor["size"])
+            },
+            background=BackgroundTask(_discard_blob, blob_id, reader)
+        )
+        
+    except HTTPException:
+        raise
+    except HashingSaturatedError:
+        raise _hashing_unavailable()
+    except Exception as e:
+        # El secreto ya está reclamado: su blob no se volverá a leer
+        if blob_id:
+            await _discard_blob(blob_id)
+        logger.error(f"Error al obtener secreto de archivo: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al procesar la solicitud"
+        )
+
+
 @router.delete("/secret/{token}/delete", response_model=SecretDeleteResponse)
 async def delete_secret(token: str):
     """
@@ -197,33 +716,36 @@ async def delete_secret(token: str):
     sin necesidad de leerlo primero.
     """
     try:
-        # 1. Buscar secreto por token
-        secret_data = await database_service.get_secret_by_token(token)
+        # 1. Destruir en una sola operación y clasificar el resultado
+        if _may_exist(token):
+            result = await database_service.destroy_secrets([token])
+        else:
+            result = {"destroyed": [], "already_destroyed": [], "not_found": [token]}
         
-        if not secret_data:
+        if result["not_found"]:
             logger.warning(f"Intento de eliminar secreto inexistente: {token[:10]}...")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Secreto no encontrado"
             )
         
-        # 2. Verificar si ya está destruido
-        if secret_data['is_destroyed']:
+        # 2. Verificar si ya estaba destruido
+        if result["already_destroyed"]:
             logger.info(f"Secreto ya estaba destruido: {token[:10]}...")
-            return SecretDeleteResponse(
+            return _respond(SecretDeleteResponse(
                 success=True,
                 message="El secreto ya estaba destruido previamente"
-            )
-        
-        # 3. Marcar como destruido
-        await database_service.delete_secret(token)
+            ))
         
         logger.info(f"Secreto destruido manualmente: {token[:10]}...")
+        lifecycle_counters.incr("destroyed")
+        token_filter.discard(token)
+        await _discard_file_blobs(result["file_contents"])
         
-        return SecretDeleteResponse(
+        return _respond(SecretDeleteResponse(
             success=True,
             message="Secreto destruido exitosamente sin ser leído"
-        )
+        ))
         
     except HTTPException:
         raise
@@ -235,6 +757,46 @@ async def delete_secret(token: str):
         )
 
 
+@router.post("/secrets/destroy", response_model=SecretBulkDestroyResponse)
+async def destroy_secrets(destroy_request: SecretBulkDestroyRequest):
+    """
+    Destruir varios secretos sin leerlos (revocación masiva)
+    
+    - **tokens**: Lista de tokens a destruir
+    
+    Todos los secretos se destruyen con una única actualización. Retorna qué
+    tokens se destruyeron, cuáles ya estaban destruidos y cuáles no existen.
+    """
+    try:
+        # Los tokens falsificados o que el filtro descarta no llegan a la base de datos
+        tokens = list(dict.fromkeys(destroy_request.tokens))
+        candidates = [token for token in tokens if _may_exist(token)]
+        result = await database_service.destroy_secrets(candidates) if candidates else {
+            "destroyed": [], "already_destroyed": [], "not_found": []
+        }
+        if len(candidates) < len(tokens):
+            candidate_set = set(candidates)
+            result["not_found"].extend(token for token in tokens if token not in candidate_set)
+        lifecycle_counters.incr("destroyed", len(result["destroyed"]))
+        for token in result["destroyed"]:
+            token_filter.discard(token)
+        await _discard_file_blobs(result.pop("file_contents", []))
+        
+        logger.info(
+            f"Destrucción en bloque: {len(result['destroyed'])} destruidos, "
+            f"{len(result['already_destroyed'])} ya destruidos, {len(result['not_found'])} inexistentes"
+        )
+        
+        return _respond(SecretBulkDestroyResponse(**result))
+        
+    except Exception as e:
+        logger.error(f"Error al destruir secretos en bloque: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al destruir los secretos"
+        )
+
+
 @router.post("/secret/verify", response_model=SecretVerifyResponse)
 async def verify_passphrase(verify_request: SecretVerifyRequest):
     """
@@ -249,8 +811,17 @@ async def verify_passphrase(verify_request: SecretVerifyRequest):
     **Nota**: Este endpoint NO marca el secreto como destruido.
     """
     try:
-        # 1. Buscar secreto por token
-        secret_data = await database_service.get_secret_by_token(verify_request.token)
+        # 1. Buscar secreto por token (salvo que la firma o el filtro lo descarten)
+        token_status = check_token(verify_request.token)
+        if token_status == TOKEN_EXPIRED:
+            return _respond(SecretVerifyResponse(
+                valid=False,
+                message="El secreto ha expirado"
+            ))
+        
+        secret_data = None
+        if token_status != TOKEN_INVALID and token_filter.might_exist(verify_request.token):
+            secret_data = await database_service.get_secret_by_token(verify_request.token)
         
         if not secret_data:
             logger.warning(f"Intento de verificar passphrase de secreto inexistente: {verify_request.token[:10]}...")
@@ -261,39 +832,43 @@ async def verify_passphrase(verify_request: SecretVerifyRequest):
         
         # 2. Validar que no esté destruido
         if secret_data['is_destroyed']:
-            return SecretVerifyResponse(
+            return _respond(SecretVerifyResponse(
                 valid=False,
                 message="El secreto ya fue destruido"
-            )
+            ))
         
         # 3. Verificar si tiene passphrase
         if not secret_data['passphrase_hash']:
-            return SecretVerifyResponse(
+            return _respond(SecretVerifyResponse(
                 valid=True,
                 message="Este secreto no tiene passphrase protegida"
-            )
+            ))
         
         # 4. Verificar passphrase
-        is_valid = encryption_service.verify_passphrase(
-            verify_request.passphrase,
-            secret_data['passphrase_hash']
-        )
+        with stage("verify"):
+            is_valid = await passphrase_hasher.verify(
+                verify_request.passphrase,
+                secret_data['passphrase_hash']
+            )
         
         if is_valid:
             logger.info(f"Passphrase verificada correctamente: {verify_request.token[:10]}...")
-            return SecretVerifyResponse(
+            return _respond(SecretVerifyResponse(
                 valid=True,
                 message="Passphrase correcta"
-            )
+            ))
         else:
             logger.warning(f"Passphrase incorrecta en verificación: {verify_request.token[:10]}...")
-            return SecretVerifyResponse(
+            lifecycle_counters.incr("wrong_passphrase")
+            return _respond(SecretVerifyResponse(
                 valid=False,
                 message="Passphrase incorrecta"
-            )
+            ))
         
     except HTTPException:
         raise
+    except HashingSaturatedError:
+        raise _hashing_unavailable()
     except Exception as e:
         logger.error(f"Error al verificar passphrase: {e}")
         raise HTTPException(
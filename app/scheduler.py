@@ -1,43 +1,216 @@
 """
 Scheduler para tareas programadas
-Ejecuta limpieza de secretos expirados cada hora
+
+La limpieza de secretos expirados se programa según la expiración más
+cercana (ver `ExpiryWakeups`), con una ejecución de seguridad cada
+`cleanup_interval_hours`.
 """
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timezone
+from typing import Optional
 import logging
+import time
 
+from app.services.blob_store import blob_store
+from app.services.counters import lifecycle_counters
 from app.services.database import database_service
+from app.services.key_rotation import key_rotation
+from app.services.metrics import metrics
+from app.services.purge import expired_purge, tombstone_compaction
+from app.services.storage import StorageBackend
+from app.services.token_filter import token_filter
 from app.config import settings
+from app.utils.datetime_utils import spain_to_utc
 
 logger = logging.getLogger(__name__)
 
 # Crear scheduler global
 scheduler = AsyncIOScheduler()
 
+CLEANUP_JOB_ID = "cleanup_expired_secrets"
+
+
+class ExpiryWakeups:
+    """
+    Adelanta la limpieza a la próxima expiración conocida
+    
+    Tras cada limpieza se consulta la expiración más cercana del
+    almacenamiento (cabeza del min-heap en memoria, consulta indexada en
+    Supabase) y el job se reprograma para ese momento más
+    `coalesce_seconds`, de modo que las expiraciones cercanas se purgan en
+    un único lote. Las creaciones de este proceso avisan con `notify()` si
+    expiran antes. Sin secretos pendientes el job solo corre en su
+    intervalo de seguridad, que también recoge los secretos creados por
+    otras réplicas.
+    """
+    
+    def __init__(self, storage: StorageBackend, coalesce_seconds: float = 30.0):
+        """
+        Args:
+            storage: Backend de almacenamiento
+            coalesce_seconds: Margen tras la expiración para agrupar las cercanas
+        """
+        self.storage = storage
+        self.coalesce_seconds = coalesce_seconds
+        self.next_wakeup: Optional[float] = None
+    
+    def notify(self, expires_at: datetime) -> None:
+        """
+        Registra un secreto nuevo; reprograma la limpieza si expira antes
+        
+        Args:
+            expires_at: Expiración del secreto (hora de España)
+        """
+        due = spain_to_utc(expires_at).timestamp() + self.coalesce_seconds
+        if self.next_wakeup is None or due < self.next_wakeup:
+            self._schedule(due)
+    
+    async def refresh(self, not_before: Optional[float] = None) -> None:
+        """
+        Programa la siguiente limpieza según la expiración más cercana
+        
+        Args:
+            not_before: No programarla antes de este momento (epoch). Tras
+                un fallo o una pasada incompleta la expiración más cercana
+                ya ha pasado y sin este mínimo el job se repetiría al momento
+        """
+        self.next_wakeup = None
+        next_expiration = await self.storage.next_expiration()
+        if next_expiration is not None:
+            due = datetime.fromisoformat(next_expiration).timestamp() + self.coalesce_seconds
+            self._schedule(due if not_before is None else max(due, not_before))
+    
+    def _schedule(self, due: float) -> None:
+        self.next_wakeup = due
+        job = scheduler.get_job(CLEANUP_JOB_ID) if scheduler.running else None
+        if job is None:
+            return
+        
+        # Solo adelantar: si la ejecución de seguridad llega antes, se mantiene
+        run_at = datetime.fromtimestamp(due, tz=timezone.utc)
+        if job.next_run_time is None or run_at < job.next_run_time:
+            job.modify(next_run_time=run_at)
+
 
 async def cleanup_expired_secrets():
     """
     Tarea programada para eliminar secretos expirados
-    Se ejecuta cada hora
+    Se ejecuta al vencer la expiración más cercana y cada `cleanup_interval_hours`
     """
+    started = time.monotonic()
+    # Si la pasada falla o queda incompleta, la siguiente espera como mínimo coalesce_seconds
+    retry_later = True
     try:
         logger.info("🧹 Iniciando limpieza de secretos expirados...")
         
-        # Obtener secretos expirados
-        expired_secrets = await database_service.get_expired_secrets()
+        # Los blobs de archivos se limpian por su propia expiración
+        await blob_store.purge_expired()
         
-        if not expired_secrets:
-            logger.info("✅ No hay secretos expirados para limpiar")
-            return
-        
-        # Purgar secretos expirados
-        deleted_count = await database_service.purge_expired()
-        
-        logger.info(f"✅ Limpieza completada: {deleted_count} secretos eliminados")
+        # Purgar por lotes: solo se transfieren conteos
+        result = await expired_purge.run()
+        if result["running"]:
+            logger.info("ℹ️ Ya hay una purga en curso; se omite esta ejecución")
+        else:
+            _record_cleanup(started, result["deleted"])
+            logger.info(f"✅ Limpieza completada: {result['deleted']} secretos eliminados en {result['batches']} lotes")
+            retry_later = not result["completed"]
         
     except Exception as e:
         logger.error(f"❌ Error durante la limpieza de secretos: {e}")
+    finally:
+        # Programar siempre la siguiente limpieza, también si esta se omitió
+        try:
+            await expiry_wakeups.refresh(
+                not_before=time.time() + expiry_wakeups.coalesce_seconds if retry_later else None
+            )
+        except Exception as e:
+            logger.error(f"❌ Error al programar la siguiente limpieza: {e}")
+
+
+def _record_cleanup(started: float, deleted_count: int) -> None:
+    """
+    Publica la duración y el resultado de la última limpieza en /metrics
+    """
+    metrics.set_gauge(
+        "autopus_cleanup_last_duration_seconds",
+        "Duración de la última limpieza de secretos expirados",
+        time.monotonic() - started
+    )
+    metrics.set_gauge(
+        "autopus_cleanup_last_deleted",
+        "Secretos eliminados en la última limpieza",
+        deleted_count
+    )
+    metrics.set_gauge(
+        "autopus_cleanup_last_run_timestamp_seconds",
+        "Momento (epoch) de la última limpieza completada",
+        time.time()
+    )
+
+
+async def compact_tombstones():
+    """
+    Tarea programada para borrar las lápidas fuera de la ventana de gracia
+    """
+    try:
+        result = await tombstone_compaction.run()
+        if result["running"]:
+            return
+        
+        metrics.set_gauge(
+            "autopus_compaction_last_deleted",
+            "Lápidas borradas en la última compactación",
+            result["deleted"]
+        )
+        metrics.set_gauge(
+            "autopus_compaction_last_reclaimed_bytes",
+            "Bytes liberados en la última compactación",
+            result["reclaimed_bytes"]
+        )
+        if result["deleted"]:
+            logger.info(
+                f"🧹 Compactación completada: {result['deleted']} lápidas eliminadas, "
+                f"{result['reclaimed_bytes']} bytes liberados"
+            )
+    except Exception as e:
+        logger.error(f"❌ Error durante la compactación de lápidas: {e}")
+
+
+async def rebuild_token_filter():
+    """
+    Tarea programada para reconstruir el filtro de tokens vivos
+    Se ejecuta al arrancar y cada `token_filter_rebuild_minutes`
+    """
+    try:
+        await token_filter.rebuild()
+        logger.info(
+            f"🔑 Filtro de tokens reconstruido: {token_filter.get_status()['entries']} tokens vivos "
+            f"en {token_filter.last_rebuild_seconds}s"
+        )
+    except Exception as e:
+        logger.error(f"❌ Error al reconstruir el filtro de tokens: {e}")
+
+
+async def reencrypt_secrets():
+    """
+    Tarea programada para re-cifrar los secretos vivos con la clave actual
+    
+    Repite la pasada mientras queden filas con una clave anterior (la
+    última pasada las encontró o se han leído secretos con ellas desde
+    entonces); después no vuelve a recorrer la tabla.
+    """
+    if not key_rotation.pending():
+        return
+    
+    await key_rotation.run()
+
+
+async def flush_counters():
+    """
+    Tarea programada para volcar los contadores de eventos de este worker
+    """
+    await lifecycle_counters.flush()
 
 
 def start_scheduler():
@@ -45,20 +218,84 @@ def start_scheduler():
     Iniciar el scheduler con todas las tareas programadas
     """
     try:
-        # Agregar job de limpieza cada hora
+        # Agregar job de limpieza: al arrancar, en cada expiración cercana
+        # (ExpiryWakeups) y como mínimo cada cleanup_interval_hours
         scheduler.add_job(
             cleanup_expired_secrets,
-            trigger=CronTrigger(minute=0),  # Se ejecuta al minuto 0 de cada hora
-            id='cleanup_expired_secrets',
+            trigger=IntervalTrigger(hours=settings.cleanup_interval_hours),
+            id=CLEANUP_JOB_ID,
             name='Limpiar secretos expirados',
             replace_existing=True,
+            next_run_time=datetime.now(timezone.utc),
+            max_instances=1,
+            coalesce=True,
             misfire_grace_time=300  # 5 minutos de gracia si se pierde la ejecución
         )
         
+        # Agregar job de compactación de lápidas
+        if settings.compaction_enabled:
+            scheduler.add_job(
+                compact_tombstones,
+                trigger=IntervalTrigger(minutes=settings.compaction_interval_minutes),
+                id='compact_tombstones',
+                name='Compactar lápidas de secretos destruidos',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+        
+        # Agregar job de reconstrucción del filtro de tokens vivos
+        if settings.token_filter_enabled:
+            scheduler.add_job(
+                rebuild_token_filter,
+                trigger=IntervalTrigger(minutes=settings.token_filter_rebuild_minutes),
+                id='rebuild_token_filter',
+                name='Reconstruir filtro de tokens vivos',
+                replace_existing=True,
+                next_run_time=datetime.now(timezone.utc),
+                max_instances=1,
+                coalesce=True
+            )
+        
+        # Agregar job de re-cifrado tras rotación de claves
+        if settings.key_rotation_enabled:
+            scheduler.add_job(
+                reencrypt_secrets,
+                trigger=IntervalTrigger(minutes=settings.key_rotation_interval_minutes),
+                id='reencrypt_secrets',
+                name='Re-cifrar secretos con la clave actual',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+        
+        # Agregar job de volcado de contadores de eventos
+        scheduler.add_job(
+            flush_counters,
+            trigger=IntervalTrigger(seconds=settings.counters_flush_seconds),
+            id='flush_counters',
+            name='Volcar contadores de eventos',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        
         # Iniciar scheduler
         scheduler.start()
         logger.info("⏰ Scheduler iniciado correctamente")
-        logger.info("📅 Job 'cleanup_expired_secrets' programado cada hora")
+        logger.info(
+            f"📅 Job 'cleanup_expired_secrets' programado por expiración "
+            f"(agrupando {settings.cleanup_coalesce_seconds}s, como mínimo cada {settings.cleanup_interval_hours}h)"
+        )
+        if settings.compaction_enabled:
+            logger.info(
+                f"📅 Job 'compact_tombstones' programado cada {settings.compaction_interval_minutes} minutos "
+                f"(gracia: {settings.compaction_grace_minutes} minutos)"
+            )
+        if settings.token_filter_enabled:
+            logger.info(f"📅 Job 'rebuild_token_filter' programado cada {settings.token_filter_rebuild_minutes} minutos")
+        if settings.key_rotation_enabled:
+            logger.info(f"📅 Job 'reencrypt_secrets' programado cada {settings.key_rotation_interval_minutes} minutos")
         
     except Exception as e:
         logger.error(f"❌ Error al iniciar scheduler: {e}")
@@ -101,5 +338,16 @@ def get_scheduler_status():
     
     return {
         "running": True,
-        "jobs": jobs_info
+        "jobs": jobs_info,
+        "next_expiry_wakeup": (
+            datetime.fromtimestamp(expiry_wakeups.next_wakeup, tz=timezone.utc).isoformat()
+            if expiry_wakeups.next_wakeup is not None else None
+        )
     }
+
+
+# Instancia global de la programación por expiración
+expiry_wakeups = ExpiryWakeups(
+    storage=database_service,
+    coalesce_seconds=settings.cleanup_coalesce_seconds
+)
@@ -3,7 +3,7 @@ Schemas de validación para secretos (DTOs)
 """
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from app.config import settings
 
@@ -53,6 +53,37 @@ class SecretCreateResponse(BaseModel):
     has_passphrase: bool = Field(..., description="Indica si el secreto está protegido por contraseña")
 
 
+class SecretBatchCreateRequest(BaseModel):
+    """
+    DTO para crear varios secretos en una sola petición
+    """
+    items: List[SecretCreateRequest] = Field(
+        ...,
+        description="Secretos a crear",
+        min_length=1,
+        max_length=settings.max_batch_items
+    )
+
+
+class SecretBatchItemResult(BaseModel):
+    """
+    Resultado de un elemento del lote
+    """
+    index: int = Field(..., description="Posición del elemento en la petición")
+    success: bool = Field(..., description="Indica si el secreto se creó")
+    secret: Optional[SecretCreateResponse] = Field(None, description="Secreto creado")
+    error: Optional[str] = Field(None, description="Motivo del fallo")
+
+
+class SecretBatchCreateResponse(BaseModel):
+    """
+    DTO de respuesta al crear secretos en lote
+    """
+    created: int = Field(..., description="Secretos creados")
+    failed: int = Field(..., description="Elementos que no se pudieron crear")
+    results: List[SecretBatchItemResult] = Field(..., description="Resultado por elemento, en orden")
+
+
 class SecretReadResponse(BaseModel):
     """
     DTO de respuesta al leer un secreto
@@ -87,3 +118,24 @@ class SecretDeleteResponse(BaseModel):
     """
     success: bool = Field(..., description="Indica si la eliminación fue exitosa")
     message: str = Field(..., description="Mensaje confirmando la eliminación")
+
+
+class SecretBulkDestroyRequest(BaseModel):
+    """
+    DTO para destruir varios secretos a la vez
+    """
+    tokens: List[str] = Field(
+        ...,
+        description="Tokens de los secretos a destruir",
+        min_length=1,
+        max_length=settings.max_batch_items
+    )
+
+
+class SecretBulkDestroyResponse(BaseModel):
+    """
+    DTO de respuesta al destruir secretos en bloque
+    """
+    destroyed: List[str] = Field(..., description="Tokens destruidos en esta petición")
+    already_destroyed: List[str] = Field(..., description="Tokens que ya estaban destruidos")
+    not_found: List[str] = Field(..., description="Tokens que no existen")
@@ -0,0 +1,167 @@
+"""
+Almacenamiento de blobs cifrados para secretos grandes (archivos)
+
+La fila del secreto solo guarda la referencia al blob y su clave de datos
+cifrada; el contenido cifrado por bloques vive en un `BlobStore`. Los
+identificadores de blob empiezan por su timestamp de expiración, de modo que
+la limpieza no necesita consultar la base de datos.
+"""
+from typing import AsyncIterable, AsyncIterator, Protocol, runtime_checkable
+import asyncio
+import logging
+import os
+import re
+import time
+import uuid
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+BLOB_ID_PATTERN = re.compile(r"^\d{10,}-[0-9a-f]{32}$")
+# Sufijo del archivo mientras se escribe el blob
+PARTIAL_SUFFIX = ".part"
+
+
+def new_blob_id(expires_ts: float) -> str:
+    """
+    Genera un identificador de blob que incluye su expiración (epoch)
+    """
+    return f"{int(expires_ts)}-{uuid.uuid4().hex}"
+
+
+@runtime_checkable
+class BlobStore(Protocol):
+    """
+    Operaciones que necesita la API sobre el almacenamiento de blobs
+    """
+
+    async def write(self, blob_id: str, chunks: AsyncIterable[bytes]) -> int:
+        """Guarda el flujo de bloques y devuelve los bytes escritos."""
+        ...
+
+    def read(self, blob_id: str) -> AsyncIterator[bytes]:
+        """Lee el blob en trozos de tamaño acotado."""
+        ...
+
+    async def delete(self, blob_id: str) -> None:
+        """Elimina el blob (no falla si no existe)."""
+        ...
+
+    async def purge_expired(self) -> int:
+        """Elimina los blobs expirados y devuelve cuántos se borraron."""
+        ...
+
+
+class LocalFileBlobStore:
+    """
+    Blobs en el sistema de archivos local (un archivo por blob)
+    """
+
+    def __init__(self, base_path: str, read_size: int = 64 * 1024):
+        """
+        Args:
+            base_path: Directorio donde se guardan los blobs
+            read_size: Tamaño de cada lectura al descargar
+        """
+        self.base_path = base_path
+        self.read_size = read_size
+
+    def _path(self, blob_id: str) -> str:
+        if not BLOB_ID_PATTERN.match(blob_id):
+            raise ValueError("Identificador de blob inválido")
+        return os.path.join(self.base_path, blob_id)
+
+    async def write(self, blob_id: str, chunks: AsyncIterable[bytes]) -> int:
+        """
+        Escribe el flujo en disco trozo a trozo (memoria constante)
+
+        Si el flujo falla a mitad se elimina el archivo parcial.
+        """
+        path = self._path(blob_id)
+        partial = f"{path}{PARTIAL_SUFFIX}"
+        written = 0
+        await asyncio.to_thread(os.makedirs, self.base_path, exist_ok=True)
+        handle = await asyncio.to_thread(open, partial, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(handle.write, chunk)
+                written += len(chunk)
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(os.replace, partial, path)
+        except BaseException:
+            handle.close()
+            await asyncio.to_thread(self._unlink, partial)
+            raise
+        return written
+
+    async def read(self, blob_id: str) -> AsyncIterator[bytes]:
+        """
+        Lee el blob en trozos de `read_size` bytes
+
+        Raises:
+            FileNotFoundError: Si el blob no existe
+        """
+        handle = await asyncio.to_thread(open, self._path(blob_id), "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(handle.read, self.read_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            handle.close()
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def delete(self, blob_id: str) -> None:
+        """
+        Elimina el blob del disco
+        """
+        await asyncio.to_thread(self._unlink, self._path(blob_id))
+
+    async def purge_expired(self) -> int:
+        """
+        Elimina los blobs cuya expiración (prefijo del nombre) ya pasó
+
+        También elimina los `.part` de subidas interrumpidas (p. ej. si el
+        proceso murió a mitad): llevan la misma expiración que su blob.
+        """
+        def _purge() -> int:
+            if not os.path.isdir(self.base_path):
+                return 0
+            now = time.time()
+            count = 0
+            for name in os.listdir(self.base_path):
+                blob_id = name[:-len(PARTIAL_SUFFIX)] if name.endswith(PARTIAL_SUFFIX) else name
+                if BLOB_ID_PATTERN.match(blob_id) and int(blob_id.split("-", 1)[0]) < now:
+                    self._unlink(os.path.join(self.base_path, name))
+                    count += 1
+            return count
+
+        count = await asyncio.to_thread(_purge)
+        if count:
+            logger.info(f"🧹 {count} blobs expirados eliminados")
+        return count
+
+
+def create_blob_store() -> BlobStore:
+    """
+    Crea el almacenamiento de blobs configurado en BLOB_STORE
+
+    Raises:
+        ValueError: Si el backend configurado no existe
+    """
+    if settings.blob_store.lower() == "local":
+        return LocalFileBlobStore(settings.blob_storage_path, settings.blob_chunk_size_kb * 1024)
+
+    raise ValueError(f"BLOB_STORE desconocido: {settings.blob_store}")
+
+
+# Instancia global del almacenamiento de blobs
+blob_store: BlobStore = create_blob_store()
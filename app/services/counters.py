@@ -0,0 +1,131 @@
+"""
+Contadores de eventos del ciclo de vida de los secretos
+
+Los routers registran cada evento en el momento en que ocurre (creado,
+leído, destruido sin leer, expirado al acceder, passphrase incorrecta) con
+un simple incremento en memoria: todo ocurre en el hilo del event loop, así
+que no hace falta ningún lock.
+
+Periódicamente cada worker suma sus incrementos pendientes a los contadores
+globales del almacenamiento y recibe los totales de todos los workers. Con
+esos totales se responde a `/api/stats` desde memoria y se calculan las
+tasas por minuto sobre una ventana deslizante. Sin incrementos pendientes
+solo se consulta el almacenamiento cuando los totales tienen más de
+`refresh_seconds`, así que un worker sin tráfico no hace una RPC en cada
+volcado.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import logging
+import time
+
+from app.config import settings
+from app.services.database import database_service
+from app.services.storage import StorageBackend
+from app.utils.datetime_utils import now_spain
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ("created", "read", "destroyed", "expired", "wrong_passphrase")
+
+
+class LifecycleCounters:
+    """
+    Registro de contadores por worker con volcado periódico al almacenamiento
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        rate_window_seconds: float = 300.0,
+        refresh_seconds: float = 60.0
+    ):
+        """
+        Args:
+            storage: Backend donde se agregan los contadores de todos los workers
+            rate_window_seconds: Ventana usada para calcular las tasas
+            refresh_seconds: Antigüedad máxima de los totales cuando no hay
+                nada pendiente que volcar
+        """
+        self.storage = storage
+        self.rate_window_seconds = rate_window_seconds
+        self.refresh_seconds = refresh_seconds
+        self._pending: Dict[str, int] = dict.fromkeys(EVENTS, 0)
+        self._totals: Dict[str, int] = dict.fromkeys(EVENTS, 0)
+        self._samples: Deque[Tuple[float, Dict[str, int]]] = deque()
+        self.last_flush_at: Optional[str] = None
+        self._flushed_at: Optional[float] = None
+        self.flush_errors = 0
+        self.flushes_skipped = 0
+
+    def incr(self, event: str, amount: int = 1) -> None:
+        """
+        Registra `amount` ocurrencias de un evento
+        """
+        self._pending[event] += amount
+
+    async def flush(self) -> None:
+        """
+        Suma los incrementos pendientes a los contadores globales
+
+        Si el almacenamiento falla, los incrementos se conservan para el
+        siguiente volcado. Sin incrementos pendientes no se llama al
+        almacenamiento mientras los totales tengan menos de `refresh_seconds`.
+        """
+        deltas = {event: value for event, value in self._pending.items() if value}
+        now = time.monotonic()
+        if not deltas and self._flushed_at is not None and now - self._flushed_at < self.refresh_seconds:
+            self.flushes_skipped += 1
+            return
+
+        self._pending = dict.fromkeys(EVENTS, 0)
+
+        try:
+            totals = await self.storage.flush_counters(deltas)
+        except Exception as e:
+            for event, value in deltas.items():
+                self._pending[event] += value
+            self.flush_errors += 1
+            logger.error(f"❌ Error al volcar contadores de eventos: {e}")
+            return
+
+        self._totals = {event: int(totals.get(event, 0)) for event in EVENTS}
+        self.last_flush_at = now_spain().isoformat()
+
+        now = self._flushed_at = time.monotonic()
+        self._samples.append((now, self._totals))
+        # Conservar una muestra anterior a la ventana como referencia
+        while len(self._samples) > 2 and self._samples[1][0] <= now - self.rate_window_seconds:
+            self._samples.popleft()
+
+    def _rates_per_minute(self) -> Dict[str, float]:
+        if len(self._samples) < 2:
+            return dict.fromkeys(EVENTS, 0.0)
+
+        (first_at, first), (last_at, last) = self._samples[0], self._samples[-1]
+        minutes = (last_at - first_at) / 60
+        return {
+            event: round((last[event] - first[event]) / minutes, 3) if minutes > 0 else 0.0
+            for event in EVENTS
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Totales globales (último volcado + pendientes de este worker) y tasas
+        """
+        return {
+            "totals": {event: self._totals[event] + self._pending[event] for event in EVENTS},
+            "rates_per_minute": self._rates_per_minute(),
+            "rate_window_seconds": self.rate_window_seconds,
+            "last_flush_at": self.last_flush_at,
+            "flush_errors": self.flush_errors,
+            "flushes_skipped": self.flushes_skipped
+        }
+
+
+# Instancia global de los contadores de eventos
+lifecycle_counters = LifecycleCounters(
+    storage=database_service,
+    rate_window_seconds=settings.counters_rate_window_seconds,
+    refresh_seconds=settings.counters_refresh_seconds
+)
@@ -1,16 +1,36 @@
 """
 Cliente de Supabase para operaciones de base de datos
+
+`database_service` es el backend seleccionado con `STORAGE_BACKEND`
+(ver `app.services.storage.StorageBackend`). El backend de Supabase usa el
+cliente asíncrono de Supabase (PostgREST sobre httpx) para que las
+consultas no bloqueen el event loop de uvicorn. Las conexiones HTTP se
+reutilizan mediante un pool keep-alive acotado.
 """
-from supabase import create_client, Client
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
+from postgrest.exceptions import APIError
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union
+import asyncio
+import hashlib
+import httpx
 import logging
 
 from app.config import settings
+from app.services.storage import StorageBackend, TokenConflictError
+from app.services.tracing import stage
 from app.utils.datetime_utils import now_spain, spain_to_utc
 
 logger = logging.getLogger(__name__)
 
+# Código de PostgreSQL para violación de restricción UNIQUE
+UNIQUE_VIOLATION = "23505"
+
+# Código de PostgREST cuando la función RPC no existe
+UNDEFINED_FUNCTION = "PGRST202"
+
+STATS_KEYS = ("total", "active", "accessed", "expired", "protected")
+
 
 class DatabaseService:
     """
@@ -19,25 +39,104 @@ class DatabaseService:
     
     def __init__(self):
         """
-        Inicializa el cliente de Supabase
+        Prepara el servicio; el cliente asíncrono se crea en connect()
         """
-        try:
-            self.client: Client = create_client(
-                settings.supabase_url,
-                settings.supabase_key
+        self.client: Optional[AsyncClient] = None
+        self._connect_lock = asyncio.Lock()
+        self._stats_rpc_available = True
+        self._purge_rpc_available = True
+        self._consume_rpc_available = True
+        self._claim_rpc_available = True
+        self._replace_rpc_available = True
+    
+    async def connect(self) -> AsyncClient:
+        """
+        Inicializa el cliente asíncrono de Supabase (idempotente)
+        
+        Returns:
+            Cliente asíncrono listo para usar
+        """
+        if self.client is not None:
+            return self.client
+        
+        async with self._connect_lock:
+            if self.client is not None:
+                return self.client
+            if not settings.supabase_url or not settings.supabase_key:
+                raise RuntimeError("SUPABASE_URL y SUPABASE_KEY son obligatorios con STORAGE_BACKEND=supabase")
+            try:
+                client = await acreate_client(
+                    settings.supabase_url,
+                    settings.supabase_key,
+                    options=AsyncClientOptions(
+                        postgrest_client_timeout=settings.supabase_timeout_seconds
+                    )
+                )
+                await self._configure_pool(client)
+                self.client = client
+                logger.info("✅ Cliente asíncrono de Supabase inicializado correctamente")
+            except Exception as e:
+                logger.error(f"❌ Error al inicializar cliente de Supabase: {e}")
+                raise
+        
+        return self.client
+    
+    async def _configure_pool(self, client: AsyncClient) -> None:
+        """
+        Sustituye la sesión HTTP de PostgREST por una con límites de pool explícitos
+        
+        Args:
+            client: Cliente asíncrono de Supabase recién creado
+        """
+        postgrest = client.postgrest
+        session = postgrest.session
+        postgrest.session = httpx.AsyncClient(
+            base_url=session.base_url,
+            headers=session.headers,
+            timeout=session.timeout,
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=settings.supabase_pool_max_connections,
+                max_keepalive_connections=settings.supabase_pool_max_keepalive,
+                keepalive_expiry=settings.supabase_pool_keepalive_expiry
             )
-            logger.info("✅ Cliente de Supabase inicializado correctamente")
+        )
+        await session.aclose()
+    
+    async def close(self) -> None:
+        """
+        Cierra las conexiones HTTP del pool
+        """
+        if self.client is None:
+            return
+        try:
+            await self.client.postgrest.aclose()
+            logger.info("✅ Conexiones con Supabase cerradas")
         except Exception as e:
-            logger.error(f"❌ Error al inicializar cliente de Supabase: {e}")
-            raise
+            logger.error(f"❌ Error al cerrar cliente de Supabase: {e}")
+        finally:
+            self.client = None
+    
+    async def ping(self) -> bool:
+        """
+        Comprueba la conexión con una consulta mínima
+        
+        Returns:
+            True si Supabase responde
+        """
+        client = await self.connect()
+        await client.table("secrets").select("id").limit(1).execute()
+        return True
     
     async def create_secret(
         self,
         token: str,
-        encrypted_content: str,
+        encrypted_content: bytes,
         expires_at: datetime,
         passphrase_hash: Optional[str] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        kind: str = "text"
     ) -> Dict[str, Any]:
         """
         Crea un nuevo secreto en la base de datos
@@ -48,29 +147,103 @@ class DatabaseService:
             expires_at: Fecha de expiración
             passphrase_hash: Hash de la passphrase (opcional)
             metadata: Metadatos adicionales (opcional)
+            kind: Tipo de secreto ("text" o "file")
             
         Returns:
             Datos del secreto creado
+            
+        Raises:
+            TokenConflictError: Si ya existe un secreto con ese token
         """
         try:
-            # Convertir fecha de España a UTC para guardar en Supabase
-            expires_at_utc = spain_to_utc(expires_at)
-            
-            data = {
-                "token": token,
-                "encrypted_content": encrypted_content,
-                "expires_at": expires_at_utc.isoformat(),
-                "passphrase_hash": passphrase_hash,
-                "metadata": metadata or {}
-            }
+            data = self._build_row(token, encrypted_content, expires_at, passphrase_hash, metadata, kind)
             
-            result = self.client.table("secrets").insert(data).execute()
+            client = await self.connect()
+            with stage("db.insert"):
+                result = await client.table("secrets").insert(data).execute()
             logger.info(f"✅ Secreto creado con token: {token}")
-            return result.data[0] if result.data else None
+            return self._decode_row(result.data[0]) if result.data else None
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                raise TokenConflictError(token) from e
+            logger.error(f"❌ Error al crear secreto: {e}")
+            raise
         except Exception as e:
             logger.error(f"❌ Error al crear secreto: {e}")
             raise
     
+    async def create_secrets_bulk(self, secrets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Crea varios secretos con un único INSERT
+        
+        Args:
+            secrets: Lista de diccionarios con los argumentos de create_secret
+            
+        Returns:
+            Filas creadas, en el mismo orden
+            
+        Raises:
+            TokenConflictError: Si algún token ya existe (no se inserta ninguno)
+        """
+        try:
+            data = [self._build_row(**secret) for secret in secrets]
+            
+            client = await self.connect()
+            with stage("db.insert_bulk"):
+                result = await client.table("secrets").insert(data).execute()
+            logger.info(f"✅ {len(data)} secretos creados en bloque")
+            return [self._decode_row(row) for row in result.data or []]
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                raise TokenConflictError("bulk") from e
+            logger.error(f"❌ Error al crear secretos en bloque: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error al crear secretos en bloque: {e}")
+            raise
+    
+    @staticmethod
+    def _build_row(
+        token: str,
+        encrypted_content: bytes,
+        expires_at: datetime,
+        passphrase_hash: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        kind: str = "text"
+    ) -> Dict[str, Any]:
+        """
+        Construye la fila a insertar (fechas en UTC, como las guarda Supabase)
+        """
+        return {
+            "token": token,
+            "encrypted_content": DatabaseService._encode_content(encrypted_content),
+            "expires_at": spain_to_utc(expires_at).isoformat(),
+            "passphrase_hash": passphrase_hash,
+            "metadata": metadata or {},
+            "kind": kind
+        }
+    
+    @staticmethod
+    def _encode_content(content: Union[bytes, str]) -> str:
+        """
+        Serializa el contenido cifrado como bytea para PostgREST (`\\x<hex>`);
+        los tokens Fernet antiguos leídos como texto se dejan igual
+        """
+        if isinstance(content, bytes):
+            return "\\x" + content.hex()
+        return content
+    
+    @staticmethod
+    def _decode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convierte `encrypted_content` (bytea, que PostgREST serializa como
+        `\\x<hex>`) a bytes; los tokens Fernet antiguos en texto se dejan igual
+        """
+        content = row.get("encrypted_content")
+        if isinstance(content, str) and content.startswith("\\x"):
+            row["encrypted_content"] = bytes.fromhex(content[2:])
+        return row
+    
     async def get_secret_by_token(self, token: str) -> Optional[Dict[str, Any]]:
         """
         Obtiene un secreto por su token
@@ -82,18 +255,118 @@ class DatabaseService:
             Datos del secreto o None si no existe
         """
         try:
-            result = self.client.table("secrets").select("*").eq("token", token).execute()
+            client = await self.connect()
+            with stage("db.select"):
+                result = await client.table("secrets").select("*").eq("token", token).execute()
             
             if result.data and len(result.data) > 0:
-                return result.data[0]
+                return self._decode_row(result.data[0])
             return None
         except Exception as e:
             logger.error(f"❌ Error al obtener secreto: {e}")
             raise
     
+    async def consume_secret(
+        self,
+        token: str,
+        allow_protected: bool = False,
+        kind: str = "text"
+    ) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Reclama y destruye un secreto en una única operación atómica
+        
+        Usa la función `claim_secret()` (migración 010), que devuelve la
+        fila reclamada con su contenido o, si no se pudo reclamar, la fila
+        actual sin contenido: una sola llamada también en los rechazos. Si
+        aún no existe, reclama con `consume_secret()` (migración 008) o con
+        un UPDATE condicional y consulta la fila aparte al rechazar. En
+        todos los casos dos lectores concurrentes nunca pueden reclamar el
+        mismo secreto.
+        
+        Args:
+            token: Token único del secreto
+            allow_protected: Permitir reclamar secretos con passphrase
+            kind: Tipo de secreto que se espera ("text" o "file")
+            
+        Returns:
+            (True, fila reclamada) o (False, fila actual o None si no existe)
+        """
+        try:
+            client = await self.connect()
+            
+            if self._claim_rpc_available:
+                try:
+                    with stage("db.consume"):
+                        result = await client.rpc("claim_secret", {
+                            "p_token": token,
+                            "p_kind": kind,
+                            "p_allow_protected": allow_protected
+                        }).execute()
+                    secret = result.data["secret"]
+                    if result.data["claimed"]:
+                        logger.info(f"✅ Secreto {token[:10]}... reclamado y destruido")
+                        return True, self._decode_row(secret)
+                    return False, secret
+                except APIError as e:
+                    if e.code != UNDEFINED_FUNCTION:
+                        raise
+                    self._claim_rpc_available = False
+                    logger.warning("⚠️ Función claim_secret no encontrada, los rechazos consultan la fila aparte (aplicar migración 010)")
+            
+            claimed = await self._consume_secret_row(client, token, allow_protected, kind)
+            if claimed:
+                logger.info(f"✅ Secreto {token[:10]}... reclamado y destruido")
+                return True, claimed
+            return False, await self.get_secret_by_token(token)
+        except Exception as e:
+            logger.error(f"❌ Error al reclamar secreto: {e}")
+            raise
+    
+    async def _consume_secret_row(
+        self,
+        client: AsyncClient,
+        token: str,
+        allow_protected: bool,
+        kind: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Reclamo sin la migración 010: función `consume_secret()` (migración
+        008) o UPDATE condicional que solo marca la fila como destruida
+        
+        Returns:
+            Fila reclamada o None si no se cumplió la condición
+        """
+        if self._consume_rpc_available:
+            try:
+                with stage("db.consume"):
+                    result = await client.rpc("consume_secret", {
+                        "p_token": token,
+                        "p_kind": kind,
+                        "p_allow_protected": allow_protected
+                    }).execute()
+                return self._decode_row(result.data[0]) if result.data else None
+            except APIError as e:
+                if e.code != UNDEFINED_FUNCTION:
+                    raise
+                self._consume_rpc_available = False
+                logger.warning("⚠️ Función consume_secret no encontrada, el contenido de los secretos leídos no se libera (aplicar migración 008)")
+        
+        now_utc = spain_to_utc(now_spain()).isoformat()
+        query = client.table("secrets").update({
+            "accessed_at": now_utc,
+            "is_destroyed": True
+        }).eq("token", token).eq("kind", kind).eq("is_destroyed", False).gt("expires_at", now_utc)
+        
+        if not allow_protected:
+            query = query.is_("passphrase_hash", "null")
+        
+        with stage("db.consume"):
+            result = await query.execute()
+        return self._decode_row(result.data[0]) if result.data else None
+    
     async def mark_as_accessed(self, token: str) -> bool:
         """
-        Marca un secreto como accedido (destruido)
+        Marca un secreto como accedido (destruido) y libera su contenido
         
         Args:
             token: Token único del secreto
@@ -103,12 +376,17 @@ class DatabaseService:
         """
         try:
             # Guardar en UTC
-            accessed_at_utc = spain_to_utc(now_spain())
+            accessed_at_utc = spain_to_utc(now_spain()).isoformat()
             
-            result = self.client.table("secrets").update({
-                "accessed_at": accessed_at_utc.isoformat(),
-                "is_destroyed": True
-            }).eq("token", token).execute()
+            client = await self.connect()
+            query = client.table("secrets").update({
+                "accessed_at": accessed_at_utc,
+                "destroyed_at": accessed_at_utc,
+                "is_destroyed": True,
+                "encrypted_content": None
+            }).eq("token", token)
+            with stage("db.update"):
+                await self._returning(query, "token").execute()
             
             logger.info(f"✅ Secreto {token} marcado como destruido")
             return True
@@ -127,10 +405,16 @@ class DatabaseService:
             True si se eliminó correctamente
         """
         try:
-            # Primero marcamos como destruido
-            self.client.table("secrets").update({
-                "is_destroyed": True
-            }).eq("token", token).execute()
+            # Marcamos como destruido y liberamos el contenido; la lápida se
+            # borra en la compactación
+            client = await self.connect()
+            query = client.table("secrets").update({
+                "is_destroyed": True,
+                "destroyed_at": spain_to_utc(now_spain()).isoformat(),
+                "encrypted_content": None
+            }).eq("token", token)
+            with stage("db.update"):
+                await self._returning(query, "token").execute()
             
             logger.info(f"✅ Secreto {token} eliminado")
             return True
@@ -138,42 +422,455 @@ class DatabaseService:
             logger.error(f"❌ Error al eliminar secreto: {e}")
             raise
     
-    async def get_expired_secrets(self) -> List[Dict[str, Any]]:
+    async def destroy_secrets(self, tokens: List[str]) -> Dict[str, List[Any]]:
         """
-        Obtiene todos los secretos expirados
+        Destruye varios secretos con un único UPDATE filtrado por `in_`
+        
+        El UPDATE borra el contenido cifrado, así que antes se leen los
+        descriptores de los secretos de archivo vivos (solo esas filas) para
+        poder eliminar sus blobs. Solo si quedan tokens sin destruir se hace
+        otra consulta (únicamente la columna `token`) para distinguir los ya
+        destruidos de los inexistentes.
         
+        Args:
+            tokens: Tokens a destruir
+            
         Returns:
-            Lista de secretos expirados
+            Diccionario con las listas "destroyed", "already_destroyed" y
+            "not_found", y "file_contents" con el contenido cifrado de los
+            secretos de archivo destruidos
+        """
+        try:
+            client = await self.connect()
+            requested = list(dict.fromkeys(tokens))
+            
+            with stage("db.select"):
+                files = await client.table("secrets")\
+                    .select("token, encrypted_content")\
+                    .in_("token", requested)\
+                    .eq("kind", "file")\
+                    .eq("is_destroyed", False)\
+                    .execute()
+            file_contents = {row["token"]: self._decode_row(row)["encrypted_content"] for row in files.data or []}
+            
+            query = client.table("secrets").update({
+                "is_destroyed": True,
+                "destroyed_at": spain_to_utc(now_spain()).isoformat(),
+                "encrypted_content": None
+            }).in_("token", requested).eq("is_destroyed", False)
+            with stage("db.destroy"):
+                result = await self._returning(query, "token").execute()
+            destroyed = {row["token"] for row in result.data or []}
+            
+            remaining = [token for token in requested if token not in destroyed]
+            existing = set()
+            if remaining:
+                with stage("db.select"):
+                    found = await client.table("secrets")\
+                        .select("token")\
+                        .in_("token", remaining)\
+                        .execute()
+                existing = {row["token"] for row in found.data or []}
+            
+            logger.info(f"✅ {len(destroyed)} secretos destruidos en bloque")
+            return {
+                "destroyed": [token for token in requested if token in destroyed],
+                "already_destroyed": [token for token in remaining if token in existing],
+                "not_found": [token for token in remaining if token not in existing],
+                "file_contents": [
+                    file_contents[token]
+                    for token in requested if token in destroyed and token in file_contents
+                ]
+            }
+        except Exception as e:
+            logger.error(f"❌ Error al destruir secretos en bloque: {e}")
+            raise
+    
+    @staticmethod
+    def _returning(query, columns: str):
+        """
+        Limita las columnas devueltas por un UPDATE/DELETE (parámetro select
+        de PostgREST) para no transferir el contenido cifrado
+        """
+        query.params = query.params.add("select", columns)
+        return query
+    
+    async def get_live_secrets_page(
+        self,
+        after_token: Optional[str],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Obtiene una página de secretos vivos ordenados por token
+        
+        Usa paginación por clave (`token > after_token`) sobre el índice
+        UNIQUE de `token`, así que cada página cuesta lo mismo sin importar
+        cuántas se hayan leído antes.
+        
+        Args:
+            after_token: Último token de la página anterior (None = desde el principio)
+            limit: Tamaño máximo de la página
+            
+        Returns:
+            Filas con "token" y "encrypted_content"
         """
         try:
-            # Comparar con UTC ya que en DB está en UTC
             now_utc = spain_to_utc(now_spain()).isoformat()
-            result = self.client.table("secrets").select("*").lt("expires_at", now_utc).execute()
+            client = await self.connect()
+            
+            query = client.table("secrets")\
+                .select("token,encrypted_content")\
+                .eq("is_destroyed", False)\
+                .gt("expires_at", now_utc)
+            if after_token is not None:
+                query = query.gt("token", after_token)
             
-            return result.data if result.data else []
+            result = await query.order("token").limit(limit).execute()
+            return [self._decode_row(row) for row in result.data or []]
         except Exception as e:
-            logger.error(f"❌ Error al obtener secretos expirados: {e}")
+            logger.error(f"❌ Error al obtener página de secretos vivos: {e}")
             raise
     
-    async def purge_expired(self) -> int:
+    async def get_live_tokens_page(
+        self,
+        after_token: Optional[str],
+        limit: int
+    ) -> List[str]:
         """
-        Elimina todos los secretos expirados de la base de datos
+        Obtiene una página de tokens de secretos vivos ordenados
+        
+        Misma paginación por clave que `get_live_secrets_page`, pero solo
+        con la columna `token`.
         
+        Args:
+            after_token: Último token de la página anterior (None = desde el principio)
+            limit: Tamaño máximo de la página
+            
         Returns:
-            Cantidad de secretos eliminados
+            Tokens de la página
         """
         try:
-            # Comparar con UTC ya que en DB está en UTC
             now_utc = spain_to_utc(now_spain()).isoformat()
-            result = self.client.table("secrets").delete().lt("expires_at", now_utc).execute()
+            client = await self.connect()
+            
+            query = client.table("secrets")\
+                .select("token")\
+                .eq("is_destroyed", False)\
+                .gt("expires_at", now_utc)
+            if after_token is not None:
+                query = query.gt("token", after_token)
+            
+            result = await query.order("token").limit(limit).execute()
+            return [row["token"] for row in result.data or []]
+        except Exception as e:
+            logger.error(f"❌ Error al obtener página de tokens vivos: {e}")
+            raise
+    
+    async def replace_encrypted_content(
+        self,
+        token: str,
+        expected: bytes,
+        encrypted_content: bytes
+    ) -> bool:
+        """
+        Sustituye el contenido cifrado de forma condicional
+        
+        Usa la función `replace_encrypted_content()` (migración 009), que
+        compara el SHA-256 del contenido actual con el del leído, así que
+        el texto cifrado nunca viaja en la URL. Si aún no existe, recurre a
+        un UPDATE condicional sobre el token que solo exige que el secreto
+        siga vivo. En ambos casos una lectura o destrucción concurrente
+        nunca se pisa.
+        
+        Args:
+            token: Token único del secreto
+            expected: Contenido cifrado leído previamente
+            encrypted_content: Nuevo contenido cifrado
+            
+        Returns:
+            True si se actualizó la fila
+        """
+        try:
+            client = await self.connect()
+            
+            if self._replace_rpc_available:
+                if isinstance(expected, str):
+                    expected = expected.encode()
+                try:
+                    result = await client.rpc("replace_encrypted_content", {
+                        "p_token": token,
+                        "p_expected_sha256": hashlib.sha256(expected).hexdigest(),
+                        "p_content": self._encode_content(encrypted_content)
+                    }).execute()
+                    return bool(result.data)
+                except APIError as e:
+                    if e.code != UNDEFINED_FUNCTION:
+                        raise
+                    self._replace_rpc_available = False
+                    logger.warning("⚠️ Función replace_encrypted_content no encontrada, re-cifrando sin comparar el contenido (aplicar migración 009)")
+            
+            query = client.table("secrets").update({
+                "encrypted_content": self._encode_content(encrypted_content)
+            }).eq("token", token).eq("is_destroyed", False)
+            
+            result = await self._returning(query, "token").execute()
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"❌ Error al sustituir contenido cifrado: {e}")
+            raise
+    
+    async def next_expiration(self) -> Optional[str]:
+        """
+        Obtiene la expiración más cercana con una lectura del índice de
+        `expires_at` (migración 007)
+        
+        Returns:
+            Fecha ISO en UTC o None si no hay secretos
+        """
+        try:
+            client = await self.connect()
+            result = await client.table("secrets")\
+                .select("expires_at")\
+                .order("expires_at")\
+                .limit(1)\
+                .execute()
+            return result.data[0]["expires_at"] if result.data else None
+        except Exception as e:
+            logger.error(f"❌ Error al obtener la próxima expiración: {e}")
+            raise
+    
+    async def purge_expired_batch(
+        self,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Elimina un lote de secretos expirados devolviendo solo el conteo
+        
+        Usa la función `purge_expired_secrets()` (migración 007): un DELETE
+        acotado sobre el índice de `expires_at`, con paginación por clave a
+        partir del cursor y `SKIP LOCKED` para no esperar a filas bloqueadas.
+        Si aún no existe, selecciona los ids del lote y los borra con
+        `return=minimal`, sin leer nunca el contenido cifrado.
+        
+        Args:
+            cutoff: Se eliminan los secretos que expiraron antes (ISO 8601 UTC)
+            after: Cursor del lote anterior (None = desde el principio)
+            limit: Máximo de secretos por lote
             
-            count = len(result.data) if result.data else 0
-            logger.info(f"🧹 Limpieza completada: {count} secretos expirados eliminados")
-            return count
+        Returns:
+            (eliminados, cursor para el siguiente lote)
+        """
+        try:
+            client = await self.connect()
+            
+            if self._purge_rpc_available:
+                try:
+                    result = await client.rpc(
+                        "purge_expired_secrets",
+                        {"p_cutoff": cutoff, "p_after": after, "p_limit": limit}
+                    ).execute()
+                    row = result.data[0] if isinstance(result.data, list) else result.data
+                    return int(row["deleted"] or 0), row["last_expires_at"] or after
+                except APIError as e:
+                    if e.code != UNDEFINED_FUNCTION:
+                        raise
+                    self._purge_rpc_available = False
+                    logger.warning("⚠️ Función purge_expired_secrets no encontrada, usando borrado por ids (aplicar migración 007)")
+            
+            return await self._purge_expired_by_ids(client, cutoff, after, limit)
         except Exception as e:
             logger.error(f"❌ Error al purgar secretos expirados: {e}")
             raise
+    
+    @staticmethod
+    async def _purge_expired_by_ids(
+        client: AsyncClient,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Lote de purga en dos peticiones PostgREST (ids y DELETE por ids)
+        """
+        query = client.table("secrets").select("id,expires_at").lt("expires_at", cutoff)
+        if after is not None:
+            query = query.gte("expires_at", after)
+        result = await query.order("expires_at").limit(limit).execute()
+        rows = result.data or []
+        if not rows:
+            return 0, after
+        
+        # postgrest-py no lee el conteo de una respuesta vacía: se cuentan
+        # los ids del lote (alguno pudo borrarse en paralelo)
+        await client.table("secrets")\
+            .delete(returning="minimal")\
+            .in_("id", [row["id"] for row in rows])\
+            .execute()
+        return len(rows), rows[-1]["expires_at"]
+    
+    async def compact_destroyed_batch(
+        self,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, int, Optional[str]]:
+        """
+        Borra definitivamente un lote de lápidas destruidas antes de `cutoff`
+        
+        Usa la función `compact_destroyed_secrets()` (migración 008) con
+        paginación por clave sobre `destroyed_at`.
+        
+        Args:
+            cutoff: Se borran las lápidas destruidas antes (ISO 8601 UTC)
+            after: Cursor del lote anterior (None = desde el principio)
+            limit: Máximo de lápidas por lote
+            
+        Returns:
+            (borradas, bytes liberados, cursor para el siguiente lote)
+        """
+        try:
+            client = await self.connect()
+            result = await client.rpc(
+                "compact_destroyed_secrets",
+                {"p_cutoff": cutoff, "p_after": after, "p_limit": limit}
+            ).execute()
+            row = result.data[0] if isinstance(result.data, list) else result.data
+            return int(row["deleted"] or 0), int(row["reclaimed_bytes"] or 0), row["last_destroyed_at"] or after
+        except Exception as e:
+            logger.error(f"❌ Error al compactar secretos destruidos: {e}")
+            raise
+    
+    async def flush_counters(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        """
+        Suma los incrementos a los contadores globales en una sola llamada RPC
+        
+        Args:
+            deltas: Incrementos por evento (puede estar vacío para solo leer)
+            
+        Returns:
+            Totales por evento de todos los workers
+        """
+        try:
+            client = await self.connect()
+            result = await client.rpc("increment_secret_counters", {"deltas": deltas}).execute()
+            return {row["event"]: int(row["value"]) for row in result.data or []}
+        except Exception as e:
+            logger.error(f"❌ Error al volcar contadores: {e}")
+            raise
+    
+    async def increment_rate_limits(self, window: int, deltas: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        """
+        Suma las peticiones de un lote del rate limiter en una sola llamada RPC
+        
+        Args:
+            window: Índice de la ventana (epoch // duración de la ventana)
+            deltas: Peticiones por clave
+            
+        Returns:
+            (contador de la ventana, contador de la anterior) por clave
+        """
+        try:
+            client = await self.connect()
+            result = await client.rpc(
+                "increment_rate_limits",
+                {"p_window": window, "p_deltas": deltas}
+            ).execute()
+            return {
+                row["key"]: (int(row["current_hits"]), int(row["previous_hits"]))
+                for row in result.data or []
+            }
+        except Exception as e:
+            logger.error(f"❌ Error al sincronizar el rate limiter: {e}")
+            raise
+    
+    async def get_stats(self) -> Dict[str, int]:
+        """
+        Obtiene los contadores globales de secretos en una sola consulta
+        
+        Usa la función `secrets_stats()` (migración 004) vía RPC. Si aún no
+        existe, recurre a conteos sin filas (HEAD con count=exact) en paralelo.
+        
+        Returns:
+            Diccionario con total, activos, accedidos, expirados y protegidos
+        """
+        try:
+            client = await self.connect()
+            
+            if self._stats_rpc_available:
+                try:
+                    result = await client.rpc("secrets_stats", {}).execute()
+                    row = result.data[0] if isinstance(result.data, list) else result.data
+                    return {key: int(row[key] or 0) for key in STATS_KEYS}
+                except APIError as e:
+                    if e.code != UNDEFINED_FUNCTION:
+                        raise
+                    self._stats_rpc_available = False
+                    logger.warning("⚠️ Función secrets_stats no encontrada, usando conteos separados (aplicar migración 004)")
+            
+            return await self._get_stats_with_counts(client)
+        except Exception as e:
+            logger.error(f"❌ Error al obtener estadísticas: {e}")
+            raise
+    
+    @staticmethod
+    async def _get_stats_with_counts(client: AsyncClient) -> Dict[str, int]:
+        """
+        Contadores mediante peticiones HEAD (solo cabecera Content-Range)
+        """
+        now_utc = spain_to_utc(now_spain()).isoformat()
+        
+        def _head():
+            return client.table("secrets").select("token", count="exact", head=True)
+        
+        # Total, activos, accedidos, expirados y protegidos
+        responses = await asyncio.gather(
+            _head().execute(),
+            _head().eq("is_destroyed", False).gte("expires_at", now_utc).execute(),
+            _head().eq("is_destroyed", True).not_.is_("accessed_at", "null").execute(),
+            _head().lt("expires_at", now_utc).execute(),
+            _head().not_.is_("passphrase_hash", "null").execute()
+        )
+        
+        return {key: response.count or 0 for key, response in zip(STATS_KEYS, responses)}
+
+
+def create_database_service() -> StorageBackend:
+    """
+    Crea el backend de almacenamiento configurado en STORAGE_BACKEND
+    
+    Returns:
+        Instancia que implementa StorageBackend
+        
+    Raises:
+        ValueError: Si el backend configurado no existe
+    """
+    backend = settings.storage_backend.lower()
+    
+    if backend == "supabase":
+        storage = DatabaseService()
+    elif backend == "memory":
+        from app.services.memory_storage import InMemoryStorageService
+        logger.warning("⚠️ Usando almacenamiento en memoria: los secretos no son persistentes")
+        storage = InMemoryStorageService()
+    else:
+        raise ValueError(f"STORAGE_BACKEND desconocido: {settings.storage_backend}")
+    
+    if settings.ephemeral_tier_enabled:
+        from app.services.ephemeral_storage import EphemeralStorageService, TieredStorageService
+        logger.warning(
+            f"⚠️ Nivel efímero activo: los secretos con TTL ≤ {settings.ephemeral_tier_max_ttl_minutes} min "
+            f"se guardan solo en memoria (máx. {settings.ephemeral_tier_max_mb} MB) y no son persistentes"
+        )
+        storage = TieredStorageService(
+            durable=storage,
+            ephemeral=EphemeralStorageService(max_bytes=settings.ephemeral_tier_max_mb * 1024 * 1024),
+            max_ttl_minutes=settings.ephemeral_tier_max_ttl_minutes
+        )
+    
+    return storage
 
 
-# Instancia global del servicio de base de datos
-database_service = DatabaseService()
+# Instancia global del backend de almacenamiento
+database_service: StorageBackend = create_database_service()
@@ -1,14 +1,69 @@
 """
-Servicio de cifrado usando Fernet (AES-256)
+Servicio de cifrado de secretos (AES-256-GCM)
+
+Los secretos se guardan como un sobre binario versionado:
+
+    v2: versión (1) | id de clave (4) | nonce (12) | texto cifrado + tag GCM (16)
+    v1: versión (1) | nonce (12) | texto cifrado + tag GCM (16)
+
+frente a un token Fernet (base64 de versión, timestamp, IV, AES-CBC y HMAC),
+que ocupa un 33% más y 57 bytes fijos adicionales. Los secretos antiguos en
+formato Fernet o v1 se siguen descifrando.
+
+Rotación de claves: ENCRYPTION_KEY es la clave actual (la única con la que se
+cifra) y ENCRYPTION_KEYS_PREVIOUS las anteriores, aceptadas solo para leer.
+El id de clave del sobre v2 permite saber qué filas hay que volver a cifrar
+(ver `app.services.key_rotation`).
+
+El hash de passphrases se delega en la capa de KDF (`app.services.kdf`).
 """
-from cryptography.fernet import Fernet
-import bcrypt
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from typing import Any, Dict, List, Union
+import base64
+import hashlib
 import logging
+import os
 
 from app.config import settings
+from app.services import kdf
+from app.services.kdf import kdf_policy
 
 logger = logging.getLogger(__name__)
 
+ENVELOPE_VERSION = 2
+ENVELOPE_V1 = 1
+KEY_ID_BYTES = 4
+NONCE_BYTES = 12
+
+# Todo token Fernet empieza por el byte de versión 0x80 ("gAAAAA" en base64)
+FERNET_PREFIX = b"gAAAAA"
+
+
+def derive_envelope_key(encryption_key: str) -> bytes:
+    """
+    Deriva la clave AES-256-GCM a partir de ENCRYPTION_KEY (clave Fernet)
+
+    Se usa HKDF para no reutilizar el mismo material de clave en dos
+    construcciones distintas (Fernet y el sobre binario).
+    """
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"autopus-secret-api/envelope-v1"
+    ).derive(base64.urlsafe_b64decode(encryption_key))
+
+
+def envelope_key_id(envelope_key: bytes) -> bytes:
+    """
+    Identificador corto (no secreto) de una clave de sobre
+    """
+    return hashlib.sha256(envelope_key).digest()[:KEY_ID_BYTES]
+
 
 class EncryptionService:
     """
@@ -17,80 +72,175 @@ class EncryptionService:
     
     def __init__(self):
         """
-        Inicializa el servicio con la clave de cifrado
+        Inicializa el servicio con la clave actual y las anteriores
         """
         try:
-            self.fernet = Fernet(settings.encryption_key.encode())
-            logger.info("✅ Servicio de cifrado inicializado correctamente")
+            keys = [settings.encryption_key] + settings.encryption_keys_previous_list
+            
+            self.fernet = MultiFernet([Fernet(key.encode()) for key in keys])
+            self._aeads: Dict[bytes, AESGCM] = {}
+            for key in keys:
+                envelope_key = derive_envelope_key(key)
+                self._aeads.setdefault(envelope_key_id(envelope_key), AESGCM(envelope_key))
+            
+            self.current_key_id = envelope_key_id(derive_envelope_key(settings.encryption_key))
+            self.aead = self._aeads[self.current_key_id]
+            # Contenidos descifrados con una clave o formato anteriores
+            self.previous_key_decryptions = 0
+            logger.info(
+                f"✅ Servicio de cifrado inicializado correctamente "
+                f"(clave {self.current_key_id.hex()}, {len(self._aeads) - 1} anteriores)"
+            )
         except Exception as e:
             logger.error(f"❌ Error al inicializar servicio de cifrado: {e}")
             raise
     
-    def encrypt(self, text: str) -> str:
+    def encrypt(self, text: str) -> bytes:
         """
-        Cifra un texto usando Fernet (AES-256)
+        Cifra un texto con AES-256-GCM y la clave actual (sobre v2)
         
         Args:
             text: Texto plano a cifrar
             
         Returns:
-            Texto cifrado en base64
+            Sobre cifrado en bytes
         """
         try:
-            encrypted_bytes = self.fernet.encrypt(text.encode())
-            return encrypted_bytes.decode()
+            header = bytes([ENVELOPE_VERSION]) + self.current_key_id
+            nonce = os.urandom(NONCE_BYTES)
+            return header + nonce + self.aead.encrypt(nonce, text.encode(), header)
         except Exception as e:
             logger.error(f"Error al cifrar: {e}")
             raise
     
-    def decrypt(self, encrypted_text: str) -> str:
+    def encrypt_many(self, texts: List[str]) -> List[bytes]:
         """
-        Descifra un texto cifrado con Fernet
+        Cifra varios textos reutilizando la misma instancia de AES-GCM
+        
+        Pensado para ejecutarse en un hilo por bloque de textos: las
+        primitivas de OpenSSL liberan el GIL, así que varios bloques se
+        cifran en paralelo.
         
         Args:
-            encrypted_text: Texto cifrado en base64
+            texts: Textos planos a cifrar
+            
+        Returns:
+            Sobres cifrados en el mismo orden
+        """
+        return [self.encrypt(text) for text in texts]
+    
+    def decrypt(self, encrypted: Union[bytes, str]) -> str:
+        """
+        Descifra un sobre binario (v2 o v1) o un token Fernet antiguo
+        
+        Args:
+            encrypted: Sobre cifrado, o token Fernet (bytes o texto base64)
             
         Returns:
             Texto plano descifrado
+            
+        Raises:
+            ValueError: Si el formato no es reconocido o la clave no está configurada
         """
         try:
-            decrypted_bytes = self.fernet.decrypt(encrypted_text.encode())
-            return decrypted_bytes.decode()
+            if isinstance(encrypted, str):
+                encrypted = encrypted.encode()
+            
+            if encrypted.startswith(FERNET_PREFIX):
+                self.previous_key_decryptions += 1
+                return self.fernet.decrypt(encrypted).decode()
+            
+            version = encrypted[:1]
+            
+            if version == bytes([ENVELOPE_VERSION]):
+                header = encrypted[:1 + KEY_ID_BYTES]
+                aead = self._aeads.get(header[1:])
+                if aead is None:
+                    raise ValueError(f"Clave de cifrado {header[1:].hex()} no configurada")
+                if aead is not self.aead:
+                    self.previous_key_decryptions += 1
+                nonce = encrypted[len(header):len(header) + NONCE_BYTES]
+                return aead.decrypt(nonce, encrypted[len(header) + NONCE_BYTES:], header).decode()
+            
+            if version == bytes([ENVELOPE_V1]):
+                self.previous_key_decryptions += 1
+                # v1 no guarda el id de clave: probar todas las configuradas
+                nonce = encrypted[1:1 + NONCE_BYTES]
+                for aead in self._aeads.values():
+                    try:
+                        return aead.decrypt(nonce, encrypted[1 + NONCE_BYTES:], version).decode()
+                    except InvalidTag:
+                        continue
+                raise InvalidTag()
+            
+            raise ValueError("Formato de contenido cifrado desconocido")
         except Exception as e:
             logger.error(f"Error al descifrar: {e}")
             raise
     
+    def needs_reencryption(self, encrypted: Union[bytes, str]) -> bool:
+        """
+        Indica si el contenido no está cifrado con la clave y formato actuales
+        """
+        if isinstance(encrypted, str):
+            encrypted = encrypted.encode()
+        return encrypted[:1 + KEY_ID_BYTES] != bytes([ENVELOPE_VERSION]) + self.current_key_id
+    
+    def reencrypt(self, encrypted: Union[bytes, str]) -> bytes:
+        """
+        Vuelve a cifrar el contenido con la clave actual
+        
+        Args:
+            encrypted: Contenido cifrado en cualquier formato soportado
+            
+        Returns:
+            Sobre v2 cifrado con la clave actual
+        """
+        return self.encrypt(self.decrypt(encrypted))
+    
+    def get_key_status(self) -> Dict[str, Any]:
+        """
+        Claves configuradas para /api/system/info (solo identificadores) y
+        cuántos contenidos con una clave o formato anteriores ha descifrado
+        este proceso
+        """
+        return {
+            "current_key_id": self.current_key_id.hex(),
+            "previous_key_ids": [key_id.hex() for key_id in self._aeads if key_id != self.current_key_id],
+            "previous_key_decryptions": self.previous_key_decryptions
+        }
+    
     def hash_passphrase(self, passphrase: str) -> str:
         """
-        Genera un hash bcrypt de una passphrase
+        Genera un hash de una passphrase con la política de KDF configurada
+        (bloqueante; desde los handlers usar `passphrase_hasher.hash`)
         
         Args:
             passphrase: Contraseña en texto plano
             
         Returns:
-            Hash bcrypt en formato string
+            Hash autodescriptivo (bcrypt o scrypt) en formato string
         """
         try:
-            salt = bcrypt.gensalt()
-            hashed = bcrypt.hashpw(passphrase.encode(), salt)
-            return hashed.decode()
+            return kdf.hash_passphrase(passphrase, kdf_policy.algorithm, kdf_policy.cost)
         except Exception as e:
             logger.error(f"Error al hacer hash de passphrase: {e}")
             raise
     
     def verify_passphrase(self, passphrase: str, hashed: str) -> bool:
         """
-        Verifica si una passphrase coincide con su hash
+        Verifica si una passphrase coincide con su hash (bloqueante; desde
+        los handlers usar `passphrase_hasher.verify`)
         
         Args:
             passphrase: Contraseña en texto plano
-            hashed: Hash bcrypt a comparar
+            hashed: Hash almacenado (bcrypt o scrypt)
             
         Returns:
             True si la passphrase es correcta, False en caso contrario
         """
         try:
-            return bcrypt.checkpw(passphrase.encode(), hashed.encode())
+            return kdf.verify_passphrase(passphrase, hashed)
         except Exception as e:
             logger.error(f"Error al verificar passphrase: {e}")
             return False
@@ -0,0 +1,367 @@
+"""
+Nivel efímero en memoria para secretos de TTL corto
+
+La mayoría de los secretos viven entre 5 y 15 minutos y se leen en
+segundos; en Supabase cada uno cuesta un INSERT, un SELECT, un UPDATE y el
+DELETE de la purga. Con el nivel efímero activo los secretos con TTL igual
+o inferior a `ephemeral_tier_max_ttl_minutes` se guardan (cifrados, igual
+que en la base de datos) en un almacén acotado de este proceso, y todo su
+ciclo de vida son operaciones en memoria.
+
+- `EphemeralStorageService`: `InMemoryStorageService` con un tope de
+  memoria. Si una inserción no cabe se desalojan primero las filas
+  expiradas, después las lápidas y, si no basta, los secretos vivos por
+  orden de expiración (los que antes iban a expirar).
+- `TieredStorageService`: implementa `StorageBackend` delante del backend
+  duradero y decide el nivel de cada secreto al crearlo. Las búsquedas
+  prueban primero el nivel efímero (un acceso a diccionario).
+
+⚠️ El nivel efímero NO es duradero: sus secretos se pierden al reiniciar,
+no se comparten entre workers ni réplicas y pueden desalojarse antes de
+expirar si se alcanza el tope de memoria. Un secreto perdido responde 404.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import heapq
+import logging
+import time
+
+from app.services.memory_storage import InMemoryStorageService, row_size
+from app.services.metrics import metrics
+from app.services.storage import StorageBackend
+from app.utils.datetime_utils import spain_to_utc
+
+logger = logging.getLogger(__name__)
+
+
+class EphemeralStorageService(InMemoryStorageService):
+    """
+    Almacén en memoria con tope de bytes y desalojo por orden de expiración
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: Memoria máxima ocupada por las filas
+        """
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._sizes: Dict[str, int] = {}
+        # Bytes de una fila además del contenido y el token (se ajusta al insertar)
+        self._row_overhead = 1024
+        self.evicted_inactive = 0
+        self.evicted_live = 0
+
+    def fits(self, size: int) -> bool:
+        """
+        Indica si una fila de `size` bytes puede guardarse en este nivel
+        """
+        return size <= self.max_bytes
+
+    def _insert_row(self, token: str, encrypted_content: bytes, *args, **kwargs) -> Dict[str, Any]:
+        payload = len(encrypted_content) + len(token)
+        self._make_room(payload + self._row_overhead)
+        row = super()._insert_row(token, encrypted_content, *args, **kwargs)
+        self._resize(token, row)
+        self._row_overhead = self._sizes[token] - payload
+        return row
+
+    def _make_room(self, size: int) -> None:
+        """
+        Desaloja por orden de expiración hasta que quepan `size` bytes más
+        """
+        now = time.time()
+        heap = self._expiry_heap
+
+        # 1. Expirados (cabeza del heap)
+        while heap and heap[0][0] <= now and self.bytes + size > self.max_bytes:
+            _, token = heapq.heappop(heap)
+            if self._remove(token) is not None:
+                self.evicted_inactive += 1
+
+        # 2. Lápidas, las más antiguas primero
+        while self._tombstones and self.bytes + size > self.max_bytes:
+            _, token = self._tombstones.popleft()
+            if self._remove(token) is not None:
+                self.evicted_inactive += 1
+
+        # 3. Secretos vivos, los que antes expiran primero
+        while heap and self.bytes + size > self.max_bytes:
+            _, token = heapq.heappop(heap)
+            if self._remove(token) is not None:
+                self.evicted_live += 1
+                logger.warning(f"⚠️ Secreto vivo desalojado del nivel efímero por falta de memoria: {token[:10]}...")
+
+    def _resize(self, token: str, row: Dict[str, Any]) -> None:
+        size = row_size(row)
+        self.bytes += size - self._sizes.get(token, 0)
+        self._sizes[token] = size
+
+    def _remove(self, token: str) -> Optional[Dict[str, Any]]:
+        row = super()._remove(token)
+        if row is not None:
+            self.bytes -= self._sizes.pop(token)
+        return row
+
+    def _destroy(self, token: str, row: Dict[str, Any]) -> None:
+        super()._destroy(token, row)
+        self._resize(token, row)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Ocupación y desalojos para /api/system/info
+        """
+        return {
+            "rows": len(self._rows),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evicted_inactive": self.evicted_inactive,
+            "evicted_live": self.evicted_live
+        }
+
+
+class TieredStorageService:
+    """
+    `StorageBackend` que guarda los secretos de TTL corto en el nivel
+    efímero y el resto en el backend duradero
+    """
+
+    def __init__(self, durable: StorageBackend, ephemeral: EphemeralStorageService, max_ttl_minutes: int):
+        """
+        Args:
+            durable: Backend duradero (Supabase o memoria)
+            ephemeral: Nivel efímero
+            max_ttl_minutes: TTL máximo de los secretos que van al nivel efímero
+        """
+        self.durable = durable
+        self.ephemeral = ephemeral
+        self.max_ttl_minutes = max_ttl_minutes
+        self.stored_ephemeral = 0
+        self.stored_durable = 0
+        self._register_metrics()
+
+    def _register_metrics(self) -> None:
+        metrics.register_gauge(
+            "autopus_ephemeral_tier_bytes",
+            "Memoria ocupada por el nivel efímero",
+            lambda: self.ephemeral.bytes
+        )
+        metrics.register_gauge(
+            "autopus_ephemeral_tier_max_bytes",
+            "Tope de memoria del nivel efímero",
+            lambda: self.ephemeral.max_bytes
+        )
+        metrics.register_gauge(
+            "autopus_ephemeral_tier_rows",
+            "Filas (secretos y lápidas) en el nivel efímero",
+            lambda: len(self.ephemeral)
+        )
+        metrics.register_counter(
+            "autopus_ephemeral_tier_evicted_inactive_total",
+            "Secretos expirados o lápidas desalojados por falta de memoria",
+            lambda: self.ephemeral.evicted_inactive
+        )
+        metrics.register_counter(
+            "autopus_ephemeral_tier_evicted_live_total",
+            "Secretos vivos desalojados por falta de memoria (perdidos)",
+            lambda: self.ephemeral.evicted_live
+        )
+        metrics.register_counter(
+            "autopus_ephemeral_tier_stored_total",
+            "Secretos creados en el nivel efímero",
+            lambda: self.stored_ephemeral
+        )
+        metrics.register_counter(
+            "autopus_ephemeral_tier_stored_durable_total",
+            "Secretos creados en el backend duradero",
+            lambda: self.stored_durable
+        )
+
+    def _is_ephemeral(self, expires_at: datetime, encrypted_content: bytes) -> bool:
+        """
+        Decide si un secreto nuevo va al nivel efímero
+        """
+        ttl_seconds = spain_to_utc(expires_at).timestamp() - time.time()
+        return ttl_seconds <= self.max_ttl_minutes * 60 and self.ephemeral.fits(len(encrypted_content))
+
+    def _tier(self, token: str) -> StorageBackend:
+        return self.ephemeral if token in self.ephemeral else self.durable
+
+    async def connect(self) -> Any:
+        return await self.durable.connect()
+
+    async def close(self) -> None:
+        await self.durable.close()
+
+    async def ping(self) -> bool:
+        return await self.durable.ping()
+
+    async def create_secret(
+        self,
+        token: str,
+        encrypted_content: bytes,
+        expires_at: datetime,
+        **fields
+    ) -> Dict[str, Any]:
+        """
+        Crea el secreto en el nivel que corresponde a su TTL
+        """
+        if self._is_ephemeral(expires_at, encrypted_content):
+            self.stored_ephemeral += 1
+            return await self.ephemeral.create_secret(token, encrypted_content, expires_at, **fields)
+
+        self.stored_durable += 1
+        return await self.durable.create_secret(token, encrypted_content, expires_at, **fields)
+
+    async def create_secrets_bulk(self, secrets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Crea el lote repartido entre niveles, conservando el orden
+
+        Primero se inserta la parte duradera: si falla no se ha tocado el
+        nivel efímero. Un conflicto de token en el nivel efímero deja filas
+        duraderas huérfanas que expiran solas.
+        """
+        ephemeral = [self._is_ephemeral(secret["expires_at"], secret["encrypted_content"]) for secret in secrets]
+
+        durable_rows = iter(await self.durable.create_secrets_bulk([
+            secret for secret, is_ephemeral in zip(secrets, ephemeral) if not is_ephemeral
+        ]) if not all(ephemeral) else [])
+        ephemeral_rows = iter(await self.ephemeral.create_secrets_bulk([
+            secret for secret, is_ephemeral in zip(secrets, ephemeral) if is_ephemeral
+        ]) if any(ephemeral) else [])
+
+        self.stored_ephemeral += sum(ephemeral)
+        self.stored_durable += len(secrets) - sum(ephemeral)
+        return [next(ephemeral_rows) if is_ephemeral else next(durable_rows) for is_ephemeral in ephemeral]
+
+    async def get_secret_by_token(self, token: str) -> Optional[Dict[str, Any]]:
+        return await self._tier(token).get_secret_by_token(token)
+
+    async def consume_secret(
+        self,
+        token: str,
+        allow_protected: bool = False,
+        kind: str = "text"
+    ) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        return await self._tier(token).consume_secret(token, allow_protected=allow_protected, kind=kind)
+
+    async def mark_as_accessed(self, token: str) -> bool:
+        return await self._tier(token).mark_as_accessed(token)
+
+    async def delete_secret(self, token: str) -> bool:
+        return await self._tier(token).delete_secret(token)
+
+    async def destroy_secrets(self, tokens: List[str]) -> Dict[str, List[Any]]:
+        """
+        Destruye en cada nivel sus tokens y une las clasificaciones
+        """
+        ephemeral = [token for token in tokens if token in self.ephemeral]
+        durable = [token for token in tokens if token not in self.ephemeral]
+
+        result = await self.ephemeral.destroy_secrets(ephemeral)
+        if durable:
+            for key, values in (await self.durable.destroy_secrets(durable)).items():
+                result[key].extend(values)
+        return result
+
+    async def get_live_secrets_page(
+        self,
+        after_token: Optional[str],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Solo el nivel duradero: los secretos efímeros expiran antes de que
+        merezca la pena re-cifrarlos y se siguen descifrando con las claves
+        anteriores
+        """
+        return await self.durable.get_live_secrets_page(after_token, limit)
+
+    async def get_live_tokens_page(
+        self,
+        after_token: Optional[str],
+        limit: int
+    ) -> List[str]:
+        """
+        Mezcla ordenada de las páginas de ambos niveles
+        """
+        ephemeral = await self.ephemeral.get_live_tokens_page(after_token, limit)
+        durable = await self.durable.get_live_tokens_page(after_token, limit)
+        return list(heapq.merge(ephemeral, durable))[:limit]
+
+    async def replace_encrypted_content(self, token: str, expected: bytes, encrypted_content: bytes) -> bool:
+        return await self._tier(token).replace_encrypted_content(token, expected, encrypted_content)
+
+    async def next_expiration(self) -> Optional[str]:
+        expirations = [
+            expiration
+            for expiration in (await self.ephemeral.next_expiration(), await self.durable.next_expiration())
+            if expiration is not None
+        ]
+        return min(expirations, key=datetime.fromisoformat) if expirations else None
+
+    async def purge_expired_batch(
+        self,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Purga primero el nivel efímero (sin cursor: recorre la cabeza de su
+        heap) y después un lote del duradero
+        """
+        deleted, _ = await self.ephemeral.purge_expired_batch(cutoff, None, limit)
+        if deleted >= limit:
+            return deleted, after
+
+        durable_deleted, after = await self.durable.purge_expired_batch(cutoff, after, limit)
+        return deleted + durable_deleted, after
+
+    async def compact_destroyed_batch(
+        self,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, int, Optional[str]]:
+        """
+        Compacta primero el nivel efímero y después un lote del duradero
+        """
+        deleted, reclaimed, _ = await self.ephemeral.compact_destroyed_batch(cutoff, None, limit)
+        if deleted >= limit:
+            return deleted, reclaimed, after
+
+        durable_deleted, durable_reclaimed, after = await self.durable.compact_destroyed_batch(cutoff, after, limit)
+        return deleted + durable_deleted, reclaimed + durable_reclaimed, after
+
+    async def flush_counters(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        return await self.durable.flush_counters(deltas)
+
+    async def increment_rate_limits(self, window: int, deltas: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        return await self.durable.increment_rate_limits(window, deltas)
+
+    async def get_stats(self) -> Dict[str, int]:
+        """
+        Suma los contadores de ambos niveles
+        """
+        stats = await self.durable.get_stats()
+        for key, value in (await self.ephemeral.get_stats()).items():
+            stats[key] = stats.get(key, 0) + value
+        return stats
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Estado del nivel efímero para /api/system/info
+        """
+        return {
+            "enabled": True,
+            "max_ttl_minutes": self.max_ttl_minutes,
+            "stored": self.stored_ephemeral,
+            "stored_durable": self.stored_durable,
+            **self.ephemeral.get_status()
+        }
@@ -0,0 +1,200 @@
+"""
+Executor dedicado para el hash y la verificación de passphrases
+
+Un hash de passphrase (bcrypt o scrypt, ver `app.services.kdf`) consume del
+orden de 250 ms de CPU. Ejecutarlo dentro de los handlers async bloquea el
+event loop y dispara la latencia de todas las peticiones del worker,
+incluidas las de secretos sin passphrase.
+
+Este módulo delega esas llamadas en un pool (hilos o procesos) del tamaño de
+los núcleos disponibles, con una cola acotada: si está saturada se rechaza la
+petición al instante con `HashingSaturatedError` (503) en lugar de encolarla
+sin límite.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from app.config import settings
+from app.services import kdf
+from app.services.kdf import kdf_policy
+
+logger = logging.getLogger(__name__)
+
+
+class HashingSaturatedError(Exception):
+    """
+    El executor de hashing tiene todos sus huecos (workers + cola) ocupados
+    """
+
+
+def _run_timed(fn: Callable[..., Any], *args: Any) -> Tuple[Any, float, float]:
+    """
+    Ejecuta `fn` en el worker y devuelve (resultado, inicio, fin)
+
+    Usa `time.monotonic()`, que es común a todos los procesos del host, para
+    poder calcular la espera en cola también con el pool de procesos.
+    """
+    started = time.monotonic()
+    result = fn(*args)
+    return result, started, time.monotonic()
+
+
+class _TimingStats:
+    """
+    Acumulador simple de tiempos (segundos)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+
+class PassphraseHasher:
+    """
+    Ejecuta el hash/verificación de passphrases fuera del event loop
+    """
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        workers: int = 0,
+        max_queue: int = 32
+    ):
+        """
+        Args:
+            mode: "thread" o "process"
+            workers: Número de workers (0 = núcleos disponibles)
+            max_queue: Peticiones que pueden esperar con todos los workers ocupados
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Modo de executor de hashing desconocido: {mode}")
+
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self.rejected = 0
+        self.queue_wait = _TimingStats()
+        self.compute = _TimingStats()
+
+    @property
+    def capacity(self) -> int:
+        """
+        Máximo de llamadas simultáneas admitidas (en ejecución + en cola)
+        """
+        return self.workers + self.max_queue
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="passphrase-hash"
+                )
+            logger.info(f"🔑 Executor de hashing iniciado: {self.mode} x{self.workers} (cola {self.max_queue})")
+        return self._executor
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Envía una llamada al pool respetando la capacidad máxima
+
+        Raises:
+            HashingSaturatedError: Si no queda hueco en el executor
+        """
+        if self._in_flight >= self.capacity:
+            self.rejected += 1
+            logger.warning("⚠️ Executor de hashing saturado, petición rechazada")
+            raise HashingSaturatedError("Executor de hashing saturado")
+
+        self._in_flight += 1
+        submitted = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(
+                self._get_executor(), _run_timed, fn, *args
+            )
+        finally:
+            self._in_flight -= 1
+
+        self.queue_wait.observe(max(started - submitted, 0.0))
+        self.compute.observe(finished - started)
+        return result
+
+    async def hash(self, passphrase: str) -> str:
+        """
+        Genera el hash de una passphrase sin bloquear el event loop
+
+        Returns:
+            Hash en formato string
+        """
+        return await self._submit(
+            kdf.hash_passphrase, passphrase, kdf_policy.algorithm, kdf_policy.cost
+        )
+
+    async def verify(self, passphrase: str, hashed: str) -> bool:
+        """
+        Verifica una passphrase sin bloquear el event loop
+
+        Returns:
+            True si la passphrase es correcta, False en caso contrario
+        """
+        try:
+            return await self._submit(kdf.verify_passphrase, passphrase, hashed)
+        except HashingSaturatedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error al verificar passphrase: {e}")
+            return False
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Estado y métricas del executor para /api/system/info
+        """
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "calls": self.compute.count,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.as_dict(),
+            "compute": self.compute.as_dict(),
+            "kdf": kdf_policy.get_status()
+        }
+
+    def shutdown(self) -> None:
+        """
+        Detiene el pool de workers
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("🔑 Executor de hashing detenido")
+
+
+# Instancia global del executor de hashing
+passphrase_hasher = PassphraseHasher(
+    mode=settings.hashing_executor,
+    workers=settings.hashing_workers,
+    max_queue=settings.hashing_max_queue
+)
@@ -0,0 +1,220 @@
+"""
+Funciones de derivación de claves (KDF) para passphrases
+
+Soporta bcrypt y scrypt (`hashlib`, memory-hard). Los hashes almacenados son
+autodescriptivos, así que cualquier hash antiguo se verifica con el
+algoritmo y coste con el que se generó, aunque la configuración cambie:
+
+- bcrypt: `$2b$<coste>$<salt+hash>` (formato estándar de la librería)
+- scrypt: `$scrypt$ln=<log2 N>,r=<r>,p=<p>$<salt b64>$<hash b64>`
+
+El coste de los hashes nuevos se puede calibrar al arrancar para que cada
+hash tarde aproximadamente la latencia objetivo en el hardware actual.
+"""
+from typing import Any, Dict, Optional
+import base64
+import bcrypt
+import hashlib
+import hmac
+import logging
+import os
+import time
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCRYPT_PREFIX = "$scrypt$"
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_SALT_BYTES = 16
+SCRYPT_KEY_BYTES = 32
+# scrypt usa 128·r·N·p bytes por hash (más unos pocos bloques de trabajo);
+# con varios hashes en paralelo el coste máximo se limita por memoria
+SCRYPT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+SCRYPT_MAXMEM_MARGIN = 64 * 1024
+
+# Rango de coste admitido por algoritmo (bcrypt: rounds, scrypt: log2 N)
+COST_LIMITS = {
+    "bcrypt": (10, 16),
+    "scrypt": (14, (SCRYPT_MAX_MEMORY_BYTES // (128 * SCRYPT_R * SCRYPT_P)).bit_length() - 1)
+}
+
+# Coste usado cuando no se calibra ni se configura explícitamente
+DEFAULT_COSTS = {
+    "bcrypt": 12,
+    "scrypt": 15
+}
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def scrypt_memory_bytes(log_n: int, r: int = SCRYPT_R, p: int = SCRYPT_P) -> int:
+    """
+    Memoria que necesita un hash scrypt con los parámetros indicados
+    """
+    return 128 * r * (1 << log_n) * p
+
+
+def _scrypt(passphrase: str, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+    n = 1 << log_n
+    return hashlib.scrypt(
+        passphrase.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=scrypt_memory_bytes(log_n, r, p) + SCRYPT_MAXMEM_MARGIN,
+        dklen=SCRYPT_KEY_BYTES
+    )
+
+
+def hash_passphrase(passphrase: str, algorithm: str, cost: int) -> str:
+    """
+    Genera un hash autodescriptivo de una passphrase (bloqueante)
+
+    Args:
+        passphrase: Contraseña en texto plano
+        algorithm: "bcrypt" o "scrypt"
+        cost: Rounds de bcrypt o log2(N) de scrypt
+
+    Returns:
+        Hash en formato string
+    """
+    if algorithm == "bcrypt":
+        return bcrypt.hashpw(passphrase.encode(), bcrypt.gensalt(rounds=cost)).decode()
+
+    if algorithm == "scrypt":
+        salt = os.urandom(SCRYPT_SALT_BYTES)
+        key = _scrypt(passphrase, salt, cost, SCRYPT_R, SCRYPT_P)
+        return f"{SCRYPT_PREFIX}ln={cost},r={SCRYPT_R},p={SCRYPT_P}${_b64encode(salt)}${_b64encode(key)}"
+
+    raise ValueError(f"Algoritmo de KDF desconocido: {algorithm}")
+
+
+def verify_passphrase(passphrase: str, hashed: str) -> bool:
+    """
+    Verifica una passphrase usando el algoritmo indicado en el propio hash
+
+    Args:
+        passphrase: Contraseña en texto plano
+        hashed: Hash almacenado (bcrypt o scrypt)
+
+    Returns:
+        True si la passphrase es correcta
+    """
+    if hashed.startswith(SCRYPT_PREFIX):
+        params, salt, key = hashed[len(SCRYPT_PREFIX):].split("$")
+        values = dict(item.split("=") for item in params.split(","))
+        expected = _b64decode(key)
+        candidate = _scrypt(
+            passphrase,
+            _b64decode(salt),
+            int(values["ln"]),
+            int(values["r"]),
+            int(values["p"])
+        )
+        return hmac.compare_digest(candidate, expected)
+
+    if hashed.startswith("$2"):
+        return bcrypt.checkpw(passphrase.encode(), hashed.encode())
+
+    raise ValueError("Formato de hash de passphrase desconocido")
+
+
+def measure_hash_ms(algorithm: str, cost: int) -> float:
+    """
+    Mide cuánto tarda un hash con el algoritmo y coste indicados
+    """
+    started = time.perf_counter()
+    hash_passphrase("calibration-passphrase", algorithm, cost)
+    return (time.perf_counter() - started) * 1000
+
+
+class KdfPolicy:
+    """
+    Algoritmo y coste con los que se generan los hashes nuevos
+    """
+
+    def __init__(self, algorithm: str = "bcrypt", cost: int = 0):
+        """
+        Args:
+            algorithm: "bcrypt" o "scrypt"
+            cost: Coste fijo (0 = coste por defecto del algoritmo)
+        """
+        if algorithm not in COST_LIMITS:
+            raise ValueError(f"Algoritmo de KDF desconocido: {algorithm}")
+
+        self.algorithm = algorithm
+        self.cost = self._clamp(cost or DEFAULT_COSTS[algorithm])
+        self.measured_ms: Optional[float] = None
+        self.calibrated = False
+
+    def _clamp(self, cost: int) -> int:
+        min_cost, max_cost = COST_LIMITS[self.algorithm]
+        return max(min_cost, min(cost, max_cost))
+
+    def calibrate(self, target_ms: float) -> int:
+        """
+        Elige el mayor coste cuyo hash no supere `target_ms` en este hardware
+
+        Nunca baja del coste por defecto del algoritmo (solo un coste
+        configurado explícitamente puede ser menor): si ese coste ya supera
+        el objetivo se mantiene y se avisa. Ambos algoritmos duplican su
+        coste por cada unidad, así que se mide desde el coste por defecto
+        hacia arriba y la calibración completa tarda del orden de dos veces
+        la latencia objetivo.
+
+        Args:
+            target_ms: Latencia objetivo por hash en milisegundos
+
+        Returns:
+            Coste elegido
+        """
+        max_cost = COST_LIMITS[self.algorithm][1]
+        floor = DEFAULT_COSTS[self.algorithm]
+        chosen, chosen_ms = floor, measure_hash_ms(self.algorithm, floor)
+
+        cost, elapsed = chosen, chosen_ms
+        while cost < max_cost and elapsed * 2 <= target_ms * 1.5:
+            cost += 1
+            elapsed = measure_hash_ms(self.algorithm, cost)
+            if elapsed > target_ms:
+                break
+            chosen, chosen_ms = cost, elapsed
+
+        if chosen_ms > target_ms:
+            logger.warning(
+                f"⚠️ El coste por defecto de {self.algorithm} ({floor}) tarda {chosen_ms:.0f} ms, "
+                f"por encima del objetivo de {target_ms:.0f} ms: se mantiene (fijar PASSPHRASE_KDF_COST para bajarlo)"
+            )
+
+        self.cost = chosen
+        self.measured_ms = chosen_ms
+        self.calibrated = True
+        logger.info(f"🔑 KDF calibrado: {self.algorithm} coste {chosen} (~{chosen_ms:.0f} ms por hash)")
+        return chosen
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Configuración efectiva para /api/system/info
+        """
+        return {
+            "algorithm": self.algorithm,
+            "cost": self.cost,
+            "calibrated": self.calibrated,
+            "measured_ms": round(self.measured_ms, 1) if self.measured_ms is not None else None
+        }
+
+
+# Política global de KDF (se calibra en el arranque si está habilitado)
+kdf_policy = KdfPolicy(
+    algorithm=settings.passphrase_kdf,
+    cost=settings.passphrase_kdf_cost
+)
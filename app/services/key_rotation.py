@@ -0,0 +1,213 @@
+"""
+Re-cifrado en segundo plano tras una rotación de claves
+
+Recorre los secretos vivos por páginas (paginación por clave sobre `token`)
+y vuelve a cifrar con la clave actual los que usan una clave anterior o un
+formato antiguo. Cada página se procesa con un número acotado de
+actualizaciones simultáneas y una pausa entre páginas, para que la rotación
+pueda ejecutarse con tráfico de producción sin picos de latencia.
+
+Las actualizaciones son condicionales (secreto vivo y contenido sin
+cambios), así que una lectura o destrucción concurrente nunca se pisa.
+
+La rotación solo se da por completada tras una pasada que no encuentra
+filas con una clave anterior. Si después se descifra algún secreto con una
+clave anterior (p. ej. escrito por una réplica aún sin la clave nueva), se
+vuelve a recorrer la tabla.
+"""
+from typing import Any, Dict, List, Optional, Union
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.services.database import database_service
+from app.services.encryption import EncryptionService, encryption_service
+from app.services.storage import StorageBackend
+from app.utils.datetime_utils import now_spain
+
+logger = logging.getLogger(__name__)
+
+
+class KeyRotationJob:
+    """
+    Estado y ejecución del re-cifrado de secretos vivos
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        encryption: EncryptionService,
+        batch_size: int = 200,
+        concurrency: int = 4,
+        pause_ms: int = 200
+    ):
+        """
+        Args:
+            storage: Backend de almacenamiento
+            encryption: Servicio de cifrado con la clave actual y las anteriores
+            batch_size: Filas por página
+            concurrency: Actualizaciones simultáneas por página
+            pause_ms: Pausa entre páginas en milisegundos
+        """
+        self.storage = storage
+        self.encryption = encryption
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.pause_ms = pause_ms
+
+        self.running = False
+        self.completed = False
+        self.passes = 0
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.duration_seconds: Optional[float] = None
+        # `previous_key_decryptions` del servicio de cifrado al empezar la
+        # última pasada (si la pasada no encontró filas antiguas, no descifró nada)
+        self._decryptions_seen = 0
+        self._reset_counters()
+
+    def _reset_counters(self) -> None:
+        self.pages = 0
+        self.scanned = 0
+        self.old_key_rows = 0
+        self.reencrypted = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def _reencrypt_many(self, rows: List[Dict[str, Any]]) -> List[Union[bytes, Exception]]:
+        """
+        Re-cifra una página de filas (se ejecuta en un hilo)
+        """
+        results: List[Union[bytes, Exception]] = []
+        for row in rows:
+            try:
+                results.append(self.encryption.reencrypt(row["encrypted_content"]))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _process_page(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Re-cifra y guarda las filas de una página que lo necesitan
+        """
+        stale = [row for row in rows if self.encryption.needs_reencryption(row["encrypted_content"])]
+        if not stale:
+            return
+
+        self.old_key_rows += len(stale)
+
+        new_contents = await asyncio.to_thread(self._reencrypt_many, stale)
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def _replace(row: Dict[str, Any], new_content: Union[bytes, Exception]) -> None:
+            if isinstance(new_content, Exception):
+                self.failed += 1
+                return
+            async with limit:
+                try:
+                    replaced = await self.storage.replace_encrypted_content(
+                        row["token"], row["encrypted_content"], new_content
+                    )
+                except Exception as e:
+                    logger.error(f"❌ Error al re-cifrar secreto {row['token'][:10]}...: {e}")
+                    self.failed += 1
+                    return
+            if replaced:
+                self.reencrypted += 1
+            else:
+                # Leído, destruido o modificado mientras tanto
+                self.skipped += 1
+
+        await asyncio.gather(*(_replace(row, new) for row, new in zip(stale, new_contents)))
+
+    def pending(self) -> bool:
+        """
+        Indica si hace falta otra pasada: la última encontró filas con una
+        clave anterior o falló, o desde entonces se han descifrado secretos
+        con una clave anterior
+        """
+        if not self.completed:
+            return True
+        return self.encryption.get_key_status()["previous_key_decryptions"] > self._decryptions_seen
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Ejecuta una pasada completa sobre los secretos vivos
+
+        La rotación queda completada si la pasada no encuentra ninguna fila
+        con una clave o formato anteriores.
+
+        Returns:
+            Estado tras la pasada
+        """
+        if self.running:
+            return self.get_status()
+
+        self.running = True
+        self._reset_counters()
+        self._decryptions_seen = self.encryption.get_key_status()["previous_key_decryptions"]
+        self.started_at = now_spain().isoformat()
+        self.finished_at = None
+        started = time.monotonic()
+        logger.info("🔑 Re-cifrado de secretos con la clave actual iniciado")
+
+        try:
+            after_token: Optional[str] = None
+            while True:
+                rows = await self.storage.get_live_secrets_page(after_token, self.batch_size)
+                if not rows:
+                    break
+
+                await self._process_page(rows)
+                self.pages += 1
+                self.scanned += len(rows)
+                after_token = rows[-1]["token"]
+
+                if len(rows) < self.batch_size:
+                    break
+                await asyncio.sleep(self.pause_ms / 1000)
+
+            self.passes += 1
+            self.completed = self.failed == 0 and self.old_key_rows == 0
+            logger.info(
+                f"✅ Re-cifrado completado: {self.reencrypted} re-cifrados, "
+                f"{self.skipped} omitidos, {self.failed} fallidos de {self.scanned} revisados"
+            )
+        except Exception as e:
+            logger.error(f"❌ Error durante el re-cifrado de secretos: {e}")
+        finally:
+            self.running = False
+            self.finished_at = now_spain().isoformat()
+            self.duration_seconds = round(time.monotonic() - started, 3)
+
+        return self.get_status()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Progreso del re-cifrado para /api/system/info
+        """
+        return {
+            "running": self.running,
+            "completed": self.completed,
+            "passes": self.passes,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.duration_seconds,
+            "pages": self.pages,
+            "scanned": self.scanned,
+            "old_key_rows": self.old_key_rows,
+            "reencrypted": self.reencrypted,
+            "skipped": self.skipped,
+            "failed": self.failed
+        }
+
+
+# Instancia global del job de rotación de claves
+key_rotation = KeyRotationJob(
+    storage=database_service,
+    encryption=encryption_service,
+    batch_size=settings.key_rotation_batch_size,
+    concurrency=settings.key_rotation_concurrency,
+    pause_ms=settings.key_rotation_pause_ms
+)
@@ -0,0 +1,517 @@
+"""
+Backend de almacenamiento en memoria
+
+Motor sin red para benchmarks, CI y despliegues edge de un solo nodo.
+Los secretos viven en un diccionario indexado por token y un min-heap
+ordenado por expiración permite purgar sin recorrer toda la tabla. Una
+lista ordenada de los tokens no destruidos (`bisect`) sirve las páginas por
+token en O(log n + página).
+
+⚠️ No es persistente: los datos se pierden al reiniciar el proceso y no
+se comparten entre workers.
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Deque, Tuple
+import heapq
+import logging
+import sys
+import time
+import uuid
+
+from app.services.storage import TokenConflictError
+from app.utils.datetime_utils import now_spain, spain_to_utc
+
+logger = logging.getLogger(__name__)
+
+
+def row_size(row: Dict[str, Any]) -> int:
+    """
+    Tamaño aproximado en memoria de una fila (valores y diccionario)
+    """
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+def _utc_iso(timestamp: float) -> str:
+    """
+    Convierte un timestamp epoch al formato ISO en UTC que devuelve PostgREST
+    """
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class InMemoryStorageService:
+    """
+    Implementación en memoria de `StorageBackend`
+    """
+
+    def __init__(self):
+        """
+        Inicializa las estructuras vacías
+        """
+        # token -> fila con el mismo formato que Supabase
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        # token -> expiración en epoch (para comparar sin parsear fechas)
+        self._expires: Dict[str, float] = {}
+        # Índice de expiración: (expires_ts, token)
+        self._expiry_heap: List[Tuple[float, str]] = []
+        # Tokens no destruidos, ordenados (paginación por clave)
+        self._live_tokens: List[str] = []
+        # Lápidas en orden de destrucción: (destroyed_ts, token)
+        self._tombstones: Deque[Tuple[float, str]] = deque()
+        # Contadores de eventos del ciclo de vida
+        self._counters: Dict[str, int] = {}
+        # clave del rate limiter -> [índice de ventana, contador, contador anterior]
+        self._rate_limits: Dict[str, List[int]] = {}
+        self._rate_limit_window = 0
+
+    async def connect(self) -> "InMemoryStorageService":
+        """
+        No requiere conexión; existe para cumplir el protocolo
+        """
+        return self
+
+    async def close(self) -> None:
+        """
+        No hay recursos que liberar
+        """
+        return None
+
+    async def ping(self) -> bool:
+        """
+        El backend en memoria siempre está disponible
+        """
+        return True
+
+    async def create_secret(
+        self,
+        token: str,
+        encrypted_content: bytes,
+        expires_at: datetime,
+        passphrase_hash: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        kind: str = "text"
+    ) -> Dict[str, Any]:
+        """
+        Crea un nuevo secreto en memoria
+
+        Args:
+            token: Token único del secreto
+            encrypted_content: Contenido cifrado
+            expires_at: Fecha de expiración
+            passphrase_hash: Hash de la passphrase (opcional)
+            metadata: Metadatos adicionales (opcional)
+            kind: Tipo de secreto ("text" o "file")
+
+        Returns:
+            Datos del secreto creado
+
+        Raises:
+            TokenConflictError: Si el token ya existe
+        """
+        if token in self._rows:
+            raise TokenConflictError(token)
+
+        row = self._insert_row(token, encrypted_content, expires_at, passphrase_hash, metadata, kind)
+        logger.info(f"✅ Secreto creado en memoria con token: {token[:10]}...")
+        return dict(row)
+
+    async def create_secrets_bulk(self, secrets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Crea varios secretos de forma atómica (todo o nada)
+
+        Args:
+            secrets: Lista de diccionarios con los argumentos de create_secret
+
+        Returns:
+            Filas creadas, en el mismo orden
+
+        Raises:
+            TokenConflictError: Si algún token ya existe o se repite en el lote
+        """
+        tokens = [secret["token"] for secret in secrets]
+        if len(set(tokens)) != len(tokens) or any(token in self._rows for token in tokens):
+            raise TokenConflictError("bulk")
+
+        rows = [dict(self._insert_row(**secret)) for secret in secrets]
+        logger.info(f"✅ {len(rows)} secretos creados en memoria en bloque")
+        return rows
+
+    def _insert_row(
+        self,
+        token: str,
+        encrypted_content: bytes,
+        expires_at: datetime,
+        passphrase_hash: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        kind: str = "text"
+    ) -> Dict[str, Any]:
+        """
+        Inserta la fila y la registra en el índice de expiración
+        """
+        expires_ts = spain_to_utc(expires_at).timestamp()
+        row = {
+            "id": str(uuid.uuid4()),
+            "token": token,
+            "encrypted_content": encrypted_content,
+            "expires_at": _utc_iso(expires_ts),
+            "created_at": _utc_iso(time.time()),
+            "passphrase_hash": passphrase_hash,
+            "accessed_at": None,
+            "destroyed_at": None,
+            "is_destroyed": False,
+            "metadata": metadata or {},
+            "kind": kind
+        }
+        self._rows[token] = row
+        self._expires[token] = expires_ts
+        heapq.heappush(self._expiry_heap, (expires_ts, token))
+        insort(self._live_tokens, token)
+        return row
+
+    async def get_secret_by_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene un secreto por su token
+
+        Args:
+            token: Token único del secreto
+
+        Returns:
+            Copia de los datos del secreto o None si no existe
+        """
+        row = self._rows.get(token)
+        return dict(row) if row is not None else None
+
+    async def consume_secret(
+        self,
+        token: str,
+        allow_protected: bool = False,
+        kind: str = "text"
+    ) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Reclama y destruye el secreto si sigue vivo (atómico: no hay awaits)
+
+        Args:
+            token: Token único del secreto
+            allow_protected: Permitir reclamar secretos con passphrase
+            kind: Tipo de secreto que se espera ("text" o "file")
+
+        Returns:
+            (True, fila reclamada) o (False, copia de la fila actual o None
+            si no existe)
+        """
+        row = self._rows.get(token)
+        if row is None:
+            return False, None
+        if (
+            row["is_destroyed"]
+            or self._expires[token] <= time.time()
+            or row["kind"] != kind
+            or (row["passphrase_hash"] is not None and not allow_protected)
+        ):
+            return False, dict(row)
+
+        row["accessed_at"] = spain_to_utc(now_spain()).isoformat()
+        claimed = dict(row)
+        self._destroy(token, row)
+        claimed.update(is_destroyed=True, destroyed_at=row["destroyed_at"])
+        return True, claimed
+
+    def _remove(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Elimina la fila (su entrada del heap se descarta al llegar a la cabeza)
+        """
+        self._expires.pop(token, None)
+        row = self._rows.pop(token, None)
+        if row is not None and not row["is_destroyed"]:
+            self._unindex(token)
+        return row
+
+    def _unindex(self, token: str) -> None:
+        """
+        Quita el token de la lista ordenada de tokens no destruidos
+        """
+        index = bisect_left(self._live_tokens, token)
+        if index < len(self._live_tokens) and self._live_tokens[index] == token:
+            del self._live_tokens[index]
+
+    def _live_page(self, after_token: Optional[str], limit: int) -> List[str]:
+        """
+        Tokens vivos a partir de `after_token`: búsqueda binaria y recorrido
+        hacia delante (solo se saltan los expirados aún sin purgar)
+        """
+        now = time.time()
+        start = 0 if after_token is None else bisect_right(self._live_tokens, after_token)
+        page = []
+        for index in range(start, len(self._live_tokens)):
+            if len(page) >= limit:
+                break
+            token = self._live_tokens[index]
+            if self._expires[token] > now:
+                page.append(token)
+        return page
+
+    def _destroy(self, token: str, row: Dict[str, Any]) -> None:
+        """
+        Convierte la fila en lápida: destruida y sin contenido cifrado
+        """
+        now = time.time()
+        self._unindex(token)
+        row["is_destroyed"] = True
+        row["destroyed_at"] = _utc_iso(now)
+        row["encrypted_content"] = None
+        self._tombstones.append((now, token))
+
+    async def mark_as_accessed(self, token: str) -> bool:
+        """
+        Marca un secreto como accedido (destruido)
+
+        Args:
+            token: Token único del secreto
+
+        Returns:
+            True si se actualizó correctamente
+        """
+        row = self._rows.get(token)
+        if row is not None:
+            row["accessed_at"] = spain_to_utc(now_spain()).isoformat()
+            if not row["is_destroyed"]:
+                self._destroy(token, row)
+        return True
+
+    async def delete_secret(self, token: str) -> bool:
+        """
+        Marca un secreto como destruido sin registrar lectura
+
+        Args:
+            token: Token único del secreto
+
+        Returns:
+            True si se eliminó correctamente
+        """
+        row = self._rows.get(token)
+        if row is not None and not row["is_destroyed"]:
+            self._destroy(token, row)
+        return True
+
+    async def destroy_secrets(self, tokens: List[str]) -> Dict[str, List[Any]]:
+        """
+        Destruye varios secretos y clasifica el resultado de cada token
+
+        Args:
+            tokens: Tokens a destruir
+
+        Returns:
+            Diccionario con las listas "destroyed", "already_destroyed" y
+            "not_found", y "file_contents" con el contenido cifrado de los
+            secretos de archivo destruidos
+        """
+        result: Dict[str, List[Any]] = {"destroyed": [], "already_destroyed": [], "not_found": [], "file_contents": []}
+        for token in dict.fromkeys(tokens):
+            row = self._rows.get(token)
+            if row is None:
+                result["not_found"].append(token)
+            elif row["is_destroyed"]:
+                result["already_destroyed"].append(token)
+            else:
+                if row["kind"] == "file":
+                    result["file_contents"].append(row["encrypted_content"])
+                self._destroy(token, row)
+                result["destroyed"].append(token)
+        return result
+
+    async def get_live_secrets_page(
+        self,
+        after_token: Optional[str],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Obtiene una página de secretos vivos ordenados por token
+
+        Args:
+            after_token: Último token de la página anterior (None = desde el principio)
+            limit: Tamaño máximo de la página
+
+        Returns:
+            Filas con "token" y "encrypted_content"
+        """
+        return [
+            {"token": token, "encrypted_content": self._rows[token]["encrypted_content"]}
+            for token in self._live_page(after_token, limit)
+        ]
+
+    async def get_live_tokens_page(
+        self,
+        after_token: Optional[str],
+        limit: int
+    ) -> List[str]:
+        """
+        Obtiene una página de tokens de secretos vivos ordenados
+
+        Args:
+            after_token: Último token de la página anterior (None = desde el principio)
+            limit: Tamaño máximo de la página
+
+        Returns:
+            Tokens de la página
+        """
+        return self._live_page(after_token, limit)
+
+    async def replace_encrypted_content(
+        self,
+        token: str,
+        expected: bytes,
+        encrypted_content: bytes
+    ) -> bool:
+        """
+        Sustituye el contenido cifrado si el secreto sigue vivo y sin cambios
+
+        Args:
+            token: Token único del secreto
+            expected: Contenido cifrado leído previamente
+            encrypted_content: Nuevo contenido cifrado
+
+        Returns:
+            True si se actualizó la fila
+        """
+        row = self._rows.get(token)
+        if row is None or row["is_destroyed"] or row["encrypted_content"] != expected:
+            return False
+        row["encrypted_content"] = encrypted_content
+        return True
+
+    async def next_expiration(self) -> Optional[str]:
+        """
+        Expiración más cercana: la cabeza del heap
+
+        Returns:
+            Fecha ISO en UTC o None si no hay secretos
+        """
+        if not self._expiry_heap:
+            return None
+        return _utc_iso(self._expiry_heap[0][0])
+
+    async def purge_expired_batch(
+        self,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Elimina un lote de secretos expirados recorriendo solo la cabeza del heap
+
+        Args:
+            cutoff: Se eliminan los secretos que expiraron antes (ISO 8601)
+            after: Cursor del lote anterior (el heap ya empieza en él)
+            limit: Máximo de secretos por lote
+
+        Returns:
+            (eliminados, cursor para el siguiente lote)
+        """
+        cutoff_ts = datetime.fromisoformat(cutoff).timestamp()
+        count = 0
+        last_ts = None
+        while count < limit and self._expiry_heap and self._expiry_heap[0][0] < cutoff_ts:
+            last_ts, token = heapq.heappop(self._expiry_heap)
+            # La lápida pudo compactarse antes de expirar
+            if self._remove(token) is not None:
+                count += 1
+
+        return count, _utc_iso(last_ts) if last_ts is not None else after
+
+    async def compact_destroyed_batch(
+        self,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, int, Optional[str]]:
+        """
+        Borra un lote de lápidas recorriendo la cola en orden de destrucción
+
+        Args:
+            cutoff: Se borran las lápidas destruidas antes (ISO 8601)
+            after: Cursor del lote anterior (la cola ya empieza en él)
+            limit: Máximo de lápidas por lote
+
+        Returns:
+            (borradas, bytes liberados aproximados, cursor para el siguiente lote)
+        """
+        cutoff_ts = datetime.fromisoformat(cutoff).timestamp()
+        count = 0
+        reclaimed = 0
+        last_ts = None
+        while count < limit and self._tombstones and self._tombstones[0][0] < cutoff_ts:
+            last_ts, token = self._tombstones.popleft()
+            row = self._remove(token)
+            # El secreto pudo purgarse antes por expiración
+            if row is not None:
+                reclaimed += row_size(row)
+                count += 1
+
+        return count, reclaimed, _utc_iso(last_ts) if last_ts is not None else after
+
+    async def flush_counters(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        """
+        Suma los incrementos a los contadores de eventos
+
+        Args:
+            deltas: Incrementos por evento
+
+        Returns:
+            Totales por evento
+        """
+        for event, value in deltas.items():
+            self._counters[event] = self._counters.get(event, 0) + value
+        return dict(self._counters)
+
+    async def increment_rate_limits(self, window: int, deltas: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        """
+        Suma peticiones a los contadores del rate limiter
+
+        Sustituto local del almacén compartido: solo lo ven los usuarios de
+        este proceso.
+
+        Args:
+            window: Índice de la ventana
+            deltas: Peticiones por clave
+
+        Returns:
+            (contador de la ventana, contador de la anterior) por clave
+        """
+        counts = {}
+        for key, value in deltas.items():
+            entry = self._rate_limits.get(key)
+            if entry is None:
+                entry = self._rate_limits[key] = [window, 0, 0]
+            elif entry[0] != window:
+                entry[2] = entry[1] if entry[0] == window - 1 else 0
+                entry[1] = 0
+                entry[0] = window
+            entry[1] += value
+            counts[key] = (entry[1], entry[2])
+
+        # Al cambiar de ventana, descartar las claves sin actividad reciente
+        if window > self._rate_limit_window:
+            self._rate_limit_window = window
+            self._rate_limits = {
+                key: entry for key, entry in self._rate_limits.items() if entry[0] >= window - 1
+            }
+        return counts
+
+    async def get_stats(self) -> Dict[str, int]:
+        """
+        Calcula los contadores globales en una sola pasada
+
+        Returns:
+            Diccionario con total, activos, accedidos, expirados y protegidos
+        """
+        now = time.time()
+        stats = {"total": 0, "active": 0, "accessed": 0, "expired": 0, "protected": 0}
+        for token, row in self._rows.items():
+            expired = self._expires[token] < now
+            stats["total"] += 1
+            stats["expired"] += expired
+            stats["active"] += not row["is_destroyed"] and not expired
+            stats["accessed"] += row["is_destroyed"] and row["accessed_at"] is not None
+            stats["protected"] += row["passphrase_hash"] is not None
+        return stats
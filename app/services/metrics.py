@@ -0,0 +1,170 @@
+"""
+Métricas en formato de texto de Prometheus
+
+Registro propio y mínimo (sin dependencias) pensado para el camino caliente:
+cada petición solo hace búsquedas en diccionarios ya creados y actualiza un
+histograma preasignado (un `bisect` y tres sumas). El texto de exposición se
+genera únicamente cuando Prometheus consulta `/metrics`.
+
+Las métricas son por proceso: con varios workers de uvicorn cada uno expone
+las suyas (etiquetar por pod/worker al recolectar).
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) de los buckets de latencia
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Métodos que se etiquetan tal cual; el resto se agrupa en "OTHER"
+KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+
+# Etiqueta para peticiones que no coinciden con ninguna ruta (evita que cada
+# URL desconocida cree una serie nueva)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Histogram:
+    """
+    Histograma con buckets fijos (conteos no acumulados; se acumulan al exponer)
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsRegistry:
+    """
+    Métricas HTTP por ruta/método/estado y gauges de la aplicación
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: Límites superiores de los buckets de latencia en segundos
+        """
+        self.buckets = tuple(buckets)
+        # ruta -> método -> estado -> histograma
+        self._requests: Dict[str, Dict[str, Dict[int, Histogram]]] = {}
+        self.in_flight = 0
+        # nombre -> (ayuda, función que devuelve el valor al exponer)
+        self._gauge_callbacks: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._counter_callbacks: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        # nombre -> [ayuda, valor]
+        self._gauges: Dict[str, List] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        """
+        Registra una petición terminada
+        """
+        by_method = self._requests.get(route)
+        if by_method is None:
+            by_method = self._requests[route] = {}
+
+        by_status = by_method.get(method)
+        if by_status is None:
+            by_status = by_method[method] = {}
+
+        histogram = by_status.get(status)
+        if histogram is None:
+            histogram = by_status[status] = Histogram(self.buckets)
+
+        histogram.observe(seconds)
+
+    def register_gauge(self, name: str, help_text: str, callback: Callable[[], float]) -> None:
+        """
+        Registra un gauge cuyo valor se calcula al exponer las métricas
+        """
+        self._gauge_callbacks[name] = (help_text, callback)
+
+    def register_counter(self, name: str, help_text: str, callback: Callable[[], float]) -> None:
+        """
+        Registra un contador (total que solo crece, nombre `*_total`) cuyo
+        valor se lee al exponer las métricas
+        """
+        self._counter_callbacks[name] = (help_text, callback)
+
+    def set_gauge(self, name: str, help_text: str, value: float) -> None:
+        """
+        Fija el valor de un gauge
+        """
+        gauge = self._gauges.get(name)
+        if gauge is None:
+            self._gauges[name] = [help_text, value]
+        else:
+            gauge[1] = value
+
+    def render(self) -> str:
+        """
+        Genera el texto de exposición de Prometheus (versión 0.0.4)
+        """
+        lines = [
+            "# HELP http_requests_in_flight Peticiones HTTP en curso",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Peticiones HTTP terminadas",
+            "# TYPE http_requests_total counter"
+        ]
+
+        series = [
+            (f'method="{_escape(method)}",route="{_escape(route)}",status="{status}"', histogram)
+            for route, by_method in sorted(self._requests.items())
+            for method, by_status in sorted(by_method.items())
+            for status, histogram in sorted(by_status.items())
+        ]
+
+        for labels, histogram in series:
+            lines.append(f"http_requests_total{{{labels}}} {histogram.count}")
+
+        lines.append("# HELP http_request_duration_seconds Latencia de las peticiones HTTP")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for labels, histogram in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{_format(bound)}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {_format(histogram.sum)}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        callbacks = [
+            (name, help_text, callback, "gauge") for name, (help_text, callback) in self._gauge_callbacks.items()
+        ] + [
+            (name, help_text, callback, "counter") for name, (help_text, callback) in self._counter_callbacks.items()
+        ]
+        for name, help_text, callback, kind in sorted(callbacks):
+            try:
+                value = callback()
+            except Exception as e:
+                logger.error(f"❌ Error al calcular la métrica {name}: {e}")
+                continue
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {_format(value)}"))
+
+        for name, (help_text, value) in sorted(self._gauges.items()):
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_format(value)}"))
+
+        return "\n".join(lines) + "\n"
+
+
+# Instancia global del registro de métricas
+metrics = MetricsRegistry()
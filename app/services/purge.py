@@ -0,0 +1,215 @@
+"""
+Borrado por lotes de secretos expirados y de lápidas
+
+Borra en lotes acotados, cediendo el event loop entre lotes y con un
+presupuesto de tiempo por pasada: con un atraso de millones de filas
+ninguna sentencia bloquea la tabla mucho tiempo ni la API carga filas en
+memoria. Lo que quede tras agotar el presupuesto se borra en la siguiente
+pasada.
+
+- `ExpiredPurgeJob`: secretos expirados (`purge_expired_batch`)
+- `TombstoneCompactionJob`: lápidas de secretos destruidos (ya sin
+  contenido cifrado) más antiguas que la ventana de gracia
+  (`compact_destroyed_batch`). Durante la ventana de gracia un enlace ya
+  leído responde 410; después, 404.
+
+El corte (`cutoff`) se fija al empezar la pasada, así que las filas que
+vencen mientras tanto no la alargan indefinidamente.
+"""
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.services.database import database_service
+from app.services.storage import StorageBackend
+from app.utils.datetime_utils import now_spain, spain_to_utc
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos lotes se registra el progreso en el log
+PROGRESS_LOG_EVERY = 10
+
+
+class BatchedDeleteJob(ABC):
+    """
+    Estado y ejecución de un borrado por lotes con presupuesto de tiempo
+    """
+
+    # Nombre usado en los logs
+    label = "Borrado"
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        batch_size: int = 1000,
+        time_budget_seconds: float = 30.0,
+        pause_ms: int = 50
+    ):
+        """
+        Args:
+            storage: Backend de almacenamiento
+            batch_size: Filas borradas como máximo por lote
+            time_budget_seconds: Tiempo máximo por pasada
+            pause_ms: Pausa entre lotes en milisegundos
+        """
+        self.storage = storage
+        self.batch_size = batch_size
+        self.time_budget_seconds = time_budget_seconds
+        self.pause_ms = pause_ms
+
+        self.running = False
+        self.passes = 0
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.duration_seconds: Optional[float] = None
+        self.completed = False
+        self.budget_exhausted = False
+        self.batches = 0
+        self.deleted = 0
+        self.reclaimed_bytes = 0
+
+    def _cutoff(self) -> str:
+        """
+        Corte de la pasada (ISO 8601 UTC)
+        """
+        return spain_to_utc(now_spain()).isoformat()
+
+    @abstractmethod
+    async def _delete_batch(self, cutoff: str, after: Optional[str]) -> Tuple[int, int, Optional[str]]:
+        """
+        Borra un lote; devuelve (borradas, bytes liberados, cursor)
+        """
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Ejecuta una pasada hasta vaciar el atraso o agotar el presupuesto
+
+        Si ya hay una pasada en curso devuelve su progreso sin lanzar otra.
+
+        Returns:
+            Estado tras la pasada
+
+        Raises:
+            Exception: Si falla un lote (lo ya borrado queda contabilizado)
+        """
+        if self.running:
+            return self.get_status()
+
+        self.running = True
+        self.completed = False
+        self.budget_exhausted = False
+        self.batches = 0
+        self.deleted = 0
+        self.reclaimed_bytes = 0
+        self.started_at = now_spain().isoformat()
+        self.finished_at = None
+        started = time.monotonic()
+        cutoff = self._cutoff()
+
+        try:
+            after: Optional[str] = None
+            while True:
+                deleted, reclaimed, after = await self._delete_batch(cutoff, after)
+                self.batches += 1
+                self.deleted += deleted
+                self.reclaimed_bytes += reclaimed
+
+                if deleted < self.batch_size:
+                    self.completed = True
+                    break
+
+                if self.batches % PROGRESS_LOG_EVERY == 0:
+                    logger.info(f"🧹 {self.label} en curso: {self.deleted} filas eliminadas en {self.batches} lotes")
+
+                if time.monotonic() - started >= self.time_budget_seconds:
+                    self.budget_exhausted = True
+                    logger.warning(
+                        f"⚠️ {self.label}: presupuesto agotado ({self.time_budget_seconds}s) tras "
+                        f"{self.deleted} filas; el resto se eliminará en la siguiente pasada"
+                    )
+                    break
+
+                await asyncio.sleep(self.pause_ms / 1000)
+
+            self.passes += 1
+        finally:
+            self.running = False
+            self.finished_at = now_spain().isoformat()
+            self.duration_seconds = round(time.monotonic() - started, 3)
+
+        return self.get_status()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Progreso para /api/system/info
+        """
+        return {
+            "running": self.running,
+            "completed": self.completed,
+            "budget_exhausted": self.budget_exhausted,
+            "passes": self.passes,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.duration_seconds,
+            "batches": self.batches,
+            "deleted": self.deleted,
+            "reclaimed_bytes": self.reclaimed_bytes
+        }
+
+
+class ExpiredPurgeJob(BatchedDeleteJob):
+    """
+    Purga de secretos expirados
+    """
+
+    label = "Purga de expirados"
+
+    async def _delete_batch(self, cutoff: str, after: Optional[str]) -> Tuple[int, int, Optional[str]]:
+        deleted, after = await self.storage.purge_expired_batch(cutoff, after, self.batch_size)
+        return deleted, 0, after
+
+
+class TombstoneCompactionJob(BatchedDeleteJob):
+    """
+    Borrado definitivo de lápidas de secretos destruidos
+    """
+
+    label = "Compactación de lápidas"
+
+    def __init__(self, storage: StorageBackend, grace_minutes: int = 1440, **kwargs):
+        """
+        Args:
+            storage: Backend de almacenamiento
+            grace_minutes: Minutos que se conserva una lápida tras la destrucción
+            **kwargs: Tamaño de lote, presupuesto y pausa (ver BatchedDeleteJob)
+        """
+        super().__init__(storage, **kwargs)
+        self.grace_minutes = grace_minutes
+
+    def _cutoff(self) -> str:
+        return spain_to_utc(now_spain() - timedelta(minutes=self.grace_minutes)).isoformat()
+
+    async def _delete_batch(self, cutoff: str, after: Optional[str]) -> Tuple[int, int, Optional[str]]:
+        return await self.storage.compact_destroyed_batch(cutoff, after, self.batch_size)
+
+
+# Instancia global de la purga de secretos expirados
+expired_purge = ExpiredPurgeJob(
+    storage=database_service,
+    batch_size=settings.purge_batch_size,
+    time_budget_seconds=settings.purge_time_budget_seconds,
+    pause_ms=settings.purge_pause_ms
+)
+
+# Instancia global de la compactación de lápidas
+tombstone_compaction = TombstoneCompactionJob(
+    storage=database_service,
+    grace_minutes=settings.compaction_grace_minutes,
+    batch_size=settings.purge_batch_size,
+    time_budget_seconds=settings.purge_time_budget_seconds,
+    pause_ms=settings.purge_pause_ms
+)
@@ -0,0 +1,212 @@
+"""
+Estado compartido del rate limiter
+
+Un `RateLimitStore` guarda, por clave (IP) y ventana, el número de
+peticiones admitidas por todos los procesos. Cada worker suma sus
+peticiones por lotes con `increment()` y recibe en la misma operación los
+contadores globales de la ventana actual y la anterior (ver
+`SyncedRateLimiter`).
+
+Implementaciones:
+- `SharedMemoryRateLimitStore`: tabla hash de tamaño fijo en un archivo
+  mapeado en memoria (`/dev/shm`), compartida por los workers de un host.
+  Las sumas se hacen bajo un `lockf` del archivo.
+- `StorageRateLimitStore`: delega en el backend de almacenamiento
+  (`increment_rate_limits`). Con Supabase es una RPC atómica compartida por
+  todas las réplicas; con el backend en memoria sirve de sustituto local.
+"""
+from typing import Callable, Dict, Protocol, Tuple
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+
+from app.services.storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Cabecera: firma y número de huecos
+SHM_HEADER = struct.Struct("<8sQ")
+SHM_MAGIC = b"ARLSHM01"
+# Hueco: hash de la clave, índice de ventana, contador actual, contador anterior
+SHM_SLOT = struct.Struct("<QqII")
+# Huecos revisados como máximo al buscar una clave (sondeo lineal)
+SHM_MAX_PROBES = 16
+
+
+class RateLimitStore(Protocol):
+    """
+    Contadores por clave y ventana compartidos entre procesos
+    """
+
+    # Reloj con el que se calculan los índices de ventana; debe ser común a
+    # todos los procesos que comparten el almacén
+    clock: Callable[[], float]
+
+    async def increment(self, window: int, deltas: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        """
+        Suma `deltas` a la ventana `window` de cada clave de forma atómica y
+        devuelve (contador de la ventana, contador de la ventana anterior)
+        para cada una.
+        """
+        ...
+
+    async def close(self) -> None:
+        """Libera los recursos del almacén."""
+        ...
+
+
+class SharedMemoryRateLimitStore:
+    """
+    Contadores en un archivo mapeado en memoria compartido por los workers
+    de un mismo host
+
+    Las ventanas se calculan con `time.monotonic()`, que en Linux es común a
+    todos los procesos del host. Todos los workers deben usar el mismo
+    número de huecos. El archivo solo se inicializa si nadie lo ha hecho
+    antes (vacío o con la cabecera a cero), bajo el lock y antes de
+    mapearlo: un archivo con otra cabecera u otro tamaño puede estar
+    mapeado por otros procesos, así que no se toca y no se arranca.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, path: str, slots: int = 65536):
+        """
+        Args:
+            path: Archivo compartido (preferiblemente en /dev/shm)
+            slots: Claves que caben en la tabla
+
+        Raises:
+            RuntimeError: Si el archivo ya existe con otro número de huecos
+        """
+        import fcntl
+
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        size = SHM_HEADER.size + slots * SHM_SLOT.size
+        header = SHM_HEADER.pack(SHM_MAGIC, slots)
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            current = os.pread(self._fd, SHM_HEADER.size, 0)
+            if current.strip(b"\0") == b"":
+                # Nunca inicializado: ningún proceso lo ha mapeado todavía
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, header, 0)
+                logger.info(f"🛡️ Tabla del rate limiter inicializada en {path} ({slots} huecos)")
+            elif current != header or os.fstat(self._fd).st_size != size:
+                raise RuntimeError(
+                    f"{path} ya existe con otro formato o número de huecos; parar todos los "
+                    f"workers y borrarlo, o usar el mismo RATE_LIMIT_SHM_SLOTS ({slots})"
+                )
+            self._map = mmap.mmap(self._fd, size)
+        except Exception:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            raise
+        fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        # 0 marca los huecos vacíos
+        return int.from_bytes(digest, "little") or 1
+
+    def _find_slot(self, key_hash: int, window: int) -> int:
+        """
+        Offset del hueco de la clave; si no existe, reutiliza uno vacío o
+        caducado (o el más antiguo de la secuencia de sondeo)
+        """
+        start = key_hash % self.slots
+        reusable = None
+        oldest = None
+        oldest_window = None
+
+        for probe in range(SHM_MAX_PROBES):
+            offset = SHM_HEADER.size + ((start + probe) % self.slots) * SHM_SLOT.size
+            slot_hash, slot_window, _, _ = SHM_SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset
+            if slot_hash == 0:
+                # Fin de la secuencia: la clave no está más adelante
+                reusable = offset if reusable is None else reusable
+                break
+            if reusable is None and slot_window < window - 1:
+                reusable = offset
+            if oldest_window is None or slot_window < oldest_window:
+                oldest, oldest_window = offset, slot_window
+
+        offset = reusable if reusable is not None else oldest
+        SHM_SLOT.pack_into(self._map, offset, key_hash, window, 0, 0)
+        return offset
+
+    def _increment(self, window: int, deltas: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        counts = {}
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX)
+        try:
+            for key, delta in deltas.items():
+                key_hash = self._hash(key)
+                offset = self._find_slot(key_hash, window)
+                _, slot_window, current, previous = SHM_SLOT.unpack_from(self._map, offset)
+                if slot_window != window:
+                    previous = current if slot_window == window - 1 else 0
+                    current = 0
+                current += delta
+                SHM_SLOT.pack_into(self._map, offset, key_hash, window, current, previous)
+                counts[key] = (current, previous)
+        finally:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN)
+        return counts
+
+    async def increment(self, window: int, deltas: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        """
+        Suma los incrementos bajo el lock del archivo (microsegundos por lote)
+        """
+        return self._increment(window, deltas)
+
+    async def close(self) -> None:
+        """
+        Desmapea el archivo (los contadores siguen disponibles para el resto)
+        """
+        self._map.close()
+        os.close(self._fd)
+
+
+class StorageRateLimitStore:
+    """
+    Contadores en el backend de almacenamiento, compartidos entre réplicas
+
+    Las ventanas se calculan con el reloj de pared para que coincidan entre
+    nodos. Las IPs se envían como hash, nunca en claro.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, storage: StorageBackend):
+        """
+        Args:
+            storage: Backend que implementa `increment_rate_limits`
+        """
+        self.storage = storage
+
+    async def increment(self, window: int, deltas: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        """
+        Suma los incrementos con una sola llamada al almacenamiento
+        """
+        hashed = {hashlib.blake2b(key.encode(), digest_size=16).hexdigest(): key for key in deltas}
+        counts = await self.storage.increment_rate_limits(
+            window,
+            {digest: deltas[key] for digest, key in hashed.items()}
+        )
+        return {hashed[digest]: value for digest, value in counts.items() if digest in hashed}
+
+    async def close(self) -> None:
+        """
+        El backend se cierra en el shutdown de la aplicación
+        """
+        return None
@@ -0,0 +1,305 @@
+"""
+Rate limiter de ventana deslizante con memoria constante por clave
+
+Algoritmo "sliding window counter": por cada clave (IP) se guardan solo el
+índice de la ventana actual y los contadores de la ventana actual y la
+anterior. La tasa se estima ponderando la ventana anterior por la fracción
+que aún solapa con el último minuto, así que el coste por petición es O(1)
+y no depende del límite configurado.
+
+Las claves se guardan en un LRU acotado: al superar `max_keys` se descarta la
+clave usada hace más tiempo, de modo que un barrido desde muchas IPs no hace
+crecer la memoria sin límite. Todos los tiempos usan `time.monotonic()`.
+
+`SlidingWindowRateLimiter` cuenta solo las peticiones de este proceso: con
+`uvicorn --workers N` o varias réplicas el límite efectivo se multiplica por
+N. `SyncedRateLimiter` aplica el mismo algoritmo sobre contadores globales
+de un `RateLimitStore` (ver `app.services.rate_limit_store`), sincronizados
+por lotes en segundo plano: ninguna petición espera al almacén.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+import asyncio
+import logging
+import math
+import time
+
+from app.config import settings
+from app.services.database import database_service
+from app.services.rate_limit_store import (
+    RateLimitStore,
+    SharedMemoryRateLimitStore,
+    StorageRateLimitStore
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowRateLimiter:
+    """
+    Límite de peticiones por clave en una ventana deslizante
+    """
+
+    def __init__(self, limit: int, window_seconds: float = 60.0, max_keys: int = 100_000):
+        """
+        Args:
+            limit: Peticiones permitidas por ventana
+            window_seconds: Duración de la ventana en segundos
+            max_keys: Máximo de claves recordadas (LRU)
+        """
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        # clave -> [índice de ventana, contador actual, contador anterior]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit(self, key: str) -> Tuple[bool, int, int]:
+        """
+        Registra una petición de `key` si está dentro del límite
+
+        Returns:
+            (permitida, peticiones restantes, segundos hasta reintentar)
+        """
+        now = time.monotonic()
+        window = int(now // self.window_seconds)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [window, 0, 0]
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._entries.move_to_end(key)
+            if entry[0] != window:
+                # La ventana actual pasa a ser la anterior (o se descarta si
+                # hubo más de una ventana sin peticiones)
+                entry[2] = entry[1] if entry[0] == window - 1 else 0
+                entry[1] = 0
+                entry[0] = window
+
+        elapsed = now - window * self.window_seconds
+        estimated = entry[2] * (1 - elapsed / self.window_seconds) + entry[1]
+
+        if estimated >= self.limit:
+            return False, 0, max(1, math.ceil(self.window_seconds - elapsed))
+
+        entry[1] += 1
+        return True, max(0, int(self.limit - estimated - 1)), 0
+
+    async def close(self) -> None:
+        """
+        No hay estado externo que sincronizar
+        """
+        return None
+
+
+class SyncedRateLimiter:
+    """
+    Límite global por clave con contadores compartidos entre procesos
+
+    Cada proceso decide localmente con los últimos contadores globales
+    recibidos más sus peticiones aún no sincronizadas, y suma estas al
+    almacén por lotes: cada `sync_interval` segundos mientras haya tráfico,
+    o antes si se acumulan `sync_batch` peticiones. Entre dos
+    sincronizaciones cada proceso puede admitir como mucho las peticiones
+    que ve él mismo, así que el exceso sobre el límite global está acotado
+    por el intervalo de sincronización.
+    """
+
+    def __init__(
+        self,
+        store: RateLimitStore,
+        limit: int,
+        window_seconds: float = 60.0,
+        max_keys: int = 100_000,
+        sync_interval: float = 0.25,
+        sync_batch: int = 100
+    ):
+        """
+        Args:
+            store: Almacén de los contadores globales
+            limit: Peticiones permitidas por ventana entre todos los procesos
+            window_seconds: Duración de la ventana en segundos
+            max_keys: Máximo de claves recordadas en este proceso (LRU)
+            sync_interval: Segundos máximos entre sincronizaciones
+            sync_batch: Peticiones pendientes que fuerzan una sincronización
+        """
+        self.store = store
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.sync_interval = sync_interval
+        self.sync_batch = sync_batch
+        # clave -> [índice de ventana, contador global actual, contador
+        # global anterior, peticiones locales no incluidas en el global]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        # índice de ventana -> clave -> peticiones pendientes de sumar
+        self._pending: Dict[int, Dict[str, int]] = {}
+        self._pending_hits = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._syncing: Optional[asyncio.Task] = None
+        self.evicted = 0
+        self.syncs = 0
+        self.sync_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit(self, key: str) -> Tuple[bool, int, int]:
+        """
+        Registra una petición de `key` si está dentro del límite global
+
+        Returns:
+            (permitida, peticiones restantes, segundos hasta reintentar)
+        """
+        now = self.store.clock()
+        window = int(now // self.window_seconds)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [window, 0, 0, 0]
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._entries.move_to_end(key)
+            if entry[0] != window:
+                entry[2] = entry[1] + entry[3] if entry[0] == window - 1 else 0
+                entry[1] = entry[3] = 0
+                entry[0] = window
+
+        elapsed = now - window * self.window_seconds
+        estimated = entry[2] * (1 - elapsed / self.window_seconds) + entry[1] + entry[3]
+
+        if estimated >= self.limit:
+            return False, 0, max(1, math.ceil(self.window_seconds - elapsed))
+
+        entry[3] += 1
+        pending = self._pending.get(window)
+        if pending is None:
+            pending = self._pending[window] = {}
+        pending[key] = pending.get(key, 0) + 1
+        self._pending_hits += 1
+        self._schedule_sync()
+
+        return True, max(0, int(self.limit - estimated - 1)), 0
+
+    def _schedule_sync(self) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._pending_hits >= self.sync_batch:
+            self._wake.set()
+        if self._syncing is None or self._syncing.done():
+            self._syncing = asyncio.create_task(self._sync_loop())
+
+    async def _sync_loop(self) -> None:
+        # Vive mientras haya peticiones pendientes; sin tráfico no hay llamadas
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.sync()
+
+    async def sync(self) -> None:
+        """
+        Suma las peticiones pendientes al almacén y actualiza los contadores
+        globales de las claves enviadas
+
+        Si el almacén falla, las peticiones se conservan para el siguiente
+        intento.
+        """
+        batches, self._pending = self._pending, {}
+        self._pending_hits = 0
+
+        for window in sorted(batches):
+            deltas = batches[window]
+            try:
+                counts = await self.store.increment(window, deltas)
+            except Exception as e:
+                self._requeue({w: d for w, d in batches.items() if w >= window})
+                self.sync_errors += 1
+                logger.error(f"❌ Error al sincronizar el rate limiter: {e}")
+                return
+
+            self.syncs += 1
+            for key, (current, previous) in counts.items():
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] == window:
+                    entry[1] = current
+                    entry[2] = previous
+                    entry[3] = max(0, entry[3] - deltas.get(key, 0))
+                elif entry[0] == window + 1:
+                    # La ventana cambió mientras se sincronizaba
+                    entry[2] = current
+
+    def _requeue(self, batches: Dict[int, Dict[str, int]]) -> None:
+        for window, deltas in batches.items():
+            pending = self._pending.setdefault(window, {})
+            for key, value in deltas.items():
+                pending[key] = pending.get(key, 0) + value
+                self._pending_hits += value
+
+    async def close(self) -> None:
+        """
+        Detiene la sincronización en segundo plano, envía lo pendiente y
+        libera el almacén
+        """
+        if self._syncing is not None and not self._syncing.done():
+            self._syncing.cancel()
+            try:
+                await self._syncing
+            except asyncio.CancelledError:
+                pass
+        await self.sync()
+        await self.store.close()
+
+
+RateLimiter = Union[SlidingWindowRateLimiter, SyncedRateLimiter]
+
+
+def create_rate_limiter() -> RateLimiter:
+    """
+    Crea el rate limiter configurado en RATE_LIMIT_BACKEND
+
+    - process: contadores de este proceso (un solo worker)
+    - shm: contadores compartidos por los workers del host
+    - storage: contadores en el backend de almacenamiento (varias réplicas)
+
+    Raises:
+        ValueError: Si el backend configurado no existe
+    """
+    backend = settings.rate_limit_backend.lower()
+    options = {
+        "limit": settings.rate_limit_per_minute,
+        "window_seconds": 60.0,
+        "max_keys": settings.rate_limit_max_tracked_ips
+    }
+
+    if backend == "process":
+        return SlidingWindowRateLimiter(**options)
+    if backend == "shm":
+        store = SharedMemoryRateLimitStore(settings.rate_limit_shm_path, settings.rate_limit_shm_slots)
+    elif backend == "storage":
+        store = StorageRateLimitStore(database_service)
+    else:
+        raise ValueError(f"RATE_LIMIT_BACKEND desconocido: {settings.rate_limit_backend}")
+
+    return SyncedRateLimiter(
+        store,
+        sync_interval=settings.rate_limit_sync_interval_ms / 1000,
+        sync_batch=settings.rate_limit_sync_batch,
+        **options
+    )
+
+
+# Rate limiter global de la API
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,94 @@
+"""
+Caché stale-while-revalidate para las estadísticas globales
+
+Los dashboards consultan `/api/stats` con frecuencia; calcular los contadores
+recorre toda la tabla. Durante `ttl` segundos se devuelve el valor en caché;
+después, y hasta `max_stale` segundos más, se devuelve el valor anterior al
+instante mientras se recalcula en segundo plano. Solo hay un recálculo en
+curso a la vez, aunque lleguen muchas peticiones simultáneas.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.services.database import database_service
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCache:
+    """
+    Valor en caché con revalidación en segundo plano
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[Dict[str, Any]]],
+        ttl_seconds: float = 5.0,
+        max_stale_seconds: float = 60.0
+    ):
+        """
+        Args:
+            loader: Corrutina que calcula el valor
+            ttl_seconds: Segundos en los que el valor se considera fresco (0 = sin caché)
+            max_stale_seconds: Segundos adicionales en los que se sirve el valor
+                antiguo mientras se recalcula
+        """
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self._value: Optional[Dict[str, Any]] = None
+        self._loaded_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def _load(self) -> Dict[str, Any]:
+        value = await self.loader()
+        self._value = value
+        self._loaded_at = time.monotonic()
+        return value
+
+    def _start_refresh(self) -> asyncio.Task:
+        """
+        Lanza el recálculo si no hay uno en curso y lo devuelve
+        """
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._load())
+            self._refresh.add_done_callback(self._log_refresh_error)
+        return self._refresh
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"❌ Error al recalcular estadísticas: {task.exception()}")
+
+    async def get(self) -> Tuple[Dict[str, Any], float]:
+        """
+        Devuelve el valor y su antigüedad en segundos
+
+        Raises:
+            Exception: Si no hay valor utilizable y el cálculo falla
+        """
+        if self.ttl_seconds <= 0:
+            return await self.loader(), 0.0
+
+        age = time.monotonic() - self._loaded_at
+        if self._value is not None:
+            if age <= self.ttl_seconds:
+                return self._value, age
+            if age <= self.ttl_seconds + self.max_stale_seconds:
+                self._start_refresh()
+                return self._value, age
+
+        # Sin valor o demasiado antiguo: esperar al recálculo (compartido)
+        value = await asyncio.shield(self._start_refresh())
+        return value, 0.0
+
+
+# Instancia global de la caché de estadísticas
+stats_cache = StatsCache(
+    loader=database_service.get_stats,
+    ttl_seconds=settings.stats_cache_ttl_seconds,
+    max_stale_seconds=settings.stats_cache_max_stale_seconds
+)
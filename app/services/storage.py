@@ -0,0 +1,188 @@
+"""
+Protocolo común de los backends de almacenamiento de secretos
+
+Los routers y el scheduler solo dependen de estas operaciones, de modo que
+el motor concreto (Supabase, memoria, ...) se elige desde `Settings`.
+Todas las filas se devuelven como diccionarios con el mismo formato que
+PostgREST: fechas como strings ISO 8601 en UTC.
+"""
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Protocol, Tuple, runtime_checkable
+
+
+class TokenConflictError(Exception):
+    """
+    El token ya existe (violación de la restricción UNIQUE sobre `token`)
+    """
+
+@runtime_checkable
+class StorageBackend(Protocol):
+    """
+    Operaciones de almacenamiento que necesita la API
+    """
+
+    async def connect(self) -> Any:
+        """Inicializa recursos (conexiones, pools). Debe ser idempotente."""
+        ...
+
+    async def close(self) -> None:
+        """Libera los recursos abiertos en connect()."""
+        ...
+
+    async def ping(self) -> bool:
+        """Comprueba que el backend responde."""
+        ...
+
+    async def create_secret(
+        self,
+        token: str,
+        encrypted_content: bytes,
+        expires_at: datetime,
+        passphrase_hash: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        kind: str = "text"
+    ) -> Dict[str, Any]:
+        """
+        Guarda un secreto nuevo y devuelve la fila creada.
+
+        Lanza TokenConflictError si el token ya existe.
+        """
+        ...
+
+    async def create_secrets_bulk(self, secrets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Guarda varios secretos en una sola operación (todo o nada).
+
+        Cada elemento contiene los argumentos de create_secret. Lanza
+        TokenConflictError si algún token ya existe.
+        """
+        ...
+
+    async def get_secret_by_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la fila del secreto o None si no existe."""
+        ...
+
+    async def consume_secret(
+        self,
+        token: str,
+        allow_protected: bool = False,
+        kind: str = "text"
+    ) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Reclama el secreto de forma atómica en una sola operación
+
+        Marca `is_destroyed` solo si el secreto sigue vivo (no destruido y no
+        expirado), es del tipo `kind` ("text" o "file") y, salvo
+        `allow_protected`, no tiene passphrase. Devuelve (True, fila
+        reclamada con su contenido) o, si no se cumplió la condición,
+        (False, fila actual o None si no existe) para conocer el motivo sin
+        otra consulta. En el almacenamiento queda una lápida sin contenido
+        cifrado.
+        """
+        ...
+
+    async def mark_as_accessed(self, token: str) -> bool:
+        """Marca el secreto como leído y destruido, liberando su contenido."""
+        ...
+
+    async def delete_secret(self, token: str) -> bool:
+        """Destruye el secreto sin leerlo, liberando su contenido."""
+        ...
+
+    async def destroy_secrets(self, tokens: List[str]) -> Dict[str, List[Any]]:
+        """
+        Destruye varios secretos en una sola operación.
+
+        Devuelve los tokens clasificados en "destroyed", "already_destroyed"
+        y "not_found", y en "file_contents" el contenido cifrado que tenían
+        los secretos de archivo destruidos (para eliminar sus blobs).
+        """
+        ...
+
+    async def get_live_secrets_page(
+        self,
+        after_token: Optional[str],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Página de secretos vivos ordenados por token (paginación por clave).
+
+        Devuelve como máximo `limit` filas con "token" y "encrypted_content",
+        con token mayor que `after_token` (o desde el principio si es None).
+        """
+        ...
+
+    async def get_live_tokens_page(
+        self,
+        after_token: Optional[str],
+        limit: int
+    ) -> List[str]:
+        """
+        Página de tokens de secretos vivos ordenados (paginación por clave).
+
+        Como `get_live_secrets_page` pero sin transferir el contenido.
+        """
+        ...
+
+    async def replace_encrypted_content(
+        self,
+        token: str,
+        expected: bytes,
+        encrypted_content: bytes
+    ) -> bool:
+        """
+        Sustituye el contenido cifrado si el secreto sigue vivo y su
+        contenido sigue siendo `expected`. Devuelve si se actualizó.
+        """
+        ...
+
+    async def next_expiration(self) -> Optional[str]:
+        """Expiración más cercana de los secretos guardados (ISO 8601 UTC) o None."""
+        ...
+
+    async def purge_expired_batch(
+        self,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Elimina como mucho `limit` secretos con `expires_at < cutoff`, en
+        orden de expiración y empezando en `after` (cursor del lote anterior).
+
+        Devuelve (eliminados, cursor para el siguiente lote). Nunca lee el
+        contenido cifrado de las filas borradas.
+        """
+        ...
+
+    async def compact_destroyed_batch(
+        self,
+        cutoff: str,
+        after: Optional[str],
+        limit: int
+    ) -> Tuple[int, int, Optional[str]]:
+        """
+        Borra definitivamente como mucho `limit` lápidas (secretos
+        destruidos) con `destroyed_at < cutoff`, empezando en `after`.
+
+        Devuelve (borradas, bytes liberados, cursor para el siguiente lote).
+        """
+        ...
+
+    async def flush_counters(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        """
+        Suma los incrementos a los contadores de eventos globales y devuelve
+        los totales agregados de todos los workers.
+        """
+        ...
+
+    async def increment_rate_limits(self, window: int, deltas: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        """
+        Suma peticiones a la ventana `window` del rate limiter por clave y
+        devuelve (contador de la ventana, contador de la anterior) de cada una.
+        """
+        ...
+
+    async def get_stats(self) -> Dict[str, int]:
+        """Contadores globales: total, activos, accedidos, expirados y protegidos."""
+        ...
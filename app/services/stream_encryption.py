@@ -0,0 +1,149 @@
+"""
+Cifrado autenticado por bloques (streaming) para secretos grandes
+
+Construcción STREAM sobre AES-256-GCM: el contenido se divide en bloques de
+tamaño fijo y cada bloque se sella por separado con un nonce derivado de un
+prefijo aleatorio, el número de bloque y un indicador de último bloque. Así
+se detecta cualquier reordenación, duplicado o truncado, y la memoria usada
+es constante (un bloque) sea cual sea el tamaño del archivo.
+
+Formato:
+    cabecera = MAGIC (4) | tamaño de bloque (4, big-endian) | prefijo nonce (7)
+    bloque_i = AES-GCM(clave, prefijo | i (4) | último (1), datos) -> datos + tag (16)
+"""
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from typing import List
+import os
+import struct
+
+MAGIC = b"ASB1"
+NONCE_PREFIX_BYTES = 7
+TAG_BYTES = 16
+HEADER_BYTES = len(MAGIC) + 4 + NONCE_PREFIX_BYTES
+KEY_BYTES = 32
+MAX_CHUNKS = 2 ** 32
+
+
+def generate_key() -> bytes:
+    """
+    Genera una clave de datos aleatoria para un único blob
+    """
+    return AESGCM.generate_key(bit_length=KEY_BYTES * 8)
+
+
+def _nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    if counter >= MAX_CHUNKS:
+        raise ValueError("Demasiados bloques para un único blob")
+    return prefix + struct.pack(">I", counter) + (b"\x01" if last else b"\x00")
+
+
+class StreamEncryptor:
+    """
+    Cifra un flujo de bytes de tamaño arbitrario bloque a bloque
+    """
+
+    def __init__(self, key: bytes, chunk_size: int):
+        """
+        Args:
+            key: Clave AES-256 del blob
+            chunk_size: Tamaño en bytes de cada bloque de texto plano
+        """
+        self._aead = AESGCM(key)
+        self._chunk_size = chunk_size
+        self._prefix = os.urandom(NONCE_PREFIX_BYTES)
+        self._counter = 0
+        self._buffer = bytearray()
+        self._header_sent = False
+
+    def _seal(self, data: bytes, last: bool) -> bytes:
+        sealed = self._aead.encrypt(_nonce(self._prefix, self._counter, last), data, None)
+        self._counter += 1
+        return sealed
+
+    def _header(self) -> List[bytes]:
+        if self._header_sent:
+            return []
+        self._header_sent = True
+        return [MAGIC + struct.pack(">I", self._chunk_size) + self._prefix]
+
+    def update(self, data: bytes) -> List[bytes]:
+        """
+        Añade datos y devuelve los bloques cifrados completos
+
+        Retiene siempre el último bloque (completo o no) para poder marcarlo
+        en `finalize()`; el buffer nunca supera un bloque más `len(data)`.
+        """
+        self._buffer += data
+        out = self._header()
+        while len(self._buffer) > self._chunk_size:
+            chunk = bytes(self._buffer[:self._chunk_size])
+            del self._buffer[:self._chunk_size]
+            out.append(self._seal(chunk, last=False))
+        return out
+
+    def finalize(self) -> List[bytes]:
+        """
+        Sella el último bloque (puede estar vacío)
+        """
+        out = self._header()
+        out.append(self._seal(bytes(self._buffer), last=True))
+        self._buffer.clear()
+        return out
+
+
+class StreamDecryptor:
+    """
+    Descifra y autentica un flujo producido por `StreamEncryptor`
+    """
+
+    def __init__(self, key: bytes):
+        self._aead = AESGCM(key)
+        self._buffer = bytearray()
+        self._prefix = b""
+        self._sealed_size = 0
+        self._counter = 0
+
+    def _open(self, sealed: bytes, last: bool) -> bytes:
+        plain = self._aead.decrypt(_nonce(self._prefix, self._counter, last), sealed, None)
+        self._counter += 1
+        return plain
+
+    def update(self, data: bytes) -> List[bytes]:
+        """
+        Añade datos cifrados y devuelve los bloques ya autenticados
+
+        Raises:
+            cryptography.exceptions.InvalidTag: Si algún bloque fue alterado
+        """
+        self._buffer += data
+
+        if not self._sealed_size:
+            if len(self._buffer) < HEADER_BYTES:
+                return []
+            if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+                raise ValueError("Formato de blob cifrado desconocido")
+            chunk_size = struct.unpack(">I", self._buffer[len(MAGIC):len(MAGIC) + 4])[0]
+            self._prefix = bytes(self._buffer[len(MAGIC) + 4:HEADER_BYTES])
+            self._sealed_size = chunk_size + TAG_BYTES
+            del self._buffer[:HEADER_BYTES]
+
+        # Un bloque solo es "no último" si hay más datos detrás de él
+        out = []
+        while len(self._buffer) > self._sealed_size:
+            sealed = bytes(self._buffer[:self._sealed_size])
+            del self._buffer[:self._sealed_size]
+            out.append(self._open(sealed, last=False))
+        return out
+
+    def finalize(self) -> bytes:
+        """
+        Autentica el último bloque; falla si el flujo está truncado
+
+        Raises:
+            cryptography.exceptions.InvalidTag: Si el flujo fue truncado o alterado
+        """
+        if not self._sealed_size:
+            raise ValueError("Blob cifrado incompleto")
+        plain = self._open(bytes(self._buffer), last=True)
+        self._buffer.clear()
+        return plain
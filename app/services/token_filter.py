@@ -0,0 +1,322 @@
+"""
+Filtro de pertenencia de tokens vivos
+
+Los bots que reintentan enlaces ya leídos o revocados contra
+`GET /api/secret/{token}`, `POST /api/secret/verify` o el borrado cuestan
+cada uno una consulta completa antes del 404/410 (los tokens falsificados o
+expirados ya los descarta la firma). Un filtro de Bloom en memoria con los
+tokens vivos responde "seguro que no existe" sin tocar la base de datos; si
+responde "puede existir" se consulta como siempre.
+
+El filtro nunca da falsos negativos, aunque haya varios workers o réplicas.
+Solo decide sobre los tokens cuya existencia conoce entero:
+
+- Los creados por este proceso (llevan su etiqueta, ver
+  `app.utils.token_generator`): se añaden al crearlos (`add`).
+- Los creados por cualquier proceso antes de la última reconstrucción: la
+  creación se acota con la expiración firmada en el token (expiración - TTL
+  mínimo) y `rebuild()` recorre por páginas los tokens vivos del
+  almacenamiento. Hasta la primera reconstrucción solo decide sobre los
+  propios.
+
+El resto (creados después en otro proceso o del formato anterior) siempre
+consultan el almacenamiento. Un filtro de Bloom no admite borrados: los
+tokens destruidos en este proceso se guardan aparte (`discard`) y se
+rechazan siempre; salen de ahí cuando una reconstrucción posterior ya no
+los incluye.
+"""
+from typing import Any, Dict, List, Optional
+import hashlib
+import logging
+import math
+import time
+
+from app.config import settings
+from app.services.database import database_service
+from app.services.metrics import metrics
+from app.services.storage import StorageBackend
+from app.utils.datetime_utils import now_spain
+from app.utils.token_generator import created_by_this_process, signed_token_expiry
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom de tamaño fijo sobre un bytearray
+
+    Las k posiciones de cada token se derivan de un único blake2b de 128
+    bits (doble hashing: h1 + i·h2).
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        """
+        Args:
+            capacity: Elementos previstos
+            fp_rate: Tasa de falsos positivos con `capacity` elementos
+        """
+        capacity = max(capacity, 1)
+        self.bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, token: str):
+        digest = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, token: str) -> None:
+        array = self._array
+        for position in self._positions(token):
+            array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, token: str) -> bool:
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(token))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+    def estimated_fp_rate(self) -> float:
+        """
+        Tasa de falsos positivos esperada con los elementos añadidos
+        """
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+class TokenFilter:
+    """
+    Filtro de tokens vivos reconstruido periódicamente desde el almacenamiento
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        enabled: bool = False,
+        capacity: int = 1000000,
+        fp_rate: float = 0.01,
+        page_size: int = 5000,
+        min_ttl_seconds: int = 300,
+        margin_seconds: int = 60
+    ):
+        """
+        Args:
+            storage: Backend de almacenamiento
+            enabled: Si es False el filtro no descarta ningún token
+            capacity: Tokens vivos previstos (fija la memoria del filtro)
+            fp_rate: Tasa de falsos positivos con el filtro a capacidad
+            page_size: Tokens por página al reconstruir
+            min_ttl_seconds: TTL mínimo de un secreto (acota su creación)
+            margin_seconds: Margen para desfases de reloj entre procesos y
+                para inserciones en curso al empezar la reconstrucción
+        """
+        self.storage = storage
+        self.enabled = enabled
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.page_size = page_size
+        self.min_ttl_seconds = min_ttl_seconds
+        self.margin_seconds = margin_seconds
+
+        self._filter = BloomFilter(capacity, fp_rate) if enabled else None
+        self._ready = False
+        # Tokens creados mientras se reconstruye (se añaden al filtro nuevo)
+        self._added_during_rebuild: Optional[List[str]] = None
+        # Tokens destruidos en este proceso -> momento de la destrucción (epoch)
+        self._destroyed: Dict[str, float] = {}
+        # Epoch de inicio del recorrido del filtro actual
+        self._scan_started = 0.0
+
+        self.rejected = 0
+        self.passed = 0
+        self.bypassed = 0
+        self.rebuilds = 0
+        self.last_rebuild_at: Optional[str] = None
+        self.last_rebuild_seconds: Optional[float] = None
+
+        if enabled:
+            self._register_metrics()
+
+    def _register_metrics(self) -> None:
+        metrics.register_gauge(
+            "autopus_token_filter_bytes",
+            "Memoria ocupada por el filtro de tokens vivos",
+            lambda: self._filter.size_bytes
+        )
+        metrics.register_gauge(
+            "autopus_token_filter_entries",
+            "Tokens añadidos al filtro desde la última reconstrucción",
+            lambda: self._filter.count
+        )
+        metrics.register_gauge(
+            "autopus_token_filter_destroyed_entries",
+            "Tokens destruidos en este proceso pendientes de salir con una reconstrucción",
+            lambda: len(self._destroyed)
+        )
+        metrics.register_gauge(
+            "autopus_token_filter_fp_rate_target",
+            "Tasa de falsos positivos configurada",
+            lambda: self.fp_rate
+        )
+        metrics.register_gauge(
+            "autopus_token_filter_fp_rate_estimated",
+            "Tasa de falsos positivos estimada con los tokens actuales",
+            lambda: self._filter.estimated_fp_rate()
+        )
+        metrics.register_counter(
+            "autopus_token_filter_rejected_total",
+            "Búsquedas descartadas por el filtro sin consultar la base de datos",
+            lambda: self.rejected
+        )
+        metrics.register_counter(
+            "autopus_token_filter_passed_total",
+            "Búsquedas que el filtro dejó pasar a la base de datos",
+            lambda: self.passed
+        )
+        metrics.register_counter(
+            "autopus_token_filter_bypassed_total",
+            "Búsquedas de tokens que el filtro no cubre (de otro proceso y posteriores a la reconstrucción)",
+            lambda: self.bypassed
+        )
+
+    def covers(self, token: str) -> bool:
+        """
+        Indica si el filtro conoce todos los secretos vivos con este token:
+        creado por este proceso, o seguro que antes de empezar el recorrido
+        de la última reconstrucción
+        """
+        if created_by_this_process(token):
+            return True
+        if not self._ready:
+            return False
+        expiry = signed_token_expiry(token)
+        return expiry is not None and expiry - self.min_ttl_seconds < self._scan_started - self.margin_seconds
+
+    def might_exist(self, token: str) -> bool:
+        """
+        Indica si el token puede corresponder a un secreto vivo
+
+        False significa que seguro que no existe o ya fue destruido.
+        """
+        if self._filter is None:
+            return True
+
+        if token in self._destroyed:
+            self.rejected += 1
+            return False
+
+        if not self.covers(token):
+            self.bypassed += 1
+            return True
+
+        if token in self._filter:
+            self.passed += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+    def add(self, token: str) -> None:
+        """
+        Registra un secreto creado por este proceso
+        """
+        if self._filter is None:
+            return
+
+        self._filter.add(token)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(token)
+
+    def discard(self, token: str) -> None:
+        """
+        Registra un secreto destruido por este proceso (se rechaza desde ya)
+        """
+        if self._filter is not None:
+            self._destroyed[token] = time.time()
+
+    async def rebuild(self) -> None:
+        """
+        Reconstruye el filtro con los tokens vivos del almacenamiento
+
+        El filtro actual sigue respondiendo mientras tanto; si falla una
+        página se conserva.
+        """
+        if not self.enabled or self._added_during_rebuild is not None:
+            return
+
+        started = time.time()
+        bloom = BloomFilter(self.capacity, self.fp_rate)
+        self._added_during_rebuild = []
+        try:
+            after: Optional[str] = None
+            while True:
+                tokens = await self.storage.get_live_tokens_page(after, self.page_size)
+                for token in tokens:
+                    bloom.add(token)
+                if len(tokens) < self.page_size:
+                    break
+                after = tokens[-1]
+
+            for token in self._added_during_rebuild:
+                bloom.add(token)
+        finally:
+            self._added_during_rebuild = None
+
+        # Los destruidos antes del recorrido ya no están en el filtro nuevo
+        cutoff = started - self.margin_seconds
+        self._destroyed = {token: at for token, at in self._destroyed.items() if at >= cutoff}
+
+        self._filter = bloom
+        self._scan_started = started
+        self._ready = True
+        self.rebuilds += 1
+        self.last_rebuild_at = now_spain().isoformat()
+        self.last_rebuild_seconds = round(time.time() - started, 3)
+
+        if bloom.count > self.capacity:
+            logger.warning(
+                f"⚠️ Filtro de tokens por encima de su capacidad ({bloom.count} > {self.capacity}): "
+                f"falsos positivos estimados {bloom.estimated_fp_rate():.2%}"
+            )
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Estado para /api/system/info
+        """
+        if not self.enabled:
+            return {"enabled": False}
+
+        return {
+            "enabled": True,
+            "ready": self._ready,
+            "capacity": self.capacity,
+            "bytes": self._filter.size_bytes,
+            "hashes": self._filter.hashes,
+            "entries": self._filter.count,
+            "destroyed_entries": len(self._destroyed),
+            "fp_rate_target": self.fp_rate,
+            "fp_rate_estimated": round(self._filter.estimated_fp_rate(), 6),
+            "rejected": self.rejected,
+            "passed": self.passed,
+            "bypassed": self.bypassed,
+            "rebuilds": self.rebuilds,
+            "last_rebuild_at": self.last_rebuild_at,
+            "last_rebuild_seconds": self.last_rebuild_seconds
+        }
+
+
+# Instancia global del filtro de tokens vivos
+token_filter = TokenFilter(
+    storage=database_service,
+    enabled=settings.token_filter_enabled,
+    capacity=settings.token_filter_capacity,
+    fp_rate=settings.token_filter_fp_rate,
+    page_size=settings.token_filter_page_size,
+    min_ttl_seconds=settings.min_ttl_minutes * 60,
+    margin_seconds=settings.token_filter_margin_seconds
+)
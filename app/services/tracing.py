@@ -0,0 +1,304 @@
+"""
+Medición por etapas de cada petición (Server-Timing y trazas)
+
+Los routers y el backend de almacenamiento marcan sus etapas con
+`with stage("encrypt"): ...`. Si la petición no se está trazando (opción
+desactivada), `stage()` devuelve un context manager vacío compartido: el
+coste es una lectura de ContextVar.
+
+Con la traza activa cada etapa se guarda como un span hijo de la petición y
+al terminar se puede:
+- resumir en la cabecera `Server-Timing` (ver `app.middleware.timing`)
+- exportar en formato OTLP/JSON a un archivo JSONL (mismo formato que el
+  file exporter del OpenTelemetry Collector) o a un endpoint OTLP/HTTP
+"""
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import time
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tipos de span de OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_CODE_ERROR = 2
+
+# (nombre, span_id, span padre, inicio ns, fin ns, error)
+Span = Tuple[str, str, str, int, int, bool]
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("request_trace_span", default=None)
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+class RequestTrace:
+    """
+    Spans de una petición
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = _new_id(16)
+        self.span_id = _new_id(8)
+        self.start_ns = time.time_ns()
+        self.spans: List[Span] = []
+
+    def server_timing(self, total_ms: float) -> str:
+        """
+        Valor de la cabecera Server-Timing (duraciones sumadas por etapa)
+        """
+        durations: Dict[str, float] = {}
+        for name, _, _, start, end, _ in self.spans:
+            durations[name] = durations.get(name, 0.0) + (end - start) / 1e6
+        entries = [f"{name};dur={ms:.2f}" for name, ms in durations.items()]
+        entries.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(entries)
+
+    def to_otlp_spans(self, end_ns: int, attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Spans en la codificación JSON de OTLP (span raíz + etapas)
+        """
+        root = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_SERVER,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in attributes.items()]
+        }
+        if attributes.get("http.response.status_code", 0) >= 500:
+            root["status"] = {"code": STATUS_CODE_ERROR}
+
+        spans = [root]
+        for name, span_id, parent_id, start, end, error in self.spans:
+            span = {
+                "traceId": self.trace_id,
+                "spanId": span_id,
+                "parentSpanId": parent_id,
+                "name": name,
+                "kind": SPAN_KIND_INTERNAL,
+                "startTimeUnixNano": str(start),
+                "endTimeUnixNano": str(end)
+            }
+            if error:
+                span["status"] = {"code": STATUS_CODE_ERROR}
+            spans.append(span)
+        return spans
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class _NoopStage:
+    """
+    Etapa sin traza activa: no mide nada
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopStage":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+class _Stage:
+    """
+    Etapa medida como span hijo del span actual
+    """
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "token")
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(8)
+
+    def __enter__(self) -> "_Stage":
+        self.parent_id = _current_span.get() or self.trace.span_id
+        self.token = _current_span.set(self.span_id)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        end_ns = time.time_ns()
+        _current_span.reset(self.token)
+        self.trace.spans.append(
+            (self.name, self.span_id, self.parent_id, self.start_ns, end_ns, exc_type is not None)
+        )
+        return False
+
+
+def stage(name: str):
+    """
+    Context manager que mide una etapa de la petición actual
+
+    Args:
+        name: Nombre de la etapa (token válido para Server-Timing, p. ej. "db.insert")
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_STAGE
+    return _Stage(trace, name)
+
+
+def start_trace(name: str) -> Tuple[RequestTrace, Any]:
+    """
+    Activa una traza para el contexto actual; devuelve (traza, token para reset)
+    """
+    trace = RequestTrace(name)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: Any) -> None:
+    """
+    Desactiva la traza del contexto actual
+    """
+    _current_trace.reset(token)
+
+
+class SpanExporter(ABC):
+    """
+    Acumula spans y los envía por lotes (OTLP/JSON)
+    """
+
+    def __init__(self, service_name: str, batch_size: int = 64, flush_interval: float = 5.0):
+        """
+        Args:
+            service_name: Valor de `service.name` del recurso
+            batch_size: Trazas acumuladas que fuerzan un envío
+            flush_interval: Segundos máximos entre envíos mientras haya tráfico
+        """
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._flushing: Optional[asyncio.Task] = None
+        self.exported = 0
+        self.errors = 0
+
+    def _payload(self, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "autopus-secret-api"}, "spans": spans}]
+            }]
+        }
+
+    def add(self, spans: List[Dict[str, Any]]) -> None:
+        """
+        Añade los spans de una petición y lanza un envío si toca
+        """
+        self._buffer.extend(spans)
+        due = time.monotonic() - self._last_flush >= self.flush_interval
+        if (len(self._buffer) >= self.batch_size or due) and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        """
+        Envía los spans acumulados
+        """
+        spans, self._buffer = self._buffer, []
+        self._last_flush = time.monotonic()
+        if not spans:
+            return
+        try:
+            await self._send(self._payload(spans))
+            self.exported += len(spans)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Error al exportar {len(spans)} spans: {e}")
+
+    @abstractmethod
+    async def _send(self, payload: Dict[str, Any]) -> None:
+        """
+        Envía un lote ya serializado como payload OTLP
+        """
+
+    async def close(self) -> None:
+        """
+        Envía lo pendiente y libera recursos
+        """
+        await self.flush()
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Escribe cada lote como una línea JSON (OTLP) en un archivo
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def _write(self, line: str) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+
+    async def _send(self, payload: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, json.dumps(payload, separators=(",", ":")))
+
+
+class OtlpHttpSpanExporter(SpanExporter):
+    """
+    Envía cada lote a un endpoint OTLP/HTTP con codificación JSON
+    """
+
+    def __init__(self, endpoint: str, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self._client = httpx.AsyncClient(timeout=5.0)
+
+    async def _send(self, payload: Dict[str, Any]) -> None:
+        response = await self._client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await super().close()
+        await self._client.aclose()
+
+
+def create_span_exporter() -> Optional[SpanExporter]:
+    """
+    Crea el exportador configurado en TRACING_EXPORTER (None si está desactivado)
+
+    Raises:
+        ValueError: Si el exportador configurado no existe
+    """
+    exporter = settings.tracing_exporter.lower()
+    if exporter == "none":
+        return None
+    if exporter == "file":
+        return FileSpanExporter(settings.tracing_file_path, service_name=settings.api_title)
+    if exporter == "otlp":
+        return OtlpHttpSpanExporter(settings.tracing_otlp_endpoint, service_name=settings.api_title)
+
+    raise ValueError(f"TRACING_EXPORTER desconocido: {settings.tracing_exporter}")
+
+
+# Exportador global de spans (None = sin exportación)
+span_exporter = create_span_exporter()
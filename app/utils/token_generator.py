@@ -1,15 +1,177 @@
 """
 Generador de tokens únicos y seguros para los secretos
+
+Formato firmado (tokens nuevos):
+
+    aleatorio (32 bytes, base64url) . expiración (epoch en hex) . MAC
+
+Los 6 primeros bytes de la parte aleatoria son una etiqueta aleatoria del
+proceso que creó el token (8 caracteres); los 26 restantes son aleatorios
+por token. La etiqueta permite a cada proceso saber qué tokens creó él
+(ver `app.services.token_filter`).
+
+El MAC es un HMAC-SHA256 truncado a 16 bytes de "aleatorio.expiración",
+con una clave derivada por HKDF de ENCRYPTION_KEY (y de las anteriores al
+verificar, para sobrevivir a una rotación). Con él `check_token` descarta
+tokens malformados, falsificados o expirados sin consultar el
+almacenamiento.
+
+Los tokens anteriores (48 bytes aleatorios sin firma) se siguen aceptando
+mientras `token_accept_legacy` esté activo; para ellos la expiración solo
+se conoce consultando la fila.
 """
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import hmac
+import math
+import os
+import re
 import secrets
 import logging
+import time
+
+from app.config import settings
+from app.services.storage import TokenConflictError
 
 logger = logging.getLogger(__name__)
 
+SIGNED_TOKEN_RANDOM_BYTES = 32
+INSTANCE_TAG_BYTES = 6
+INSTANCE_TAG_CHARS = 8
+SIGNED_TOKEN_MAC_BYTES = 16
+SIGNED_TOKEN_RE = re.compile(r"([A-Za-z0-9_-]{43})\.([0-9a-f]{1,12})\.([A-Za-z0-9_-]{22})")
+LEGACY_TOKEN_RE = re.compile(r"[A-Za-z0-9_-]{64}")
+
+# Resultado de check_token
+TOKEN_VALID = "valid"
+TOKEN_LEGACY = "legacy"
+TOKEN_EXPIRED = "expired"
+TOKEN_INVALID = "invalid"
+
+
+def derive_token_key(encryption_key: str) -> bytes:
+    """
+    Deriva la clave del MAC de los tokens a partir de ENCRYPTION_KEY
+
+    Args:
+        encryption_key: Clave Fernet en base64
+        
+    Returns:
+        Clave HMAC de 32 bytes
+    """
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"autopus-secret-api/token-mac-v1"
+    ).derive(base64.urlsafe_b64decode(encryption_key))
+
+
+# Plantillas HMAC: la clave actual primero, después las anteriores
+_mac_templates = [
+    hmac.new(derive_token_key(key), digestmod=hashlib.sha256)
+    for key in [settings.encryption_key] + settings.encryption_keys_previous_list
+]
+
+# Tokens rechazados sin consultar el almacenamiento (por motivo)
+token_rejections = {TOKEN_INVALID: 0, TOKEN_EXPIRED: 0}
+
+# (pid, etiqueta) del proceso actual; se regenera tras un fork
+_instance: Tuple[int, bytes] = (0, b"")
+
+
+def instance_tag() -> bytes:
+    """
+    Etiqueta aleatoria del proceso actual para los tokens que crea
+    """
+    global _instance
+    if _instance[0] != os.getpid():
+        _instance = (os.getpid(), secrets.token_bytes(INSTANCE_TAG_BYTES))
+    return _instance[1]
+
+
+def created_by_this_process(token: str) -> bool:
+    """
+    Indica si el token firmado lleva la etiqueta del proceso actual
+    """
+    return token[:INSTANCE_TAG_CHARS] == base64.urlsafe_b64encode(instance_tag()).decode()
+
+
+def _mac(template: "hmac.HMAC", payload: bytes) -> str:
+    mac = template.copy()
+    mac.update(payload)
+    return base64.urlsafe_b64encode(mac.digest()[:SIGNED_TOKEN_MAC_BYTES]).rstrip(b"=").decode()
+
+
+def generate_signed_token(expires_at: datetime) -> str:
+    """
+    Genera un token con la expiración y el MAC incluidos
+    
+    Args:
+        expires_at: Expiración del secreto (datetime con zona horaria)
+        
+    Returns:
+        Token URL-safe "aleatorio.expiración.mac" (75 caracteres aprox.)
+    """
+    random_bytes = instance_tag() + secrets.token_bytes(SIGNED_TOKEN_RANDOM_BYTES - INSTANCE_TAG_BYTES)
+    random_part = base64.urlsafe_b64encode(random_bytes).rstrip(b"=").decode()
+    payload = f"{random_part}.{math.ceil(expires_at.timestamp()):x}"
+    return f"{payload}.{_mac(_mac_templates[0], payload.encode())}"
+
+
+def check_token(token: str, now: Optional[float] = None) -> str:
+    """
+    Valida un token sin consultar el almacenamiento
+    
+    Args:
+        token: Token recibido
+        now: Momento de la comprobación (epoch; por defecto, ahora)
+        
+    Returns:
+        TOKEN_VALID (firma correcta y sin expirar), TOKEN_LEGACY (formato
+        anterior, solo se puede validar en el almacenamiento), TOKEN_EXPIRED
+        o TOKEN_INVALID (malformado o falsificado)
+    """
+    match = SIGNED_TOKEN_RE.fullmatch(token)
+    if match is None:
+        if settings.token_accept_legacy and LEGACY_TOKEN_RE.fullmatch(token):
+            return TOKEN_LEGACY
+        token_rejections[TOKEN_INVALID] += 1
+        return TOKEN_INVALID
+    
+    random_part, expiry, mac = match.groups()
+    payload = f"{random_part}.{expiry}".encode()
+    if not any(hmac.compare_digest(_mac(template, payload), mac) for template in _mac_templates):
+        token_rejections[TOKEN_INVALID] += 1
+        return TOKEN_INVALID
+    
+    if int(expiry, 16) <= (time.time() if now is None else now):
+        token_rejections[TOKEN_EXPIRED] += 1
+        return TOKEN_EXPIRED
+    
+    return TOKEN_VALID
+
+
+def signed_token_expiry(token: str) -> Optional[int]:
+    """
+    Expiración (epoch) incluida en un token firmado
+
+    No comprueba el MAC: usar solo con tokens que ya pasaron `check_token`.
+
+    Returns:
+        Epoch de expiración, o None si el token no tiene el formato firmado
+    """
+    match = SIGNED_TOKEN_RE.fullmatch(token)
+    return int(match.group(2), 16) if match else None
+
 
 def generate_token(length: int = 48) -> str:
     """
-    Genera un token único y seguro usando secrets
+    Genera un token aleatorio sin firma (formato anterior)
     
     Args:
         length: Longitud del token en bytes (default: 48)
@@ -26,32 +188,98 @@ def generate_token(length: int = 48) -> str:
         raise
 
 
-async def generate_unique_token(db_service, max_attempts: int = 5) -> str:
+# Número de colisiones de token detectadas por la restricción UNIQUE.
+# Con 48 bytes aleatorios debería permanecer en 0; se expone para vigilarlo.
+token_conflicts = 0
+
+
+def get_token_conflict_count() -> int:
+    """
+    Retorna cuántas colisiones de token se han detectado en este proceso
+    """
+    return token_conflicts
+
+
+def get_token_rejection_counts() -> Dict[str, int]:
+    """
+    Retorna cuántos tokens se han rechazado sin consultar el almacenamiento
+    """
+    return dict(token_rejections)
+
+
+async def create_with_unique_token(db_service, max_attempts: int = 5, **fields) -> Tuple[str, Dict[str, Any]]:
     """
-    Genera un token único verificando que no exista en la base de datos
+    Inserta un secreto con un token nuevo confiando en la restricción UNIQUE
+    
+    No consulta si el token existe antes de insertar: la colisión es
+    prácticamente imposible, así que el camino normal hace una única llamada
+    al almacenamiento y solo se reintenta si la base de datos la rechaza.
     
     Args:
-        db_service: Instancia del servicio de base de datos
-        max_attempts: Máximo de intentos para generar un token único
+        db_service: Instancia del backend de almacenamiento
+        max_attempts: Máximo de intentos de inserción
+        **fields: Resto de argumentos de `create_secret` (incluida `expires_at`,
+            que se firma en el token)
         
     Returns:
-        Token único verificado
+        Tupla (token, fila creada)
         
     Raises:
-        RuntimeError: Si no se puede generar un token único después de max_attempts
+        RuntimeError: Si no se puede insertar un token único después de max_attempts
     """
+    global token_conflicts
+    
     for attempt in range(max_attempts):
-        token = generate_token()
+        token = generate_signed_token(fields["expires_at"])
         
-        # Verificar si el token ya existe
-        existing = await db_service.get_secret_by_token(token)
+        try:
+            result = await db_service.create_secret(token=token, **fields)
+            return token, result
+        except TokenConflictError:
+            token_conflicts += 1
+            logger.warning(f"⚠️ Token duplicado rechazado por la base de datos en intento {attempt + 1}")
+    
+    # Si después de max_attempts no se pudo insertar
+    logger.error(f"❌ No se pudo generar token único después de {max_attempts} intentos")
+    raise RuntimeError("No se pudo generar un token único")
+
+
+async def create_many_with_unique_tokens(
+    db_service,
+    secrets: List[Dict[str, Any]],
+    max_attempts: int = 5
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Inserta varios secretos con tokens nuevos en un único INSERT en bloque
+    
+    Igual que `create_with_unique_token`, no consulta antes: si la base de
+    datos rechaza el lote por un token duplicado se regeneran todos los
+    tokens y se reintenta.
+    
+    Args:
+        db_service: Instancia del backend de almacenamiento
+        secrets: Argumentos de `create_secret` (sin token) de cada secreto
+        max_attempts: Máximo de intentos de inserción
+        
+    Returns:
+        Tupla (tokens, filas creadas) en el mismo orden que `secrets`
         
-        if not existing:
-            logger.info(f"✅ Token único generado en intento {attempt + 1}")
-            return token
+    Raises:
+        RuntimeError: Si no se puede insertar el lote después de max_attempts
+    """
+    global token_conflicts
+    
+    for attempt in range(max_attempts):
+        tokens = [generate_signed_token(fields["expires_at"]) for fields in secrets]
         
-        logger.warning(f"⚠️ Token duplicado encontrado en intento {attempt + 1}")
+        try:
+            rows = await db_service.create_secrets_bulk([
+                {"token": token, **fields} for token, fields in zip(tokens, secrets)
+            ])
+            return tokens, rows
+        except TokenConflictError:
+            token_conflicts += 1
+            logger.warning(f"⚠️ Lote rechazado por token duplicado en intento {attempt + 1}")
     
-    # Si después de max_attempts no se generó un token único
-    logger.error(f"❌ No se pudo generar token único después de {max_attempts} intentos")
+    logger.error(f"❌ No se pudo insertar el lote después de {max_attempts} intentos")
     raise RuntimeError("No se pudo generar un token único")
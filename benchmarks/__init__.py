@@ -0,0 +1,6 @@
+"""
+Benchmarks de rendimiento (no forman parte de la aplicación)
+
+Ejecutar desde la raíz del repositorio, por ejemplo:
+    python -m benchmarks.bench_storage_concurrency
+"""
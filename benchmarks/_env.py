@@ -0,0 +1,14 @@
+"""
+Configuración mínima de entorno para ejecutar benchmarks sin un .env real
+
+Debe importarse antes que cualquier módulo de `app`, ya que `app.config`
+instancia `Settings` en tiempo de importación.
+"""
+import os
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "bench.bench.bench")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("API_KEY_ADMIN", "bench-admin-key")
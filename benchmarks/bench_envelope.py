@@ -0,0 +1,73 @@
+"""
+Benchmark: formato de contenido cifrado (Fernet en texto vs sobre AES-GCM)
+
+Compara, para varios tamaños de secreto:
+- bytes: lo que ocupa `encrypted_content` en almacenamiento
+- enc/dec: operaciones de cifrado y descifrado por segundo
+
+El camino "fernet" reproduce el formato anterior (token Fernet en base64
+guardado como texto); "envelope" es el sobre binario actual.
+
+Uso:
+    python -m benchmarks.bench_envelope [--iterations 2000]
+"""
+import argparse
+import os
+import time
+
+import benchmarks._env  # noqa: F401  (debe ir antes de importar app)
+
+from cryptography.fernet import Fernet
+
+from app.config import settings
+from app.services.encryption import encryption_service
+
+SIZES = (32, 256, 1024, 10 * 1024)
+
+
+def fernet_encrypt(fernet: Fernet, text: str) -> str:
+    return fernet.encrypt(text.encode()).decode()
+
+
+def fernet_decrypt(fernet: Fernet, token: str) -> str:
+    return fernet.decrypt(token.encode()).decode()
+
+
+def ops_per_second(fn, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return iterations / (time.perf_counter() - start)
+
+
+def main(iterations: int):
+    fernet = Fernet(settings.encryption_key.encode())
+
+    print(f"{'tamaño':>8} | {'formato':>8} | {'bytes':>7} | {'overhead':>8} | {'enc/s':>9} | {'dec/s':>9}")
+    print("-" * 66)
+    for size in SIZES:
+        # Texto ASCII del tamaño pedido (como un secreto típico)
+        text = os.urandom(size).hex()[:size]
+
+        token = fernet_encrypt(fernet, text)
+        envelope = encryption_service.encrypt(text)
+        assert encryption_service.decrypt(token) == text
+        assert encryption_service.decrypt(envelope) == text
+
+        paths = (
+            ("fernet", len(token.encode()),
+             lambda t: fernet_encrypt(fernet, t), lambda c: fernet_decrypt(fernet, c), token),
+            ("envelope", len(envelope),
+             encryption_service.encrypt, encryption_service.decrypt, envelope),
+        )
+        for name, stored, encrypt, decrypt, sample in paths:
+            enc = ops_per_second(encrypt, text, iterations)
+            dec = ops_per_second(decrypt, sample, iterations)
+            print(f"{size:>8} | {name:>8} | {stored:>7} | {stored - size:>8} | {enc:>9.0f} | {dec:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.iterations)
@@ -0,0 +1,159 @@
+"""
+Benchmark: throughput de los middlewares de seguridad
+
+Compara RateLimitMiddleware + SecurityHeadersMiddleware en su versión
+anterior (`BaseHTTPMiddleware`, CSP reconstruida en cada petición) con la
+versión ASGI pura, sobre la misma app con las rutas reales:
+
+- GET /health (excluida del rate limiting)
+- GET /api/secret/{token} (token inexistente, backend en memoria)
+
+Las peticiones se envían directamente a la app ASGI, sin red, para medir
+solo el coste de la pila de middlewares y la ruta.
+
+Uso:
+    python -m benchmarks.bench_middleware [--requests 5000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import benchmarks._env  # noqa: F401  (debe ir antes de importar app)
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.security import RateLimitMiddleware, SecurityHeadersMiddleware
+from app.routers import secrets
+from app.services.rate_limiter import SlidingWindowRateLimiter
+
+
+class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+    """
+    Versión anterior de RateLimitMiddleware
+    """
+
+    def __init__(self, app, limiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request: Request, call_next):
+        client_ip = request.client.host if request.client else "unknown"
+        if request.url.path in ["/docs", "/redoc", "/openapi.json", "/", "/health"]:
+            return await call_next(request)
+
+        allowed, remaining, retry_after = self.limiter.hit(client_ip)
+        if not allowed:
+            return JSONResponse(status_code=429, content={"detail": "rate limit"})
+
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(self.limiter.limit)
+        response.headers["X-RateLimit-Remaining"] = str(remaining)
+        return response
+
+
+class BaseHTTPSecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """
+    Versión anterior de SecurityHeadersMiddleware
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        csp_directives = [
+            "default-src 'self'",
+            "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net",
+            "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net",
+            "img-src 'self' data: https://fastapi.tiangolo.com",
+            "font-src 'self' https://cdn.jsdelivr.net",
+            "connect-src 'self'"
+        ]
+        response.headers["Content-Security-Policy"] = "; ".join(csp_directives)
+        return response
+
+
+def build_app(rate_limit_cls, security_headers_cls) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    app.include_router(secrets.router, prefix="/api")
+    app.add_middleware(security_headers_cls)
+    # Límite inalcanzable: se mide el coste, no los rechazos
+    app.add_middleware(rate_limit_cls, limiter=SlidingWindowRateLimiter(limit=10**9))
+    return app
+
+
+async def call(app, path: str) -> int:
+    """
+    Envía un GET directamente a la app ASGI y devuelve el estado
+    """
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("10.0.0.1", 50000),
+        "server": ("bench", 80)
+    }
+    await app(scope, receive, send)
+    return status
+
+
+async def throughput(app, path: str, requests: int) -> float:
+    for _ in range(100):
+        await call(app, path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call(app, path)
+    return requests / (time.perf_counter() - start)
+
+
+async def main(requests: int):
+    # Los 404 registran un warning por petición
+    logging.disable(logging.WARNING)
+    apps = {
+        "BaseHTTPMiddleware": build_app(BaseHTTPRateLimitMiddleware, BaseHTTPSecurityHeadersMiddleware),
+        "ASGI puro": build_app(RateLimitMiddleware, SecurityHeadersMiddleware)
+    }
+    paths = ("/health", "/api/secret/" + "x" * 43)
+
+    print(f"{'middlewares':<20} | {'/health (req/s)':>16} | {'/api/secret (req/s)':>20}")
+    print("-" * 62)
+    for name, app in apps.items():
+        results = [await throughput(app, path, requests) for path in paths]
+        print(f"{name:<20} | {results[0]:>16.0f} | {results[1]:>20.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
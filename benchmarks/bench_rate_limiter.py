@@ -0,0 +1,142 @@
+"""
+Benchmark: coste por petición del rate limiter
+
+Compara la contabilidad del rate limiter anterior (lista de `datetime` con
+zona horaria por IP, reconstruida en cada petición) con
+`SlidingWindowRateLimiter` (contadores O(1) sobre `time.monotonic()`):
+
+- cliente intenso: una IP cerca del límite por minuto
+- barrido: muchas IPs distintas con una petición cada una (memoria)
+
+También mide `SyncedRateLimiter` sobre la tabla en memoria compartida
+(incluye las sincronizaciones por lotes en segundo plano).
+
+Uso:
+    python -m benchmarks.bench_rate_limiter [--requests 200000] [--limit 60]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import timedelta
+
+import benchmarks._env  # noqa: F401  (debe ir antes de importar app)
+
+from app.services.rate_limit_store import SharedMemoryRateLimitStore
+from app.services.rate_limiter import SlidingWindowRateLimiter, SyncedRateLimiter
+from app.utils.datetime_utils import now_spain
+
+
+class ListRateLimiter:
+    """
+    Reproduce la contabilidad anterior de RateLimitMiddleware.dispatch
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.request_counts = defaultdict(list)
+
+    def hit(self, ip: str) -> bool:
+        now = now_spain()
+        cutoff = now - timedelta(minutes=1)
+        self.request_counts[ip] = [t for t in self.request_counts[ip] if t > cutoff]
+        if len(self.request_counts[ip]) >= self.limit:
+            return False
+        self.request_counts[ip].append(now)
+        return True
+
+
+def per_request_ns(limiter, keys, requests: int) -> float:
+    count = len(keys)
+    start = time.perf_counter_ns()
+    for i in range(requests):
+        limiter.hit(keys[i % count])
+    return (time.perf_counter_ns() - start) / requests
+
+
+def busy_ns(limiter, limit: int, requests: int) -> float:
+    """
+    Una sola IP en régimen estable, con `limit - 1` peticiones en el último
+    minuto (la lista del limitador anterior se mantiene a ese tamaño)
+    """
+    ip = "10.0.0.1"
+    for _ in range(limit - 1):
+        limiter.hit(ip)
+    limiter.limit = limit + 1
+
+    history = getattr(limiter, "request_counts", None)
+    start = time.perf_counter_ns()
+    for _ in range(requests):
+        limiter.hit(ip)
+        if history is not None:
+            del history[ip][0]
+        else:
+            limiter._entries[ip][1] -= 1
+    return (time.perf_counter_ns() - start) / requests
+
+
+def synced_ns(keys, limit: int, requests: int) -> float:
+    """
+    Coste por petición con la tabla compartida, cediendo el event loop cada
+    100 peticiones para que corran las sincronizaciones
+    """
+    async def run() -> float:
+        path = os.path.join(tempfile.mkdtemp(), "ratelimit.shm")
+        limiter = SyncedRateLimiter(SharedMemoryRateLimitStore(path), limit=limit, max_keys=len(keys))
+        count = len(keys)
+        start = time.perf_counter_ns()
+        for i in range(requests):
+            limiter.hit(keys[i % count])
+            if i % 100 == 99:
+                await asyncio.sleep(0)
+        await limiter.close()
+        elapsed = time.perf_counter_ns() - start
+        os.remove(path)
+        return elapsed / requests
+
+    return asyncio.run(run())
+
+
+def memory_kb(limiter, keys) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for key in keys:
+        limiter.hit(key)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / 1024
+
+
+def main(requests: int, limit: int, ips: int):
+    scan = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(ips)]
+
+    print(f"{'escenario':<26} | {'anterior':>12} | {'ventana O(1)':>12}")
+    print("-" * 58)
+
+    print(f"{'cliente intenso (ns/op)':<26} | "
+          f"{busy_ns(ListRateLimiter(limit), limit, requests // 10):>12.0f} | "
+          f"{busy_ns(SlidingWindowRateLimiter(limit), limit, requests):>12.0f}")
+
+    print(f"{'muchas IPs (ns/op)':<26} | "
+          f"{per_request_ns(ListRateLimiter(limit), scan, requests // 10):>12.0f} | "
+          f"{per_request_ns(SlidingWindowRateLimiter(limit, max_keys=ips), scan, requests):>12.0f}")
+
+    print(f"{'muchas IPs, shm (ns/op)':<26} | {'-':>12} | {synced_ns(scan, limit, requests):>12.0f}")
+
+    bounded = SlidingWindowRateLimiter(limit, max_keys=ips // 10)
+    print(f"{f'memoria {ips} IPs (KB)':<26} | "
+          f"{memory_kb(ListRateLimiter(limit), scan):>12.0f} | "
+          f"{memory_kb(SlidingWindowRateLimiter(limit, max_keys=ips), scan):>12.0f}")
+    print(f"{f'memoria LRU {ips // 10} claves (KB)':<26} | {'-':>12} | {memory_kb(bounded, scan):>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=60)
+    parser.add_argument("--ips", type=int, default=50000)
+    args = parser.parse_args()
+    main(args.requests, args.limit, args.ips)
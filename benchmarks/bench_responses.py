@@ -0,0 +1,134 @@
+"""
+Benchmark: serialización de respuestas en crear y leer secretos
+
+Compara el camino anterior (el handler devuelve el modelo, FastAPI lo
+vuelve a validar contra `response_model`, lo pasa por `jsonable_encoder` y
+lo serializa con `json`) con el actual (`_respond`: modelo validado una
+vez y serializado con orjson), sobre las rutas reales:
+
+- POST /api/secret (crear)
+- GET /api/secret/{token} (leer; los tokens se crean antes de medir)
+
+Las peticiones se envían directamente a la app ASGI, sin red ni
+middlewares, con el backend en memoria.
+
+Uso:
+    python -m benchmarks.bench_responses [--requests 3000]
+"""
+from contextlib import contextmanager
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import benchmarks._env  # noqa: F401  (debe ir antes de importar app)
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.routers import secrets
+
+CREATE_BODY = json.dumps({"content": "contraseña de prueba " * 4, "ttl_minutes": 60}).encode()
+
+
+@contextmanager
+def previous_response_path():
+    """
+    Los handlers devuelven el modelo sin envolver, como antes
+    """
+    respond = secrets._respond
+    secrets._respond = lambda model, status_code=200: model
+    try:
+        yield
+    finally:
+        secrets._respond = respond
+
+
+def build_app(response_class) -> FastAPI:
+    app = FastAPI(default_response_class=response_class)
+    app.include_router(secrets.router, prefix="/api")
+    return app
+
+
+async def call(app, method: str, path: str, body: bytes = b"") -> bytes:
+    """
+    Envía una petición directamente a la app ASGI y devuelve el cuerpo
+    """
+    chunks = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    headers = [(b"host", b"bench")]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("10.0.0.1", 50000),
+        "server": ("bench", 80)
+    }
+    await app(scope, receive, send)
+    return b"".join(chunks)
+
+
+async def throughput(app, requests: int):
+    """
+    Peticiones por segundo al crear y al leer
+    """
+    start = time.perf_counter()
+    tokens = [json.loads(await call(app, "POST", "/api/secret", CREATE_BODY))["token"] for _ in range(requests)]
+    create_rps = requests / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for token in tokens:
+        await call(app, "GET", f"/api/secret/{token}")
+    read_rps = requests / (time.perf_counter() - start)
+
+    return create_rps, read_rps
+
+
+async def main(requests: int):
+    # Los handlers registran un log por petición
+    logging.disable(logging.WARNING)
+
+    before = build_app(JSONResponse)
+    after = build_app(ORJSONResponse)
+
+    # Calentamiento
+    with previous_response_path():
+        await throughput(before, 100)
+    await throughput(after, 100)
+
+    with previous_response_path():
+        results = {"antes (response_model + json)": await throughput(before, requests)}
+    results["después (_respond + orjson)"] = await throughput(after, requests)
+
+    print(f"{'camino de respuesta':<30} | {'crear (req/s)':>14} | {'leer (req/s)':>13}")
+    print("-" * 63)
+    for name, (create_rps, read_rps) in results.items():
+        print(f"{name:<30} | {create_rps:>14.0f} | {read_rps:>13.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
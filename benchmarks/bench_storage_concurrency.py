@@ -0,0 +1,167 @@
+"""
+Benchmark: throughput de create/read concurrentes contra PostgREST
+
+Levanta un PostgREST simulado (latencia fija por petición) y compara:
+- sync:  el cliente síncrono de Supabase llamado dentro de corrutinas
+         (comportamiento anterior: cada `.execute()` bloquea el event loop)
+- async: `DatabaseService` con cliente asíncrono y pool keep-alive
+
+Con el cliente síncrono el throughput se mantiene plano al subir la
+concurrencia; con el asíncrono escala hasta el tamaño del pool.
+
+Uso:
+    python -m benchmarks.bench_storage_concurrency [--latency-ms 20] [--requests 200]
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+import benchmarks._env  # noqa: F401  (debe ir antes de importar app)
+
+import uvicorn
+from supabase import create_client
+
+from app.config import settings
+from app.services.database import DatabaseService
+from app.utils.datetime_utils import now_spain, spain_to_utc
+from app.utils.token_generator import generate_token
+
+
+def build_fake_postgrest(latency: float):
+    """
+    App ASGI mínima que imita los endpoints de PostgREST usados por la API
+    """
+    rows = {}
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        more = True
+        while more:
+            message = await receive()
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+
+        # Latencia de red + base de datos simulada
+        await asyncio.sleep(latency)
+
+        status = 200
+        payload = []
+        if scope["method"] == "POST":
+            row = json.loads(body)
+            row.setdefault("is_destroyed", False)
+            row.setdefault("created_at", spain_to_utc(now_spain()).isoformat())
+            rows[row["token"]] = row
+            status, payload = 201, [row]
+        elif scope["method"] == "GET":
+            query = parse_qs(scope["query_string"].decode())
+            token = query.get("token", ["eq."])[0][3:]
+            payload = [rows[token]] if token in rows else []
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+    return app
+
+
+def start_server(app) -> str:
+    """
+    Arranca uvicorn en un hilo aparte y devuelve la URL base
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+class SyncBaseline:
+    """
+    Reproduce el comportamiento anterior: cliente síncrono dentro de `async def`
+    """
+
+    def __init__(self, url: str):
+        self.client = create_client(url, settings.supabase_key)
+
+    async def create_secret(self, token, encrypted_content, expires_at):
+        data = {
+            "token": token,
+            "encrypted_content": "\\x" + encrypted_content.hex(),
+            "expires_at": spain_to_utc(expires_at).isoformat(),
+        }
+        return self.client.table("secrets").insert(data).execute().data[0]
+
+    async def get_secret_by_token(self, token):
+        result = self.client.table("secrets").select("*").eq("token", token).execute()
+        return result.data[0] if result.data else None
+
+
+async def run_level(service, concurrency: int, total: int) -> float:
+    """
+    Ejecuta `total` ciclos create+read con `concurrency` workers
+
+    Returns:
+        Operaciones por segundo (cada ciclo cuenta como 2 operaciones)
+    """
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+    expires_at = now_spain() + timedelta(minutes=60)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            token = generate_token()
+            await service.create_secret(
+                token=token,
+                encrypted_content=b"x" * 256,
+                expires_at=expires_at
+            )
+            await service.get_secret_by_token(token)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return (total * 2) / (time.perf_counter() - start)
+
+
+async def main(latency_ms: float, total: int, levels):
+    url = start_server(build_fake_postgrest(latency_ms / 1000))
+    settings.supabase_url = url
+
+    sync_service = SyncBaseline(url)
+    async_service = DatabaseService()
+    await async_service.connect()
+
+    print(f"PostgREST simulado en {url} | latencia {latency_ms} ms | {total} ciclos por nivel")
+    print(f"{'concurrencia':>12} {'sync ops/s':>12} {'async ops/s':>12} {'speedup':>8}")
+    for level in levels:
+        sync_ops = await run_level(sync_service, level, total)
+        async_ops = await run_level(async_service, level, total)
+        print(f"{level:>12} {sync_ops:>12.1f} {async_ops:>12.1f} {async_ops / sync_ops:>7.1f}x")
+
+    await async_service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 32])
+    args = parser.parse_args()
+    asyncio.run(main(args.latency_ms, args.requests, args.levels))
@@ -0,0 +1,15 @@
+-- ==================================================
+-- Restricción UNIQUE sobre secrets.token
+-- ==================================================
+-- La creación de secretos inserta directamente con un token aleatorio y
+-- confía en esta restricción para detectar colisiones (código 23505),
+-- en lugar de consultar antes si el token existe.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'secrets_token_key'
+    ) THEN
+        ALTER TABLE public.secrets ADD CONSTRAINT secrets_token_key UNIQUE (token);
+    END IF;
+END $$;
@@ -0,0 +1,9 @@
+-- ==================================================
+-- Tipo de secreto: texto o archivo
+-- ==================================================
+-- Los secretos de tipo "file" guardan en encrypted_content solo la
+-- referencia al blob cifrado y su clave de datos. La lectura atómica filtra
+-- por tipo para que un endpoint nunca consuma un secreto del otro tipo.
+
+ALTER TABLE public.secrets
+    ADD COLUMN IF NOT EXISTS kind text NOT NULL DEFAULT 'text';
@@ -0,0 +1,18 @@
+-- ==================================================
+-- Contenido cifrado como bytes (bytea)
+-- ==================================================
+-- Los secretos nuevos se guardan como sobre binario AES-256-GCM en lugar
+-- de un token Fernet en base64. Los tokens Fernet existentes se convierten
+-- a sus bytes ASCII y se siguen descifrando (se reconocen por su prefijo).
+
+DO $$
+BEGIN
+    IF (
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'secrets' AND column_name = 'encrypted_content'
+    ) <> 'bytea' THEN
+        ALTER TABLE public.secrets
+            ALTER COLUMN encrypted_content TYPE bytea
+            USING convert_to(encrypted_content, 'UTF8');
+    END IF;
+END $$;
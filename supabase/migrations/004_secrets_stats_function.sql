@@ -0,0 +1,26 @@
+-- ==================================================
+-- Estadísticas agregadas en una sola consulta
+-- ==================================================
+-- GET /api/stats llama a esta función vía RPC de PostgREST: un único
+-- recorrido de la tabla calcula los cinco contadores sin transferir filas
+-- (antes eran cinco consultas select(*) con count=exact).
+
+CREATE OR REPLACE FUNCTION public.secrets_stats()
+RETURNS TABLE (
+    total bigint,
+    active bigint,
+    accessed bigint,
+    expired bigint,
+    protected bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        count(*),
+        count(*) FILTER (WHERE NOT is_destroyed AND expires_at >= now()),
+        count(*) FILTER (WHERE is_destroyed AND accessed_at IS NOT NULL),
+        count(*) FILTER (WHERE expires_at < now()),
+        count(*) FILTER (WHERE passphrase_hash IS NOT NULL)
+    FROM public.secrets;
+$$;
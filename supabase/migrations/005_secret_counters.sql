@@ -0,0 +1,27 @@
+-- ==================================================
+-- Contadores globales de eventos del ciclo de vida
+-- ==================================================
+-- Cada worker acumula sus eventos en memoria y los suma aquí
+-- periódicamente con increment_secret_counters(), que devuelve los totales
+-- de todos los workers en la misma llamada.
+
+CREATE TABLE IF NOT EXISTS public.secret_counters (
+    event text PRIMARY KEY,
+    value bigint NOT NULL DEFAULT 0,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION public.increment_secret_counters(deltas jsonb)
+RETURNS TABLE (event text, value bigint)
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+BEGIN
+    INSERT INTO public.secret_counters AS c (event, value)
+    SELECT d.key, d.value::bigint FROM jsonb_each_text(deltas) AS d
+    ON CONFLICT ON CONSTRAINT secret_counters_pkey
+    DO UPDATE SET value = c.value + EXCLUDED.value, updated_at = now();
+
+    RETURN QUERY SELECT c.event, c.value FROM public.secret_counters AS c;
+END;
+$$;
@@ -0,0 +1,42 @@
+-- ==================================================
+-- Contadores del rate limiter compartidos entre réplicas
+-- ==================================================
+-- Con RATE_LIMIT_BACKEND=storage cada worker suma sus peticiones por lotes
+-- con increment_rate_limits(), que devuelve en la misma llamada los
+-- contadores globales de la ventana actual y la anterior. Las claves son
+-- hashes de la IP. La tabla es UNLOGGED: se pierde en un crash de Postgres,
+-- lo que solo reinicia los límites.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS public.rate_limit_counters (
+    key text NOT NULL,
+    window_index bigint NOT NULL,
+    hits integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, window_index)
+);
+
+CREATE INDEX IF NOT EXISTS rate_limit_counters_window_idx
+    ON public.rate_limit_counters (window_index);
+
+CREATE OR REPLACE FUNCTION public.increment_rate_limits(p_window bigint, p_deltas jsonb)
+RETURNS TABLE (key text, current_hits integer, previous_hits integer)
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+BEGIN
+    -- Solo se consultan la ventana actual y la anterior
+    DELETE FROM public.rate_limit_counters AS r WHERE r.window_index < p_window - 1;
+
+    RETURN QUERY
+    WITH upserted AS (
+        INSERT INTO public.rate_limit_counters AS r (key, window_index, hits)
+        SELECT d.key, p_window, d.value::integer FROM jsonb_each_text(p_deltas) AS d
+        ON CONFLICT ON CONSTRAINT rate_limit_counters_pkey
+        DO UPDATE SET hits = r.hits + EXCLUDED.hits
+        RETURNING r.key, r.hits
+    )
+    SELECT u.key, u.hits, COALESCE(p.hits, 0)
+    FROM upserted AS u
+    LEFT JOIN public.rate_limit_counters AS p
+        ON p.key = u.key AND p.window_index = p_window - 1;
+END;
+$$;
@@ -0,0 +1,39 @@
+-- ==================================================
+-- Purga de secretos expirados por lotes
+-- ==================================================
+-- purge_expired_secrets() borra como mucho p_limit secretos expirados antes
+-- de p_cutoff, en orden de expiración y a partir del cursor p_after (la
+-- expiración del último secreto del lote anterior). Devuelve solo el número
+-- de filas borradas y el nuevo cursor: nunca transfiere el contenido
+-- cifrado. Cada lote es una transacción corta; las filas bloqueadas por
+-- otra transacción se saltan y se recogen en la siguiente pasada.
+
+CREATE INDEX IF NOT EXISTS secrets_expires_at_idx
+    ON public.secrets (expires_at);
+
+CREATE OR REPLACE FUNCTION public.purge_expired_secrets(
+    p_cutoff timestamptz,
+    p_after timestamptz,
+    p_limit integer
+)
+RETURNS TABLE (deleted integer, last_expires_at timestamptz)
+LANGUAGE sql
+VOLATILE
+AS $$
+    WITH batch AS (
+        SELECT s.id
+        FROM public.secrets AS s
+        WHERE s.expires_at < p_cutoff
+          AND (p_after IS NULL OR s.expires_at >= p_after)
+        ORDER BY s.expires_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    removed AS (
+        DELETE FROM public.secrets AS s
+        USING batch
+        WHERE s.id = batch.id
+        RETURNING s.expires_at
+    )
+    SELECT count(*)::integer, max(removed.expires_at) FROM removed;
+$$;
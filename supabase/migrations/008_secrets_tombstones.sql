@@ -0,0 +1,93 @@
+-- ==================================================
+-- Lápidas compactas y borrado definitivo de secretos destruidos
+-- ==================================================
+-- Al destruir un secreto (lectura, DELETE o expiración al acceder) su
+-- contenido cifrado se pone a NULL en la misma sentencia: la fila queda
+-- como lápida para responder 410 y registrar `destroyed_at`.
+-- compact_destroyed_secrets() borra por lotes las lápidas más antiguas que
+-- la ventana de gracia (COMPACTION_GRACE_MINUTES) y devuelve los bytes
+-- liberados.
+
+ALTER TABLE public.secrets ALTER COLUMN encrypted_content DROP NOT NULL;
+ALTER TABLE public.secrets ADD COLUMN IF NOT EXISTS destroyed_at timestamptz;
+
+-- Lápidas existentes: liberar el contenido y fechar su destrucción
+UPDATE public.secrets
+SET encrypted_content = NULL,
+    destroyed_at = COALESCE(accessed_at, now())
+WHERE is_destroyed AND destroyed_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS secrets_destroyed_at_idx
+    ON public.secrets (destroyed_at)
+    WHERE is_destroyed;
+
+-- Reclamar un secreto vivo y devolver la fila con el contenido anterior,
+-- dejando la lápida sin contenido. FOR UPDATE serializa a los lectores
+-- concurrentes: el segundo vuelve a evaluar la condición y no encuentra fila.
+CREATE OR REPLACE FUNCTION public.consume_secret(
+    p_token text,
+    p_kind text,
+    p_allow_protected boolean
+)
+RETURNS SETOF public.secrets
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+DECLARE
+    claimed public.secrets;
+BEGIN
+    SELECT * INTO claimed
+    FROM public.secrets AS s
+    WHERE s.token = p_token
+      AND s.kind = p_kind
+      AND NOT s.is_destroyed
+      AND s.expires_at > now()
+      AND (p_allow_protected OR s.passphrase_hash IS NULL)
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    UPDATE public.secrets AS s
+    SET accessed_at = now(),
+        destroyed_at = now(),
+        is_destroyed = true,
+        encrypted_content = NULL
+    WHERE s.id = claimed.id;
+
+    claimed.accessed_at := now();
+    claimed.destroyed_at := now();
+    claimed.is_destroyed := true;
+    RETURN NEXT claimed;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.compact_destroyed_secrets(
+    p_cutoff timestamptz,
+    p_after timestamptz,
+    p_limit integer
+)
+RETURNS TABLE (deleted integer, reclaimed_bytes bigint, last_destroyed_at timestamptz)
+LANGUAGE sql
+VOLATILE
+AS $$
+    WITH batch AS (
+        SELECT s.id
+        FROM public.secrets AS s
+        WHERE s.is_destroyed
+          AND s.destroyed_at < p_cutoff
+          AND (p_after IS NULL OR s.destroyed_at >= p_after)
+        ORDER BY s.destroyed_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    removed AS (
+        DELETE FROM public.secrets AS s
+        USING batch
+        WHERE s.id = batch.id
+        RETURNING pg_column_size(s.*) AS bytes, s.destroyed_at
+    )
+    SELECT count(*)::integer, COALESCE(sum(removed.bytes), 0)::bigint, max(removed.destroyed_at)
+    FROM removed;
+$$;
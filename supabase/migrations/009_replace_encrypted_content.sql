@@ -0,0 +1,28 @@
+-- ==================================================
+-- Sustitución condicional del contenido cifrado (rotación de claves)
+-- ==================================================
+-- replace_encrypted_content() vuelve a escribir el contenido de un secreto
+-- vivo solo si el SHA-256 de su contenido actual coincide con el esperado.
+-- Así la comparación viaja como un resumen de 32 bytes en el cuerpo de la
+-- petición en lugar del texto cifrado completo en la URL del UPDATE.
+
+CREATE OR REPLACE FUNCTION public.replace_encrypted_content(
+    p_token text,
+    p_expected_sha256 text,
+    p_content bytea
+)
+RETURNS boolean
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+BEGIN
+    UPDATE public.secrets AS s
+    SET encrypted_content = p_content
+    WHERE s.token = p_token
+      AND NOT s.is_destroyed
+      AND s.encrypted_content IS NOT NULL
+      AND sha256(s.encrypted_content) = decode(p_expected_sha256, 'hex');
+
+    RETURN FOUND;
+END;
+$$;
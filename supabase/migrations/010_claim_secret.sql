@@ -0,0 +1,49 @@
+-- ==================================================
+-- Reclamar un secreto y devolver el motivo del rechazo
+-- ==================================================
+-- claim_secret() hace lo mismo que consume_secret() (migración 008), pero
+-- si no puede reclamar el secreto devuelve la fila actual (sin contenido
+-- cifrado) para que la API distinga 404/409/410/401 sin una segunda
+-- consulta. Devuelve {"claimed": bool, "secret": fila o null}.
+
+CREATE OR REPLACE FUNCTION public.claim_secret(
+    p_token text,
+    p_kind text,
+    p_allow_protected boolean
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+DECLARE
+    current_row public.secrets;
+BEGIN
+    SELECT * INTO current_row
+    FROM public.secrets AS s
+    WHERE s.token = p_token
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('claimed', false, 'secret', NULL);
+    END IF;
+
+    IF current_row.is_destroyed
+       OR current_row.expires_at <= now()
+       OR current_row.kind <> p_kind
+       OR (NOT p_allow_protected AND current_row.passphrase_hash IS NOT NULL) THEN
+        RETURN jsonb_build_object('claimed', false, 'secret', to_jsonb(current_row) - 'encrypted_content');
+    END IF;
+
+    UPDATE public.secrets AS s
+    SET accessed_at = now(),
+        destroyed_at = now(),
+        is_destroyed = true,
+        encrypted_content = NULL
+    WHERE s.id = current_row.id;
+
+    current_row.accessed_at := now();
+    current_row.destroyed_at := now();
+    current_row.is_destroyed := true;
+    RETURN jsonb_build_object('claimed', true, 'secret', to_jsonb(current_row));
+END;
+$$;
@@ -0,0 +1,20 @@
+"""
+Entorno de los tests: backend en memoria y claves fijas
+
+Se configura antes de importar `app`, ya que `app.config` instancia
+`Settings` en tiempo de importación.
+"""
+import os
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test.test.test")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+# Clave anterior para probar tokens firmados antes de una rotación
+os.environ["ENCRYPTION_KEYS_PREVIOUS"] = Fernet.generate_key().decode()
+os.environ.setdefault("API_KEY_ADMIN", "test-admin-key")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["PASSPHRASE_KDF_CALIBRATE"] = "false"
+os.environ["PASSPHRASE_KDF_COST"] = "10"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100000"
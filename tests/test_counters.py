@@ -0,0 +1,141 @@
+"""
+Tests de los contadores de eventos (`app.services.counters`)
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import counters as counters_module
+from app.services.counters import EVENTS, LifecycleCounters
+
+
+class FakeStorage:
+    """
+    Contadores globales compartidos por varios workers
+    """
+
+    def __init__(self):
+        self.totals = dict.fromkeys(EVENTS, 0)
+        self.calls = []
+        self.fail = False
+
+    async def flush_counters(self, deltas):
+        self.calls.append(dict(deltas))
+        if self.fail:
+            raise ConnectionError("almacén caído")
+        for event, value in deltas.items():
+            self.totals[event] += value
+        return dict(self.totals)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(counters_module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_flush_sends_pending_and_receives_global_totals(clock):
+    storage = FakeStorage()
+    storage.totals["read"] = 5
+    counters = LifecycleCounters(storage)
+    counters.incr("created", 2)
+    counters.incr("read")
+
+    assert counters.snapshot()["totals"]["created"] == 2
+
+    await counters.flush()
+
+    assert storage.calls == [{"created": 2, "read": 1}]
+    totals = counters.snapshot()["totals"]
+    assert (totals["created"], totals["read"]) == (2, 6)
+    assert counters.snapshot()["last_flush_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_empty_flush_is_skipped_while_totals_are_fresh(clock):
+    storage = FakeStorage()
+    counters = LifecycleCounters(storage, refresh_seconds=60)
+    counters.incr("created")
+    await counters.flush()
+
+    clock.now += 30
+    await counters.flush()
+    assert len(storage.calls) == 1
+    assert counters.flushes_skipped == 1
+
+    # Con incrementos pendientes se vuelca aunque los totales sean recientes
+    counters.incr("read")
+    await counters.flush()
+    assert storage.calls[-1] == {"read": 1}
+
+    # Sin nada pendiente, se refrescan los totales cuando caducan
+    clock.now += 61
+    await counters.flush()
+    assert storage.calls[-1] == {}
+    assert len(storage.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_first_empty_flush_loads_totals(clock):
+    storage = FakeStorage()
+    storage.totals["created"] = 7
+    counters = LifecycleCounters(storage)
+
+    await counters.flush()
+
+    assert storage.calls == [{}]
+    assert counters.snapshot()["totals"]["created"] == 7
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_pending_increments(clock):
+    storage = FakeStorage()
+    counters = LifecycleCounters(storage)
+    counters.incr("destroyed", 3)
+    storage.fail = True
+
+    await counters.flush()
+
+    assert counters.flush_errors == 1
+    assert counters.snapshot()["totals"]["destroyed"] == 3
+
+    counters.incr("destroyed")
+    storage.fail = False
+    await counters.flush()
+
+    assert storage.calls[-1] == {"destroyed": 4}
+    assert storage.totals["destroyed"] == 4
+
+
+@pytest.mark.asyncio
+async def test_rates_per_minute_over_window(clock):
+    storage = FakeStorage()
+    counters = LifecycleCounters(storage, rate_window_seconds=300)
+    await counters.flush()
+
+    clock.now += 120
+    counters.incr("created", 10)
+    await counters.flush()
+
+    assert counters.snapshot()["rates_per_minute"]["created"] == 5.0
+
+    # Las muestras anteriores a la ventana se descartan salvo la última, que
+    # sirve de referencia: la tasa se mide desde el minuto 2 y no desde el 0
+    clock.now += 600
+    counters.incr("created", 30)
+    await counters.flush()
+    clock.now += 60
+    counters.incr("created", 6)
+    await counters.flush()
+
+    assert counters.snapshot()["rates_per_minute"]["created"] == round(36 / 11, 3)
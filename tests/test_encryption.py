@@ -0,0 +1,122 @@
+"""
+Tests del cifrado de secretos (`app.services.encryption`)
+"""
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import os
+
+import pytest
+
+from app.config import settings
+from app.services.encryption import (
+    ENVELOPE_V1,
+    ENVELOPE_VERSION,
+    KEY_ID_BYTES,
+    NONCE_BYTES,
+    EncryptionService,
+    derive_envelope_key,
+    envelope_key_id
+)
+
+PREVIOUS_KEY = settings.encryption_keys_previous_list[0]
+
+
+@pytest.fixture
+def service():
+    return EncryptionService()
+
+
+@pytest.fixture
+def previous_service(monkeypatch):
+    """Servicio de antes de la rotación: la clave anterior era la actual"""
+    monkeypatch.setattr(settings, "encryption_key", PREVIOUS_KEY)
+    monkeypatch.setattr(settings, "encryption_keys_previous", "")
+    return EncryptionService()
+
+
+def test_v2_round_trip(service):
+    encrypted = service.encrypt("contraseña")
+
+    assert encrypted[0] == ENVELOPE_VERSION
+    assert encrypted[1:1 + KEY_ID_BYTES] == service.current_key_id
+    assert len(encrypted) == 1 + KEY_ID_BYTES + NONCE_BYTES + len("contraseña".encode()) + 16
+    assert service.decrypt(encrypted) == "contraseña"
+    assert not service.needs_reencryption(encrypted)
+
+
+def test_each_encryption_uses_a_new_nonce(service):
+    assert service.encrypt("hola") != service.encrypt("hola")
+    assert service.encrypt_many(["a", "b"]) != service.encrypt_many(["a", "b"])
+
+
+def test_key_id_selects_previous_key(service, previous_service):
+    old = previous_service.encrypt("antiguo")
+    assert old[1:1 + KEY_ID_BYTES] == envelope_key_id(derive_envelope_key(PREVIOUS_KEY))
+
+    assert service.decrypt(old) == "antiguo"
+    assert service.previous_key_decryptions == 1
+    assert service.needs_reencryption(old)
+
+    rotated = service.reencrypt(old)
+    assert rotated[1:1 + KEY_ID_BYTES] == service.current_key_id
+    assert service.decrypt(rotated) == "antiguo"
+
+
+def test_unknown_key_id_is_rejected(service, previous_service):
+    with pytest.raises(ValueError):
+        previous_service.decrypt(service.encrypt("nuevo"))
+
+
+def test_v1_envelope_is_decrypted_with_any_configured_key(service):
+    for key in (settings.encryption_key, PREVIOUS_KEY):
+        nonce = os.urandom(NONCE_BYTES)
+        version = bytes([ENVELOPE_V1])
+        encrypted = version + nonce + AESGCM(derive_envelope_key(key)).encrypt(nonce, b"v1", version)
+
+        assert service.decrypt(encrypted) == "v1"
+        assert service.needs_reencryption(encrypted)
+
+
+def test_legacy_fernet_token_is_decrypted(service):
+    for key in (settings.encryption_key, PREVIOUS_KEY):
+        token = Fernet(key.encode()).encrypt(b"fernet")
+
+        assert service.decrypt(token) == "fernet"
+        assert service.decrypt(token.decode()) == "fernet"
+        assert service.needs_reencryption(token)
+
+
+@pytest.mark.parametrize("offset", [1 + KEY_ID_BYTES, 1 + KEY_ID_BYTES + NONCE_BYTES, -1])
+def test_tampered_envelope_is_rejected(service, offset):
+    encrypted = bytearray(service.encrypt("contraseña"))
+    encrypted[offset] ^= 0x01
+
+    with pytest.raises(InvalidTag):
+        service.decrypt(bytes(encrypted))
+
+
+def test_envelope_moved_to_other_key_is_rejected(service, previous_service):
+    # El id de clave va autenticado: cambiarlo no permite descifrar con otra clave
+    encrypted = service.encrypt("contraseña")
+    other = envelope_key_id(derive_envelope_key(PREVIOUS_KEY))
+
+    with pytest.raises(InvalidTag):
+        service.decrypt(encrypted[:1] + other + encrypted[1 + KEY_ID_BYTES:])
+
+
+def test_tampered_v1_envelope_is_rejected(service):
+    nonce = os.urandom(NONCE_BYTES)
+    version = bytes([ENVELOPE_V1])
+    encrypted = bytearray(
+        version + nonce + AESGCM(derive_envelope_key(settings.encryption_key)).encrypt(nonce, b"v1", version)
+    )
+    encrypted[-1] ^= 0x01
+
+    with pytest.raises(InvalidTag):
+        service.decrypt(bytes(encrypted))
+
+
+def test_unknown_format_is_rejected(service):
+    with pytest.raises(ValueError):
+        service.decrypt(b"\x07" + os.urandom(40))
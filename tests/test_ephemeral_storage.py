@@ -0,0 +1,143 @@
+"""
+Tests del nivel efímero en memoria (`app.services.ephemeral_storage`)
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.ephemeral_storage import EphemeralStorageService, TieredStorageService
+from app.services.memory_storage import InMemoryStorageService
+from app.services.metrics import metrics
+from app.utils.datetime_utils import now_spain
+
+CONTENT = b"x" * 500
+
+
+def _in(minutes: float) -> datetime:
+    return now_spain() + timedelta(minutes=minutes)
+
+
+def _cutoff(minutes: float = 0) -> str:
+    return (datetime.now(timezone.utc) + timedelta(minutes=minutes)).isoformat()
+
+
+def _leave_room_for_one_after_evicting(store: EphemeralStorageService, token: str) -> None:
+    """Ajusta el tope para que la próxima inserción quepa desalojando solo `token`"""
+    needed = len(CONTENT) + len("n-0") + store._row_overhead
+    store.max_bytes = store.bytes + needed - store._sizes[token]
+
+
+@pytest.mark.asyncio
+async def test_eviction_order_expired_then_tombstones_then_live():
+    store = EphemeralStorageService(max_bytes=10**9)
+    # El orden de inserción no importa: se desaloja por estado y expiración
+    await store.create_secret("live-late", CONTENT, _in(10))
+    await store.create_secret("live-soon", CONTENT, _in(5))
+    await store.create_secret("tombstone", CONTENT, _in(20))
+    await store.destroy_secrets(["tombstone"])
+    await store.create_secret("expired", CONTENT, _in(-1))
+
+    _leave_room_for_one_after_evicting(store, "expired")
+    await store.create_secret("n-1", CONTENT, _in(30))
+    assert "expired" not in store
+    assert {"tombstone", "live-soon", "live-late"} <= set(store._rows)
+    assert (store.evicted_inactive, store.evicted_live) == (1, 0)
+
+    _leave_room_for_one_after_evicting(store, "tombstone")
+    await store.create_secret("n-2", CONTENT, _in(30))
+    assert "tombstone" not in store
+    assert (store.evicted_inactive, store.evicted_live) == (2, 0)
+
+    # Solo quedan vivos: sale el que antes iba a expirar
+    _leave_room_for_one_after_evicting(store, "live-soon")
+    await store.create_secret("n-3", CONTENT, _in(30))
+    assert "live-soon" not in store
+    assert "live-late" in store
+    assert (store.evicted_inactive, store.evicted_live) == (2, 1)
+    assert await store.get_secret_by_token("live-soon") is None
+
+
+@pytest.mark.asyncio
+async def test_bytes_follow_inserts_destroys_and_purges():
+    store = EphemeralStorageService(max_bytes=10**9)
+    await store.create_secret("a", CONTENT, _in(-1))
+    await store.create_secret("b", CONTENT, _in(10))
+    full = store.bytes
+
+    await store.destroy_secrets(["b"])
+    # La lápida ya no guarda el contenido cifrado
+    assert store.bytes < full - len(CONTENT) // 2
+
+    await store.purge_expired_batch(_cutoff(), None, 100)
+    await store.compact_destroyed_batch(_cutoff(1), None, 100)
+    assert (store.bytes, len(store)) == (0, 0)
+
+
+@pytest.fixture
+def tiered(monkeypatch):
+    monkeypatch.setattr(metrics, "_gauge_callbacks", dict(metrics._gauge_callbacks))
+    monkeypatch.setattr(metrics, "_counter_callbacks", dict(metrics._counter_callbacks))
+    return TieredStorageService(
+        durable=InMemoryStorageService(),
+        ephemeral=EphemeralStorageService(max_bytes=64 * 1024),
+        max_ttl_minutes=15
+    )
+
+
+@pytest.mark.asyncio
+async def test_tier_is_chosen_by_ttl_and_size(tiered):
+    await tiered.create_secret("short", CONTENT, _in(10))
+    await tiered.create_secret("long", CONTENT, _in(60))
+    await tiered.create_secret("big", b"x" * (128 * 1024), _in(10))
+
+    assert "short" in tiered.ephemeral
+    assert "long" not in tiered.ephemeral and "big" not in tiered.ephemeral
+    assert (tiered.stored_ephemeral, tiered.stored_durable) == (1, 2)
+    for token in ("short", "long", "big"):
+        assert (await tiered.get_secret_by_token(token))["token"] == token
+
+
+@pytest.mark.asyncio
+async def test_tiered_purge_empties_ephemeral_tier_first(tiered):
+    for index in range(3):
+        await tiered.create_secret(f"e-{index}", CONTENT, _in(-1 - index))
+    # Secretos de TTL largo ya expirados en el nivel duradero
+    for index in range(2):
+        await tiered.durable.create_secret(f"d-{index}", CONTENT, _in(-30 - index))
+    assert all(f"e-{index}" in tiered.ephemeral for index in range(3))
+
+    # Un lote lleno del nivel efímero no toca el duradero ni avanza su cursor
+    assert await tiered.purge_expired_batch(_cutoff(), "cursor", 3) == (3, "cursor")
+    assert len(tiered.durable._rows) == 2
+
+    deleted, after = await tiered.purge_expired_batch(_cutoff(), "cursor", 3)
+    assert deleted == 2
+    assert after != "cursor"
+    assert len(tiered.durable._rows) == 0
+
+
+@pytest.mark.asyncio
+async def test_tiered_compaction_and_destroy_cover_both_tiers(tiered):
+    await tiered.create_secret("short", CONTENT, _in(10))
+    await tiered.create_secret("long", CONTENT, _in(60))
+
+    result = await tiered.destroy_secrets(["short", "long", "missing"])
+    assert result["destroyed"] == ["short", "long"]
+    assert result["not_found"] == ["missing"]
+
+    deleted, reclaimed, _ = await tiered.compact_destroyed_batch(_cutoff(1), None, 100)
+    assert deleted == 2
+    assert reclaimed > 0
+    assert await tiered.get_secret_by_token("short") is None
+    assert await tiered.get_secret_by_token("long") is None
+
+
+@pytest.mark.asyncio
+async def test_tiered_live_tokens_are_merged_in_order(tiered):
+    for token in ("b", "d", "f"):
+        await tiered.create_secret(token, CONTENT, _in(10))
+    for token in ("a", "c", "e"):
+        await tiered.create_secret(token, CONTENT, _in(60))
+
+    assert await tiered.get_live_tokens_page(None, 4) == ["a", "b", "c", "d"]
+    assert await tiered.get_live_tokens_page("d", 4) == ["e", "f"]
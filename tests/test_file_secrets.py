@@ -0,0 +1,105 @@
+"""
+Tests de los secretos de archivo (`app.routers.secrets`) y de su
+almacenamiento de blobs (`app.services.blob_store`)
+"""
+from cryptography.exceptions import InvalidTag
+import os
+import time
+
+from httpx import ASGITransport, AsyncClient
+import pytest
+import pytest_asyncio
+
+from app.main import app
+from app.services.blob_store import blob_store, new_blob_id
+
+
+@pytest.fixture(autouse=True)
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "base_path", str(tmp_path))
+    return tmp_path
+
+
+@pytest_asyncio.fixture
+async def client():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def _upload(client: AsyncClient, data: bytes) -> str:
+    response = await client.post(
+        "/api/secret/file",
+        params={"ttl_minutes": 10, "filename": "informe.pdf"},
+        content=data,
+        headers={"content-type": "application/pdf"}
+    )
+    assert response.status_code == 201
+    return response.json()["token"]
+
+
+@pytest.mark.asyncio
+async def test_download_round_trip_deletes_blob(client, blob_dir):
+    data = os.urandom(200 * 1024 + 17)
+    token = await _upload(client, data)
+    assert len(os.listdir(blob_dir)) == 1
+
+    first = await client.get(f"/api/secret/{token}/file")
+    second = await client.get(f"/api/secret/{token}/file")
+
+    assert first.status_code == 200
+    assert first.content == data
+    assert first.headers["content-type"] == "application/pdf"
+    assert 'filename="informe.pdf"' in first.headers["content-disposition"]
+    assert second.status_code == 410
+    assert os.listdir(blob_dir) == []
+
+
+@pytest.mark.asyncio
+async def test_delete_removes_blob(client, blob_dir):
+    token = await _upload(client, b"contenido")
+
+    response = await client.delete(f"/api/secret/{token}/delete")
+
+    assert response.status_code == 200
+    assert os.listdir(blob_dir) == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_destroy_removes_blobs(client, blob_dir):
+    files = [await _upload(client, b"uno"), await _upload(client, b"dos")]
+    text = (await client.post("/api/secret", json={"content": "texto", "ttl_minutes": 10})).json()["token"]
+
+    response = await client.post("/api/secrets/destroy", json={"tokens": files + [text]})
+
+    assert response.status_code == 200
+    assert response.json()["destroyed"] == files + [text]
+    assert "file_contents" not in response.json()
+    assert os.listdir(blob_dir) == []
+
+
+@pytest.mark.asyncio
+async def test_tampered_blob_fails_download(client, blob_dir):
+    token = await _upload(client, os.urandom(1000))
+    path = blob_dir / os.listdir(blob_dir)[0]
+    sealed = bytearray(path.read_bytes())
+    sealed[-1] ^= 0x01
+    path.write_bytes(bytes(sealed))
+
+    # El error llega a mitad del envío: la respuesta queda incompleta
+    with pytest.raises(BaseExceptionGroup) as excinfo:
+        await client.get(f"/api/secret/{token}/file")
+
+    assert excinfo.group_contains(InvalidTag)
+    assert os.listdir(blob_dir) == []
+
+
+@pytest.mark.asyncio
+async def test_purge_removes_expired_blobs_and_partial_uploads(blob_dir):
+    expired = new_blob_id(time.time() - 60)
+    live = new_blob_id(time.time() + 600)
+    for name in (expired, f"{expired}.part", live, f"{live}.part", "otro-archivo"):
+        (blob_dir / name).write_bytes(b"x")
+
+    assert await blob_store.purge_expired() == 2
+
+    assert sorted(os.listdir(blob_dir)) == sorted([live, f"{live}.part", "otro-archivo"])
@@ -0,0 +1,114 @@
+"""
+Tests del executor de hashing de passphrases (`app.services.hashing`) y de
+la respuesta 503 cuando está saturado
+"""
+import asyncio
+import threading
+
+from httpx import ASGITransport, AsyncClient
+import pytest
+import pytest_asyncio
+
+from app.main import app
+from app.services import kdf
+from app.services.hashing import HashingSaturatedError, PassphraseHasher, passphrase_hasher
+
+
+@pytest.fixture
+def blocking_kdf(monkeypatch):
+    """Hash que no termina hasta que se libera el evento"""
+    release = threading.Event()
+
+    def slow_hash(passphrase, algorithm, cost):
+        release.wait(5)
+        return f"hash:{passphrase}"
+
+    monkeypatch.setattr(kdf, "hash_passphrase", slow_hash)
+    yield release
+    release.set()
+
+
+@pytest.mark.asyncio
+async def test_full_pool_rejects_immediately(blocking_kdf):
+    hasher = PassphraseHasher(workers=1, max_queue=1)
+    # Uno en ejecución y otro en cola
+    running = [asyncio.create_task(hasher.hash(f"clave-{i}")) for i in range(hasher.capacity)]
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HashingSaturatedError):
+        await hasher.hash("una-mas")
+    assert hasher.get_status()["rejected"] == 1
+    assert hasher.get_status()["in_flight"] == 2
+
+    blocking_kdf.set()
+    assert await asyncio.gather(*running) == ["hash:clave-0", "hash:clave-1"]
+    assert hasher.get_status()["in_flight"] == 0
+    # Con huecos libres se vuelve a aceptar
+    assert await hasher.hash("otra") == "hash:otra"
+    assert hasher.get_status()["calls"] == 3
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_verify_propagates_saturation_but_not_errors():
+    hasher = PassphraseHasher(workers=1, max_queue=0)
+
+    # Un hash con formato desconocido se trata como passphrase incorrecta
+    assert await hasher.verify("clave", "no-es-un-hash") is False
+
+    hasher._in_flight = hasher.capacity
+    with pytest.raises(HashingSaturatedError):
+        await hasher.verify("clave", "no-es-un-hash")
+    hasher._in_flight = 0
+    hasher.shutdown()
+
+
+@pytest_asyncio.fixture
+async def client():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def saturated(monkeypatch):
+    monkeypatch.setattr(passphrase_hasher, "_in_flight", passphrase_hasher.capacity)
+
+
+@pytest.mark.asyncio
+async def test_create_with_passphrase_returns_503_when_saturated(client, saturated):
+    response = await client.post(
+        "/api/secret",
+        json={"content": "contraseña", "ttl_minutes": 10, "passphrase": "clave-segura"}
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_read_protected_returns_503_without_consuming(client, monkeypatch):
+    created = await client.post(
+        "/api/secret",
+        json={"content": "contraseña", "ttl_minutes": 10, "passphrase": "clave-segura"}
+    )
+    token = created.json()["token"]
+
+    monkeypatch.setattr(passphrase_hasher, "_in_flight", passphrase_hasher.capacity)
+    busy = await client.get(f"/api/secret/{token}", params={"passphrase": "clave-segura"})
+    monkeypatch.undo()
+    read = await client.get(f"/api/secret/{token}", params={"passphrase": "clave-segura"})
+
+    assert busy.status_code == 503
+    assert busy.headers["retry-after"] == "1"
+    # El secreto no se consumió: se puede leer cuando hay hueco
+    assert read.status_code == 200
+    assert read.json()["content"] == "contraseña"
+
+
+@pytest.mark.asyncio
+async def test_secret_without_passphrase_is_not_affected(client, saturated):
+    created = await client.post("/api/secret", json={"content": "contraseña", "ttl_minutes": 10})
+    read = await client.get(f"/api/secret/{created.json()['token']}")
+
+    assert created.status_code == 201
+    assert read.status_code == 200
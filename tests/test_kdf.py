@@ -0,0 +1,131 @@
+"""
+Tests de la KDF de passphrases (`app.services.kdf`)
+"""
+import re
+
+import pytest
+
+from app.services import kdf
+from app.services.kdf import (
+    COST_LIMITS,
+    DEFAULT_COSTS,
+    SCRYPT_MAX_MEMORY_BYTES,
+    KdfPolicy,
+    hash_passphrase,
+    scrypt_memory_bytes,
+    verify_passphrase
+)
+
+
+def test_bcrypt_round_trip():
+    hashed = hash_passphrase("clave-segura", "bcrypt", 10)
+
+    assert re.fullmatch(r"\$2b\$10\$[./A-Za-z0-9]{53}", hashed)
+    assert verify_passphrase("clave-segura", hashed)
+    assert not verify_passphrase("otra-clave", hashed)
+
+
+def test_scrypt_round_trip():
+    hashed = hash_passphrase("clave-segura", "scrypt", 14)
+
+    assert re.fullmatch(r"\$scrypt\$ln=14,r=8,p=1\$[A-Za-z0-9+/]{22}\$[A-Za-z0-9+/]{43}", hashed)
+    assert verify_passphrase("clave-segura", hashed)
+    assert not verify_passphrase("otra-clave", hashed)
+
+
+def test_hashes_are_salted():
+    assert hash_passphrase("clave", "scrypt", 14) != hash_passphrase("clave", "scrypt", 14)
+
+
+def test_verify_uses_parameters_stored_in_hash():
+    # Un hash con otros parámetros se verifica con ellos, no con la política actual
+    hashed = hash_passphrase("clave-segura", "scrypt", 14).replace("ln=14,r=8,p=1", "ln=14,r=4,p=2")
+
+    assert not verify_passphrase("clave-segura", hashed)
+
+    salt = kdf.os.urandom(kdf.SCRYPT_SALT_BYTES)
+    key = kdf._scrypt("clave-segura", salt, 14, 4, 2)
+    hashed = f"$scrypt$ln=14,r=4,p=2${kdf._b64encode(salt)}${kdf._b64encode(key)}"
+    assert verify_passphrase("clave-segura", hashed)
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError):
+        hash_passphrase("clave", "md5", 10)
+    with pytest.raises(ValueError):
+        verify_passphrase("clave", "$argon2id$v=19$...")
+
+
+def test_scrypt_cost_is_capped_by_memory():
+    max_cost = COST_LIMITS["scrypt"][1]
+
+    assert scrypt_memory_bytes(max_cost) == SCRYPT_MAX_MEMORY_BYTES
+    assert DEFAULT_COSTS["scrypt"] <= max_cost
+    assert KdfPolicy("scrypt", 20).cost == max_cost
+    # maxmem se ajusta a lo necesario: el coste máximo funciona
+    assert verify_passphrase("clave", hash_passphrase("clave", "scrypt", max_cost))
+
+
+def test_scrypt_maxmem_is_tight(monkeypatch):
+    calls = []
+    real_scrypt = kdf.hashlib.scrypt
+
+    def recording_scrypt(*args, **kwargs):
+        calls.append(kwargs["maxmem"])
+        return real_scrypt(*args, **kwargs)
+
+    monkeypatch.setattr(kdf.hashlib, "scrypt", recording_scrypt)
+    hash_passphrase("clave", "scrypt", 14)
+
+    assert scrypt_memory_bytes(14) < calls[0] < scrypt_memory_bytes(14) * 1.01
+
+
+def test_policy_clamps_and_defaults():
+    assert KdfPolicy("bcrypt").cost == DEFAULT_COSTS["bcrypt"]
+    assert KdfPolicy("bcrypt", 4).cost == COST_LIMITS["bcrypt"][0]
+    assert KdfPolicy("bcrypt", 30).cost == COST_LIMITS["bcrypt"][1]
+    with pytest.raises(ValueError):
+        KdfPolicy("md5")
+
+
+@pytest.fixture
+def fake_timing(monkeypatch):
+    """Cada unidad de coste duplica el tiempo: coste por defecto = `base_ms`"""
+    measured = []
+
+    def install(base_ms: float):
+        def measure(algorithm, cost):
+            measured.append(cost)
+            return base_ms * 2 ** (cost - DEFAULT_COSTS[algorithm])
+
+        monkeypatch.setattr(kdf, "measure_hash_ms", measure)
+        return measured
+
+    return install
+
+
+def test_calibrate_picks_highest_cost_under_target(fake_timing):
+    measured = fake_timing(60)
+    policy = KdfPolicy("bcrypt")
+
+    # 60, 120, 240 ms caben en 250; 480 no
+    assert policy.calibrate(250) == 14
+    assert policy.measured_ms == 240
+    assert policy.calibrated
+    # No sigue midiendo costes que claramente superan el objetivo
+    assert measured == [12, 13, 14]
+
+
+def test_calibrate_never_goes_below_default(fake_timing):
+    fake_timing(400)
+    policy = KdfPolicy("bcrypt")
+
+    assert policy.calibrate(250) == DEFAULT_COSTS["bcrypt"]
+    assert policy.measured_ms == 400
+
+
+def test_calibrate_stops_at_max_cost(fake_timing):
+    fake_timing(1)
+    policy = KdfPolicy("scrypt")
+
+    assert policy.calibrate(10_000) == COST_LIMITS["scrypt"][1]
@@ -0,0 +1,114 @@
+"""
+Tests del re-cifrado tras una rotación de claves (`app.services.key_rotation`)
+"""
+import pytest
+
+from app.config import settings
+from app.services.encryption import EncryptionService
+from app.services.key_rotation import KeyRotationJob
+from app.services.memory_storage import InMemoryStorageService
+from app.utils.validators import calculate_expiration
+
+
+@pytest.fixture
+def service():
+    return EncryptionService()
+
+
+@pytest.fixture
+def previous_service(monkeypatch):
+    """Servicio de antes de la rotación: la clave anterior era la actual"""
+    monkeypatch.setattr(settings, "encryption_key", settings.encryption_keys_previous_list[0])
+    monkeypatch.setattr(settings, "encryption_keys_previous", "")
+    return EncryptionService()
+
+
+async def _fill(storage: InMemoryStorageService, encryption: EncryptionService, count: int, prefix: str):
+    for index in range(count):
+        await storage.create_secret(
+            token=f"{prefix}-{index:03d}",
+            encrypted_content=encryption.encrypt(f"{prefix} {index}"),
+            expires_at=calculate_expiration(10)
+        )
+
+
+class PagingStorage(InMemoryStorageService):
+    """Registra las páginas pedidas"""
+
+    def __init__(self):
+        super().__init__()
+        self.pages = []
+
+    async def get_live_secrets_page(self, after_token, limit):
+        self.pages.append(after_token)
+        return await super().get_live_secrets_page(after_token, limit)
+
+
+@pytest.mark.asyncio
+async def test_reencrypts_old_rows_page_by_page(service, previous_service):
+    storage = PagingStorage()
+    await _fill(storage, previous_service, 5, "a")
+    await _fill(storage, service, 2, "b")
+    job = KeyRotationJob(storage, service, batch_size=3, pause_ms=0)
+
+    status = await job.run()
+
+    # Paginación por clave: cada página empieza tras el último token de la anterior
+    assert storage.pages == [None, "a-002", "b-000"]
+    assert (status["pages"], status["scanned"]) == (3, 7)
+    assert (status["old_key_rows"], status["reencrypted"], status["skipped"], status["failed"]) == (5, 5, 0, 0)
+    # Se reescribieron las filas antiguas y siguen descifrando igual
+    for index in range(5):
+        row = await storage.get_secret_by_token(f"a-{index:03d}")
+        assert not service.needs_reencryption(row["encrypted_content"])
+        assert service.decrypt(row["encrypted_content"]) == f"a {index}"
+    # Una pasada con filas antiguas no completa la rotación; la siguiente sí
+    assert status["completed"] is False
+    assert (await job.run())["completed"] is True
+    assert not job.pending()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_change_wins_over_rotation(service, previous_service):
+    class RacingStorage(InMemoryStorageService):
+        async def replace_encrypted_content(self, token, expected, encrypted_content):
+            # Otra escritura cambia el contenido entre la lectura y el UPDATE
+            self._rows[token]["encrypted_content"] = service.encrypt("concurrente")
+            return await super().replace_encrypted_content(token, expected, encrypted_content)
+
+    storage = RacingStorage()
+    await _fill(storage, previous_service, 2, "a")
+    job = KeyRotationJob(storage, service, batch_size=10, pause_ms=0)
+
+    status = await job.run()
+
+    assert (status["reencrypted"], status["skipped"]) == (0, 2)
+    row = await storage.get_secret_by_token("a-000")
+    assert service.decrypt(row["encrypted_content"]) == "concurrente"
+
+
+@pytest.mark.asyncio
+async def test_replace_requires_unchanged_live_row(service, previous_service):
+    storage = InMemoryStorageService()
+    await _fill(storage, previous_service, 2, "a")
+    old = (await storage.get_secret_by_token("a-000"))["encrypted_content"]
+    new = service.reencrypt(old)
+
+    assert await storage.replace_encrypted_content("a-000", new, new) is False
+    assert await storage.replace_encrypted_content("a-000", old, new) is True
+    await storage.destroy_secrets(["a-001"])
+    old = (await storage.get_secret_by_token("a-001"))["encrypted_content"]
+    assert await storage.replace_encrypted_content("a-001", old, new) is False
+
+
+@pytest.mark.asyncio
+async def test_destroyed_rows_are_not_scanned(service, previous_service):
+    storage = InMemoryStorageService()
+    await _fill(storage, previous_service, 4, "a")
+    await storage.destroy_secrets(["a-001", "a-003"])
+    job = KeyRotationJob(storage, service, batch_size=10, pause_ms=0)
+
+    status = await job.run()
+
+    assert (status["scanned"], status["reencrypted"]) == (2, 2)
+    assert (await storage.get_secret_by_token("a-001"))["encrypted_content"] is None
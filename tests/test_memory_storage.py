@@ -0,0 +1,61 @@
+"""
+Tests del backend en memoria (`app.services.memory_storage`)
+"""
+from datetime import datetime, timedelta, timezone
+import random
+
+import pytest
+
+from app.services.memory_storage import InMemoryStorageService
+from app.utils.datetime_utils import now_spain
+
+
+async def _all_pages(storage: InMemoryStorageService, limit: int):
+    tokens, after = [], None
+    while True:
+        page = await storage.get_live_tokens_page(after, limit)
+        tokens.extend(page)
+        if len(page) < limit:
+            return tokens
+        after = page[-1]
+
+
+@pytest.mark.asyncio
+async def test_pages_follow_token_order_and_skip_inactive_rows():
+    storage = InMemoryStorageService()
+    rng = random.Random(7)
+    tokens = [f"{rng.getrandbits(64):016x}" for _ in range(300)]
+    for index, token in enumerate(tokens):
+        minutes = -5 if index % 7 == 0 else 30
+        await storage.create_secret(token, token.encode(), now_spain() + timedelta(minutes=minutes))
+
+    destroyed = tokens[1::5]
+    await storage.destroy_secrets(destroyed)
+    await storage.consume_secret(tokens[3])
+    expected = sorted(
+        token for index, token in enumerate(tokens)
+        if index % 7 != 0 and token not in destroyed and token != tokens[3]
+    )
+
+    assert await _all_pages(storage, 17) == expected
+    secrets_page = await storage.get_live_secrets_page(expected[9], 5)
+    assert [row["token"] for row in secrets_page] == expected[10:15]
+    assert all(row["encrypted_content"] == row["token"].encode() for row in secrets_page)
+
+    # La purga y la compactación no dejan tokens huérfanos en el índice
+    cutoff = (datetime.now(timezone.utc) + timedelta(minutes=1)).isoformat()
+    await storage.purge_expired_batch(cutoff, None, 1000)
+    await storage.compact_destroyed_batch(cutoff, None, 1000)
+    assert storage._live_tokens == expected
+    assert await _all_pages(storage, 50) == expected
+
+
+@pytest.mark.asyncio
+async def test_page_after_unknown_token_starts_at_next_token():
+    storage = InMemoryStorageService()
+    for token in ("b", "d", "f"):
+        await storage.create_secret(token, b"x", now_spain() + timedelta(minutes=10))
+
+    assert await storage.get_live_tokens_page("c", 10) == ["d", "f"]
+    assert await storage.get_live_tokens_page("f", 10) == []
+    assert await storage.get_live_tokens_page(None, 2) == ["b", "d"]
@@ -0,0 +1,109 @@
+"""
+Tests del borrado por lotes (`app.services.purge`)
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.memory_storage import InMemoryStorageService
+from app.services.purge import ExpiredPurgeJob, TombstoneCompactionJob
+from app.utils.datetime_utils import now_spain
+
+
+class ScriptedStorage:
+    """
+    Devuelve lotes predefinidos y registra los argumentos de cada llamada
+    """
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.calls = []
+
+    async def purge_expired_batch(self, cutoff, after, limit):
+        self.calls.append((cutoff, after, limit))
+        deleted = self.batches.pop(0)
+        if isinstance(deleted, Exception):
+            raise deleted
+        return deleted, f"cursor-{len(self.calls)}" if deleted else after
+
+    async def compact_destroyed_batch(self, cutoff, after, limit):
+        deleted, after = await self.purge_expired_batch(cutoff, after, limit)
+        return deleted, deleted * 100, after
+
+
+@pytest.mark.asyncio
+async def test_each_batch_resumes_from_previous_cursor():
+    storage = ScriptedStorage([10, 10, 4])
+    job = ExpiredPurgeJob(storage, batch_size=10, pause_ms=0)
+
+    status = await job.run()
+
+    assert [after for _, after, _ in storage.calls] == [None, "cursor-1", "cursor-2"]
+    assert all(limit == 10 for _, _, limit in storage.calls)
+    # El corte se fija al empezar la pasada
+    assert len({cutoff for cutoff, _, _ in storage.calls}) == 1
+    assert (status["batches"], status["deleted"]) == (3, 24)
+    assert status["completed"] is True
+    assert status["budget_exhausted"] is False
+
+
+@pytest.mark.asyncio
+async def test_budget_stops_pass_early_and_next_pass_continues():
+    storage = ScriptedStorage([10, 10, 10, 3])
+    job = ExpiredPurgeJob(storage, batch_size=10, time_budget_seconds=0, pause_ms=0)
+
+    status = await job.run()
+
+    assert (status["batches"], status["deleted"]) == (1, 10)
+    assert status["completed"] is False
+    assert status["budget_exhausted"] is True
+
+    job.time_budget_seconds = 60
+    status = await job.run()
+
+    # Una pasada nueva empieza desde el principio, con su propio corte, para
+    # recoger también las filas que el lote anterior saltó por estar bloqueadas
+    assert storage.calls[1][1] is None
+    assert [after for _, after, _ in storage.calls[1:]] == [None, "cursor-2", "cursor-3"]
+    assert (status["batches"], status["deleted"], status["passes"]) == (3, 23, 2)
+    assert status["completed"] is True
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_keeps_progress_and_releases_job():
+    storage = ScriptedStorage([10, ConnectionError("caída")])
+    job = ExpiredPurgeJob(storage, batch_size=10, pause_ms=0)
+
+    with pytest.raises(ConnectionError):
+        await job.run()
+
+    status = job.get_status()
+    assert (status["deleted"], status["completed"], status["running"]) == (10, False, False)
+    assert status["passes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_compaction_uses_grace_window_and_counts_bytes():
+    storage = ScriptedStorage([10, 2])
+    job = TombstoneCompactionJob(storage, grace_minutes=60, batch_size=10, pause_ms=0)
+
+    status = await job.run()
+
+    cutoff = datetime.fromisoformat(storage.calls[0][0])
+    expected = datetime.now(timezone.utc) - timedelta(minutes=60)
+    assert abs((cutoff - expected).total_seconds()) < 5
+    assert (status["deleted"], status["reclaimed_bytes"]) == (12, 1200)
+
+
+@pytest.mark.asyncio
+async def test_purge_with_memory_backend():
+    storage = InMemoryStorageService()
+    for index in range(25):
+        await storage.create_secret(f"old-{index:02d}", b"x", now_spain() - timedelta(minutes=index + 1))
+    await storage.create_secret("live", b"x", now_spain() + timedelta(minutes=10))
+    job = ExpiredPurgeJob(storage, batch_size=10, pause_ms=0)
+
+    status = await job.run()
+
+    assert (status["batches"], status["deleted"], status["completed"]) == (3, 25, True)
+    assert list(storage._rows) == ["live"]
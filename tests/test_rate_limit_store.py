@@ -0,0 +1,166 @@
+"""
+Tests del estado compartido del rate limiter (`app.services.rate_limit_store`)
+y de su sincronización por lotes (`SyncedRateLimiter`)
+"""
+import os
+
+import pytest
+import pytest_asyncio
+
+from app.services.rate_limit_store import SHM_HEADER, SHM_SLOT, SharedMemoryRateLimitStore
+from app.services.rate_limiter import SyncedRateLimiter
+
+
+@pytest.fixture
+def shm_path(tmp_path):
+    return str(tmp_path / "ratelimit")
+
+
+@pytest.mark.asyncio
+async def test_shm_counts_current_and_previous_window(shm_path):
+    store = SharedMemoryRateLimitStore(shm_path, slots=64)
+
+    assert await store.increment(10, {"a": 2, "b": 1}) == {"a": (2, 0), "b": (1, 0)}
+    assert await store.increment(10, {"a": 3}) == {"a": (5, 0)}
+    # La ventana actual pasa a ser la anterior
+    assert await store.increment(11, {"a": 1}) == {"a": (1, 5)}
+    # Tras una ventana sin peticiones no queda nada de la anterior
+    assert await store.increment(13, {"a": 1}) == {"a": (1, 0)}
+
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_shm_is_shared_between_instances(shm_path):
+    first = SharedMemoryRateLimitStore(shm_path, slots=64)
+    second = SharedMemoryRateLimitStore(shm_path, slots=64)
+
+    await first.increment(7, {"ip": 3})
+    assert await second.increment(7, {"ip": 2}) == {"ip": (5, 0)}
+
+    await first.close()
+    await second.close()
+
+
+@pytest.mark.asyncio
+async def test_shm_refuses_file_with_other_slots(shm_path):
+    store = SharedMemoryRateLimitStore(shm_path, slots=64)
+    await store.increment(1, {"ip": 4})
+    size = os.path.getsize(shm_path)
+
+    with pytest.raises(RuntimeError):
+        SharedMemoryRateLimitStore(shm_path, slots=128)
+
+    # El archivo no se trunca: quien ya lo tenía mapeado sigue funcionando
+    assert os.path.getsize(shm_path) == size
+    assert await store.increment(1, {"ip": 1}) == {"ip": (5, 0)}
+    await store.close()
+
+
+def test_shm_refuses_foreign_file(shm_path):
+    with open(shm_path, "wb") as f:
+        f.write(b"no es una tabla")
+
+    with pytest.raises(RuntimeError):
+        SharedMemoryRateLimitStore(shm_path, slots=64)
+
+    with open(shm_path, "rb") as f:
+        assert f.read() == b"no es una tabla"
+
+
+@pytest.mark.asyncio
+async def test_shm_initializes_empty_or_zeroed_file(shm_path):
+    # Un archivo creado pero nunca inicializado (p. ej. si el proceso murió
+    # entre el ftruncate y la cabecera) se inicializa
+    with open(shm_path, "wb") as f:
+        f.write(bytes(SHM_HEADER.size + 64 * SHM_SLOT.size))
+
+    store = SharedMemoryRateLimitStore(shm_path, slots=64)
+    assert await store.increment(1, {"ip": 1}) == {"ip": (1, 0)}
+    await store.close()
+
+
+class FakeStore:
+    """
+    Almacén en memoria con reloj controlable y fallos a demanda
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.counts = {}
+        self.calls = []
+        self.fail = False
+
+    def clock(self):
+        return self.now
+
+    async def increment(self, window, deltas):
+        self.calls.append((window, dict(deltas)))
+        if self.fail:
+            raise ConnectionError("almacén caído")
+        result = {}
+        for key, delta in deltas.items():
+            self.counts[(window, key)] = self.counts.get((window, key), 0) + delta
+            result[key] = (self.counts[(window, key)], self.counts.get((window - 1, key), 0))
+        return result
+
+    async def close(self):
+        return None
+
+
+@pytest_asyncio.fixture
+async def limiter():
+    store = FakeStore()
+    # Sin sincronización en segundo plano durante el test
+    limiter = SyncedRateLimiter(store, limit=10, window_seconds=60, sync_interval=3600, sync_batch=10_000)
+    yield limiter
+    store.fail = False
+    await limiter.close()
+
+
+@pytest.mark.asyncio
+async def test_sync_sends_one_batch_per_window(limiter):
+    for _ in range(3):
+        limiter.hit("a")
+    limiter.hit("b")
+
+    await limiter.sync()
+
+    assert limiter.store.calls == [(16, {"a": 3, "b": 1})]
+    assert limiter.syncs == 1
+    assert limiter._pending == {}
+
+
+@pytest.mark.asyncio
+async def test_sync_applies_requests_from_other_processes(limiter):
+    limiter.hit("a")
+    # Otro proceso ya ha sumado 8 peticiones en esta ventana
+    limiter.store.counts[(16, "a")] = 8
+
+    await limiter.sync()
+
+    assert limiter.hit("a")[:2] == (True, 0)
+    allowed, remaining, retry_after = limiter.hit("a")
+    assert (allowed, remaining) == (False, 0)
+    assert retry_after > 0
+
+
+@pytest.mark.asyncio
+async def test_sync_failure_requeues_pending_requests(limiter):
+    limiter.hit("a")
+    limiter.hit("a")
+    limiter.store.fail = True
+
+    await limiter.sync()
+
+    assert limiter.sync_errors == 1
+    assert limiter._pending == {16: {"a": 2}}
+
+    # Las peticiones siguen contando localmente mientras el almacén falla
+    limiter.hit("a")
+    limiter.store.fail = False
+    await limiter.sync()
+
+    assert limiter.store.calls[-1] == (16, {"a": 3})
+    assert limiter.store.counts[(16, "a")] == 3
+    assert limiter._pending == {}
@@ -0,0 +1,117 @@
+"""
+Tests del rate limiter de ventana deslizante (`app.services.rate_limiter`)
+y de su respuesta 429 (`app.middleware.security`)
+"""
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+import pytest
+
+from app.middleware.security import RateLimitMiddleware
+from app.services import rate_limiter as rate_limiter_module
+from app.services.metrics import metrics
+from app.services.rate_limiter import SlidingWindowRateLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Inicio de la ventana 100 con ventanas de 60 s
+    clock = FakeClock(6000.0)
+    monkeypatch.setattr(rate_limiter_module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_allows_up_to_limit_within_window(clock):
+    limiter = SlidingWindowRateLimiter(limit=3)
+
+    assert [limiter.hit("ip") for _ in range(3)] == [(True, 2, 0), (True, 1, 0), (True, 0, 0)]
+
+    clock.now += 15
+    assert limiter.hit("ip") == (False, 0, 45)
+
+
+def test_previous_window_is_weighted_by_overlap(clock):
+    limiter = SlidingWindowRateLimiter(limit=10)
+    for _ in range(10):
+        limiter.hit("ip")
+
+    # A un cuarto de la ventana siguiente la anterior aún pesa 3/4: 7.5
+    clock.now += 60 + 15
+    assert limiter.hit("ip") == (True, 1, 0)
+    assert limiter.hit("ip") == (True, 0, 0)
+    assert limiter.hit("ip") == (True, 0, 0)
+    assert limiter.hit("ip") == (False, 0, 45)
+
+    # A mitad de ventana pesa 5 y ya hay 3 en la actual
+    clock.now += 15
+    assert limiter.hit("ip") == (True, 1, 0)
+
+
+def test_previous_window_is_dropped_after_idle_window(clock):
+    limiter = SlidingWindowRateLimiter(limit=5)
+    for _ in range(5):
+        limiter.hit("ip")
+    assert limiter.hit("ip")[0] is False
+
+    # Una ventana entera sin peticiones: no queda nada que ponderar
+    clock.now += 2 * 60 + 1
+    assert limiter.hit("ip") == (True, 4, 0)
+
+
+def test_keys_are_independent(clock):
+    limiter = SlidingWindowRateLimiter(limit=1)
+
+    assert limiter.hit("a")[0] is True
+    assert limiter.hit("a")[0] is False
+    assert limiter.hit("b")[0] is True
+
+
+def test_lru_evicts_least_recently_used_key(clock):
+    limiter = SlidingWindowRateLimiter(limit=1, max_keys=2)
+    limiter.hit("a")
+    limiter.hit("b")
+    # "a" vuelve a usarse (aunque se rechace), así que la menos reciente es "b"
+    assert limiter.hit("a")[0] is False
+
+    limiter.hit("c")
+
+    assert len(limiter) == 2
+    assert limiter.evicted == 1
+    assert limiter.hit("a")[0] is False
+    # "b" se olvidó y vuelve a empezar desde cero
+    assert limiter.hit("b")[0] is True
+
+
+@pytest.mark.asyncio
+async def test_middleware_returns_429_with_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(metrics, "_gauge_callbacks", dict(metrics._gauge_callbacks))
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, limiter=SlidingWindowRateLimiter(limit=2))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        first = await client.get("/ping")
+        second = await client.get("/ping")
+        clock.now += 20
+        rejected = await client.get("/ping")
+
+    assert first.status_code == 200
+    assert first.headers["x-ratelimit-limit"] == "2"
+    assert first.headers["x-ratelimit-remaining"] == "1"
+    assert second.headers["x-ratelimit-remaining"] == "0"
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "40"
+    assert rejected.json()["retry_after"] == 40
@@ -0,0 +1,99 @@
+"""
+Tests de la reprogramación de la limpieza (`app.scheduler`)
+"""
+from datetime import datetime, timezone
+import time
+
+import pytest
+
+from app import scheduler
+from app.scheduler import ExpiryWakeups
+
+
+class FakeStorage:
+    def __init__(self, next_expiration: float):
+        self.expiration = next_expiration
+
+    async def next_expiration(self):
+        return datetime.fromtimestamp(self.expiration, tz=timezone.utc).isoformat()
+
+
+@pytest.fixture
+def wakeups(monkeypatch):
+    wakeups = ExpiryWakeups(FakeStorage(time.time() - 600), coalesce_seconds=30)
+    monkeypatch.setattr(scheduler, "expiry_wakeups", wakeups)
+
+    async def no_blobs():
+        return 0
+
+    monkeypatch.setattr(scheduler.blob_store, "purge_expired", no_blobs)
+    return wakeups
+
+
+@pytest.mark.asyncio
+async def test_refresh_follows_next_expiration():
+    expiration = time.time() + 120
+    wakeups = ExpiryWakeups(FakeStorage(expiration), coalesce_seconds=30)
+
+    await wakeups.refresh()
+
+    assert wakeups.next_wakeup == pytest.approx(expiration + 30, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_refresh_respects_not_before():
+    wakeups = ExpiryWakeups(FakeStorage(time.time() - 600), coalesce_seconds=30)
+    not_before = time.time() + 30
+
+    await wakeups.refresh(not_before=not_before)
+
+    assert wakeups.next_wakeup == not_before
+
+
+@pytest.mark.asyncio
+async def test_failed_cleanup_is_not_rescheduled_immediately(monkeypatch, wakeups):
+    async def failing_purge():
+        raise RuntimeError("base de datos caída")
+
+    monkeypatch.setattr(scheduler.expired_purge, "run", failing_purge)
+
+    await scheduler.cleanup_expired_secrets()
+
+    assert wakeups.next_wakeup >= time.time() + 29
+
+
+@pytest.mark.asyncio
+async def test_partial_cleanup_is_not_rescheduled_immediately(monkeypatch, wakeups):
+    async def partial_purge():
+        return {"running": False, "completed": False, "deleted": 500, "batches": 5}
+
+    monkeypatch.setattr(scheduler.expired_purge, "run", partial_purge)
+
+    await scheduler.cleanup_expired_secrets()
+
+    assert wakeups.next_wakeup >= time.time() + 29
+
+
+@pytest.mark.asyncio
+async def test_skipped_cleanup_still_reschedules(monkeypatch, wakeups):
+    async def running_purge():
+        return {"running": True, "completed": False, "deleted": 0, "batches": 0}
+
+    monkeypatch.setattr(scheduler.expired_purge, "run", running_purge)
+
+    await scheduler.cleanup_expired_secrets()
+
+    assert wakeups.next_wakeup is not None
+
+
+@pytest.mark.asyncio
+async def test_complete_cleanup_follows_next_expiration(monkeypatch, wakeups):
+    async def complete_purge():
+        return {"running": False, "completed": True, "deleted": 3, "batches": 1}
+
+    monkeypatch.setattr(scheduler.expired_purge, "run", complete_purge)
+    wakeups.storage.expiration = time.time() + 5
+
+    await scheduler.cleanup_expired_secrets()
+
+    assert wakeups.next_wakeup == pytest.approx(wakeups.storage.expiration + 30, abs=1)
@@ -0,0 +1,161 @@
+"""
+Tests de la lectura de acceso único (`app.routers.secrets`) con el
+backend en memoria
+"""
+import asyncio
+
+from httpx import ASGITransport, AsyncClient
+import pytest
+import pytest_asyncio
+
+from app.main import app
+
+
+@pytest_asyncio.fixture
+async def client():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def _create(client: AsyncClient, **body) -> str:
+    response = await client.post("/api/secret", json={"content": "contraseña", "ttl_minutes": 10, **body})
+    assert response.status_code == 201
+    return response.json()["token"]
+
+
+@pytest.mark.asyncio
+async def test_read_destroys_secret(client):
+    token = await _create(client)
+
+    first = await client.get(f"/api/secret/{token}")
+    second = await client.get(f"/api/secret/{token}")
+
+    assert first.status_code == 200
+    assert first.json()["content"] == "contraseña"
+    assert second.status_code == 410
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_succeed_once(client):
+    token = await _create(client)
+
+    responses = await asyncio.gather(*(client.get(f"/api/secret/{token}") for _ in range(5)))
+
+    assert sorted(response.status_code for response in responses) == [200, 410, 410, 410, 410]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_protected_reads_succeed_once(client):
+    token = await _create(client, passphrase="clave-segura")
+
+    responses = await asyncio.gather(
+        *(client.get(f"/api/secret/{token}", params={"passphrase": "clave-segura"}) for _ in range(3))
+    )
+
+    assert sorted(response.status_code for response in responses) == [200, 410, 410]
+
+
+@pytest.mark.asyncio
+async def test_unknown_and_forged_tokens_are_not_found(client):
+    token = await _create(client)
+    random_part, expiry, mac = token.split(".")
+
+    forged = await client.get(f"/api/secret/{random_part}.{expiry}.{'A' * len(mac)}")
+    unknown = await client.get(f"/api/secret/{'x' * 64}")
+
+    assert forged.status_code == 404
+    assert unknown.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_each_item_in_order(client, monkeypatch):
+    from app.routers import secrets as secrets_router
+    from app.services.hashing import HashingSaturatedError
+
+    real_hash = secrets_router.passphrase_hasher.hash
+
+    async def flaky_hash(passphrase):
+        if passphrase == "saturada":
+            raise HashingSaturatedError()
+        if passphrase == "rota-rota":
+            raise RuntimeError("fallo")
+        return await real_hash(passphrase)
+
+    monkeypatch.setattr(secrets_router.passphrase_hasher, "hash", flaky_hash)
+    items = [
+        {"content": "uno", "ttl_minutes": 10},
+        {"content": "dos", "ttl_minutes": 10, "passphrase": "saturada"},
+        {"content": "tres", "ttl_minutes": 10, "passphrase": "clave-segura"},
+        {"content": "cuatro", "ttl_minutes": 10, "passphrase": "rota-rota"}
+    ]
+
+    response = await client.post("/api/secrets/batch", json={"items": items})
+
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 2)
+    assert [result["index"] for result in body["results"]] == [0, 1, 2, 3]
+    assert [result["success"] for result in body["results"]] == [True, False, True, False]
+    assert body["results"][1]["error"] == "Servicio ocupado verificando passphrases"
+    assert body["results"][3]["error"] == "Error al procesar la passphrase"
+    assert body["results"][2]["secret"]["has_passphrase"] is True
+
+    # Cada secreto creado se lee con su propio contenido
+    first = await client.get(f"/api/secret/{body['results'][0]['secret']['token']}")
+    third = await client.get(
+        f"/api/secret/{body['results'][2]['secret']['token']}", params={"passphrase": "clave-segura"}
+    )
+    assert first.json()["content"] == "uno"
+    assert third.json()["content"] == "tres"
+
+
+@pytest.mark.asyncio
+async def test_batch_over_byte_budget_is_rejected(client, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "max_batch_size_kb", 1)
+    items = [{"content": "x" * 600, "ttl_minutes": 10} for _ in range(2)]
+
+    response = await client.post("/api/secrets/batch", json={"items": items})
+
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_bulk_destroy_classifies_and_deduplicates(client):
+    live = await _create(client)
+    read = await _create(client)
+    await client.get(f"/api/secret/{read}")
+    random_part, expiry, mac = live.split(".")
+    forged = f"{random_part}.{expiry}.{'A' * len(mac)}"
+    unknown = "x" * 64
+
+    response = await client.post(
+        "/api/secrets/destroy",
+        json={"tokens": [live, read, forged, live, unknown, read]}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["destroyed"] == [live]
+    assert body["already_destroyed"] == [read]
+    # Los falsificados se descartan sin consultar el almacenamiento
+    assert sorted(body["not_found"]) == sorted([forged, unknown])
+    assert (await client.get(f"/api/secret/{live}")).status_code == 410
+
+    again = await client.post("/api/secrets/destroy", json={"tokens": [live]})
+    assert again.json()["already_destroyed"] == [live]
+
+
+@pytest.mark.asyncio
+async def test_delete_single_secret(client):
+    token = await _create(client)
+
+    first = await client.delete(f"/api/secret/{token}/delete")
+    second = await client.delete(f"/api/secret/{token}/delete")
+    missing = await client.delete(f"/api/secret/{'x' * 64}/delete")
+
+    assert first.status_code == 200
+    assert first.json()["message"] == "Secreto destruido exitosamente sin ser leído"
+    assert second.json()["message"] == "El secreto ya estaba destruido previamente"
+    assert missing.status_code == 404
@@ -0,0 +1,139 @@
+"""
+Tests de la caché stale-while-revalidate de estadísticas (`app.services.stats_cache`)
+"""
+from types import SimpleNamespace
+import asyncio
+
+import pytest
+
+from app.services import stats_cache as stats_cache_module
+from app.services.stats_cache import StatsCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Loader:
+    """
+    Devuelve {"version": n} en cada llamada; se puede bloquear o hacer fallar
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.gate.wait()
+        if self.fail:
+            raise ConnectionError("almacén caído")
+        return {"version": self.calls}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(stats_cache_module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_fresh_value_is_served_from_cache(clock):
+    loader = Loader()
+    cache = StatsCache(loader, ttl_seconds=5, max_stale_seconds=60)
+
+    assert await cache.get() == ({"version": 1}, 0.0)
+    clock.now += 3
+    assert await cache.get() == ({"version": 1}, 3)
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_value_is_served_while_a_single_refresh_runs(clock):
+    loader = Loader()
+    cache = StatsCache(loader, ttl_seconds=5, max_stale_seconds=60)
+    await cache.get()
+
+    clock.now += 10
+    loader.gate.clear()
+    results = await asyncio.gather(*(cache.get() for _ in range(5)))
+
+    # Respuesta inmediata con el valor anterior y un único recálculo
+    assert all(result == ({"version": 1}, 10) for result in results)
+    await asyncio.sleep(0)
+    assert loader.calls == 2
+
+    loader.gate.set()
+    await cache._refresh
+    assert await cache.get() == ({"version": 2}, 0)
+
+
+@pytest.mark.asyncio
+async def test_cold_cache_shares_one_load(clock):
+    loader = Loader()
+    loader.gate.clear()
+    cache = StatsCache(loader, ttl_seconds=5, max_stale_seconds=60)
+
+    waiting = asyncio.gather(*(cache.get() for _ in range(5)))
+    await asyncio.sleep(0)
+    loader.gate.set()
+
+    assert await waiting == [({"version": 1}, 0.0)] * 5
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_last_value(clock):
+    loader = Loader()
+    cache = StatsCache(loader, ttl_seconds=5, max_stale_seconds=60)
+    await cache.get()
+
+    clock.now += 10
+    loader.fail = True
+    assert await cache.get() == ({"version": 1}, 10)
+    with pytest.raises(ConnectionError):
+        await cache._refresh
+
+    # El siguiente acceso vuelve a intentarlo y sigue sirviendo el último valor
+    clock.now += 1
+    assert await cache.get() == ({"version": 1}, 11)
+    await asyncio.gather(cache._refresh, return_exceptions=True)
+    assert loader.calls == 3
+
+    loader.fail = False
+    await cache.get()
+    await cache._refresh
+    assert (await cache.get())[0] == {"version": 4}
+
+
+@pytest.mark.asyncio
+async def test_too_old_value_waits_for_load_and_propagates_errors(clock):
+    loader = Loader()
+    cache = StatsCache(loader, ttl_seconds=5, max_stale_seconds=60)
+    await cache.get()
+
+    clock.now += 100
+    loader.fail = True
+    with pytest.raises(ConnectionError):
+        await cache.get()
+
+    loader.fail = False
+    assert await cache.get() == ({"version": 3}, 0.0)
+
+
+@pytest.mark.asyncio
+async def test_zero_ttl_disables_cache(clock):
+    loader = Loader()
+    cache = StatsCache(loader, ttl_seconds=0)
+
+    await cache.get()
+    await cache.get()
+
+    assert loader.calls == 2
@@ -0,0 +1,101 @@
+"""
+Tests del cifrado por bloques de los archivos (`app.services.stream_encryption`)
+"""
+from cryptography.exceptions import InvalidTag
+import os
+
+import pytest
+
+from app.services.stream_encryption import (
+    HEADER_BYTES,
+    TAG_BYTES,
+    StreamDecryptor,
+    StreamEncryptor,
+    generate_key
+)
+
+CHUNK = 16
+
+
+def _encrypt(key: bytes, data: bytes, piece: int = 7) -> bytes:
+    encryptor = StreamEncryptor(key, CHUNK)
+    out = []
+    for start in range(0, len(data), piece):
+        out.extend(encryptor.update(data[start:start + piece]))
+    out.extend(encryptor.finalize())
+    return b"".join(out)
+
+
+def _decrypt(key: bytes, sealed: bytes, piece: int = 5) -> bytes:
+    decryptor = StreamDecryptor(key)
+    out = []
+    for start in range(0, len(sealed), piece):
+        out.extend(decryptor.update(sealed[start:start + piece]))
+    out.append(decryptor.finalize())
+    return b"".join(out)
+
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, 3 * CHUNK, 3 * CHUNK + 5])
+def test_round_trip(size):
+    key = generate_key()
+    data = os.urandom(size)
+
+    sealed = _encrypt(key, data)
+
+    # Siempre hay un último bloque, aunque esté vacío
+    chunks = max(1, -(-size // CHUNK))
+    assert len(sealed) == HEADER_BYTES + size + chunks * TAG_BYTES
+    assert _decrypt(key, sealed) == data
+
+
+def test_wrong_key_is_rejected():
+    sealed = _encrypt(generate_key(), b"x" * 40)
+
+    with pytest.raises(InvalidTag):
+        _decrypt(generate_key(), sealed)
+
+
+def test_dropping_last_chunk_is_rejected():
+    key = generate_key()
+    sealed = _encrypt(key, os.urandom(3 * CHUNK + 5))
+
+    # Cortar justo en un límite de bloque: el que queda no está marcado como último
+    with pytest.raises(InvalidTag):
+        _decrypt(key, sealed[:HEADER_BYTES + 3 * (CHUNK + TAG_BYTES)])
+
+
+def test_truncated_chunk_is_rejected():
+    key = generate_key()
+    sealed = _encrypt(key, os.urandom(2 * CHUNK))
+
+    with pytest.raises(InvalidTag):
+        _decrypt(key, sealed[:-3])
+
+
+def test_truncated_header_is_rejected():
+    key = generate_key()
+    sealed = _encrypt(key, b"hola")
+
+    with pytest.raises(ValueError):
+        _decrypt(key, sealed[:HEADER_BYTES - 1])
+
+
+@pytest.mark.parametrize("offset", [HEADER_BYTES - 1, HEADER_BYTES, HEADER_BYTES + CHUNK + TAG_BYTES + 2, -1])
+def test_tampered_byte_is_rejected(offset):
+    key = generate_key()
+    sealed = bytearray(_encrypt(key, os.urandom(2 * CHUNK + 3)))
+    sealed[offset] ^= 0x01
+
+    with pytest.raises(InvalidTag):
+        _decrypt(key, bytes(sealed))
+
+
+def test_reordered_chunks_are_rejected():
+    key = generate_key()
+    sealed = _encrypt(key, os.urandom(3 * CHUNK + 1))
+    size = CHUNK + TAG_BYTES
+    header, body = sealed[:HEADER_BYTES], sealed[HEADER_BYTES:]
+    swapped = header + body[size:2 * size] + body[:size] + body[2 * size:]
+
+    with pytest.raises(InvalidTag):
+        _decrypt(key, swapped)
@@ -0,0 +1,144 @@
+"""
+Tests del filtro de tokens vivos (`app.services.token_filter`)
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import os
+import secrets
+
+import pytest
+
+from app.services.memory_storage import InMemoryStorageService
+from app.services.token_filter import BloomFilter, TokenFilter
+from app.utils import token_generator
+from app.utils.token_generator import create_with_unique_token
+
+
+@contextmanager
+def another_process():
+    """
+    Los tokens generados dentro llevan la etiqueta de otro proceso
+    """
+    own = token_generator._instance
+    token_generator._instance = (os.getpid(), secrets.token_bytes(token_generator.INSTANCE_TAG_BYTES))
+    try:
+        yield
+    finally:
+        token_generator._instance = own
+
+
+async def _create(storage, minutes: float = 10) -> str:
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+    token, _ = await create_with_unique_token(
+        storage,
+        encrypted_content=b"contenido",
+        expires_at=expires_at,
+        passphrase_hash=None,
+        metadata={}
+    )
+    return token
+
+
+@pytest.fixture
+def storage():
+    return InMemoryStorageService()
+
+
+@pytest.fixture
+def token_filter(storage):
+    return TokenFilter(storage, enabled=True, capacity=1000, fp_rate=0.001, min_ttl_seconds=300, margin_seconds=0)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    tokens = [secrets.token_urlsafe(32) for _ in range(1000)]
+    for token in tokens:
+        bloom.add(token)
+
+    assert all(token in bloom for token in tokens)
+    assert bloom.count == 1000
+
+
+@pytest.mark.asyncio
+async def test_own_tokens_are_decided_before_first_rebuild(storage, token_filter):
+    created = await _create(storage)
+    token_filter.add(created)
+    never_created = token_generator.generate_signed_token(datetime.now(timezone.utc) + timedelta(minutes=10))
+
+    assert token_filter.might_exist(created)
+    assert not token_filter.might_exist(never_created)
+
+
+@pytest.mark.asyncio
+async def test_discarded_token_is_rejected(storage, token_filter):
+    token = await _create(storage)
+    token_filter.add(token)
+    await storage.consume_secret(token)
+
+    token_filter.discard(token)
+
+    assert not token_filter.might_exist(token)
+
+
+@pytest.mark.asyncio
+async def test_other_process_tokens_pass_until_covered(storage, token_filter):
+    await token_filter.rebuild()
+    with another_process():
+        created_after_rebuild = await _create(storage)
+
+    # No está en el filtro, pero es posterior a la reconstrucción: consulta el almacenamiento
+    assert not token_filter.covers(created_after_rebuild)
+    assert token_filter.might_exist(created_after_rebuild)
+    assert token_filter.bypassed == 1
+
+
+@pytest.mark.asyncio
+async def test_rebuild_covers_older_tokens_of_other_processes(storage, token_filter):
+    # TTL mínimo de 5 min: con expiración en menos de 5 min se creó antes de ahora
+    with another_process():
+        live = await _create(storage, minutes=4.9)
+        destroyed = await _create(storage, minutes=4.9)
+    await storage.consume_secret(destroyed)
+
+    await token_filter.rebuild()
+
+    assert token_filter.covers(live) and token_filter.covers(destroyed)
+    assert token_filter.might_exist(live)
+    assert not token_filter.might_exist(destroyed)
+
+
+@pytest.mark.asyncio
+async def test_tokens_added_during_rebuild_survive_it(storage, token_filter):
+    added = []
+
+    async def page_while_creating(after, limit):
+        token = await _create(storage)
+        token_filter.add(token)
+        added.append(token)
+        return []
+
+    storage.get_live_tokens_page = page_while_creating
+    await token_filter.rebuild()
+
+    assert token_filter.might_exist(added[0])
+
+
+@pytest.mark.asyncio
+async def test_destroyed_entries_are_pruned_by_later_rebuilds(storage, token_filter):
+    token = await _create(storage)
+    token_filter.add(token)
+    await storage.consume_secret(token)
+    token_filter.discard(token)
+    token_filter._destroyed[token] -= 60
+
+    await token_filter.rebuild()
+
+    assert token not in token_filter._destroyed
+    assert not token_filter.might_exist(token)
+
+
+def test_disabled_filter_never_rejects(storage):
+    token_filter = TokenFilter(storage, enabled=False)
+
+    assert token_filter.might_exist("x" * 64)
+    assert token_filter.get_status() == {"enabled": False}
@@ -0,0 +1,92 @@
+"""
+Tests de los tokens firmados (`app.utils.token_generator`)
+"""
+from datetime import datetime, timedelta, timezone
+import hashlib
+import hmac
+import math
+import secrets
+
+from cryptography.fernet import Fernet
+import pytest
+
+from app.config import settings
+from app.utils import token_generator
+from app.utils.token_generator import (
+    TOKEN_EXPIRED,
+    TOKEN_INVALID,
+    TOKEN_LEGACY,
+    TOKEN_VALID,
+    check_token,
+    derive_token_key,
+    generate_signed_token,
+    generate_token,
+    signed_token_expiry
+)
+
+
+def _expires_in(minutes: int) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+
+def _sign_with(encryption_key: str, expires_at: datetime) -> str:
+    """
+    Firma un token con una clave concreta (p. ej. una anterior a la rotación)
+    """
+    template = hmac.new(derive_token_key(encryption_key), digestmod=hashlib.sha256)
+    payload = f"{secrets.token_urlsafe(32)}.{math.ceil(expires_at.timestamp()):x}"
+    return f"{payload}.{token_generator._mac(template, payload.encode())}"
+
+
+def test_signed_token_is_valid():
+    expires_at = _expires_in(10)
+    token = generate_signed_token(expires_at)
+
+    assert check_token(token) == TOKEN_VALID
+    assert signed_token_expiry(token) == math.ceil(expires_at.timestamp())
+
+
+def test_signed_token_expires():
+    token = generate_signed_token(_expires_in(10))
+
+    assert check_token(token, now=_expires_in(11).timestamp()) == TOKEN_EXPIRED
+
+
+def test_altered_mac_is_invalid():
+    token = generate_signed_token(_expires_in(10))
+    random_part, expiry, mac = token.split(".")
+    forged_mac = ("A" if mac[0] != "A" else "B") + mac[1:]
+
+    assert check_token(f"{random_part}.{expiry}.{forged_mac}") == TOKEN_INVALID
+
+
+def test_altered_expiry_is_invalid():
+    token = generate_signed_token(_expires_in(10))
+    random_part, expiry, mac = token.split(".")
+    extended = f"{int(expiry, 16) + 3600:x}"
+
+    assert check_token(f"{random_part}.{extended}.{mac}") == TOKEN_INVALID
+
+
+def test_token_signed_with_unknown_key_is_invalid():
+    token = _sign_with(Fernet.generate_key().decode(), _expires_in(10))
+
+    assert check_token(token) == TOKEN_INVALID
+
+
+def test_token_signed_with_previous_key_is_accepted():
+    # ENCRYPTION_KEYS_PREVIOUS se fija en conftest.py
+    previous_key, = settings.encryption_keys_previous_list
+    token = _sign_with(previous_key, _expires_in(10))
+
+    assert check_token(token) == TOKEN_VALID
+
+
+@pytest.mark.parametrize("accept_legacy, expected", [(True, TOKEN_LEGACY), (False, TOKEN_INVALID)])
+def test_legacy_token_is_gated_by_setting(monkeypatch, accept_legacy, expected):
+    monkeypatch.setattr(settings, "token_accept_legacy", accept_legacy)
+    token = generate_token()
+
+    assert len(token) == 64
+    assert check_token(token) == expected
+    assert signed_token_expiry(token) is None